@@ -0,0 +1,124 @@
+import itertools
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import previsao_rio
+import taxas_rio
+from importar_planilha import ler_arquivo
+from serie_estacao import datetime_para_epoch
+
+# Configuração
+ARQUIVO = "historico_timoteo.csv"
+ESTACAO = "56696000"
+PONTOS_MODELO_ANTIGO = 6      # o monitor passava d_timoteo[:6]
+AVALIAR_A_CADA = 4            # slots de 15 min entre avaliações (4 = de hora em hora)
+CHAMADAS_CRONOMETRADAS = 2000
+SUBIDA_RAPIDA = 5             # cm/h: trechos de cheia, onde a previsão importa
+# Pesos ajustados só no treino; os números do relatório saem do teste (fora da amostra)
+INICIO_TESTE = datetime(2023, 1, 1)   # treino: 2019–2022 | teste: 2023–2025
+GRADE_ALFA = (0.3, 0.5, 0.7, 0.8, 0.9)
+GRADE_BETA = (0.1, 0.3, 0.5, 0.7)
+GRADE_AMORTECIMENTO = (0.5, 0.7, 0.85, 0.95)
+
+print("=" * 40)
+print("   BENCHMARK - PREVISÃO DE NÍVEL")
+print("=" * 40)
+
+diretorio = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+serie = ler_arquivo(os.path.join(diretorio, ARQUIVO), ESTACAO)
+epochs, niveis = taxas_rio.grade_regular(serie.epoch, serie.nivel)
+corte = datetime_para_epoch(INICIO_TESTE)
+print(f"\nSérie: {len(serie)} leituras, {len(niveis)} slots de 15 min")
+
+# Modelo antigo: LinearRegression nas 6 últimas leituras (reta, extrapolada)
+try:
+    from sklearn.linear_model import LinearRegression
+except ImportError:
+    LinearRegression = None
+    print("(scikit-learn não instalado: modelo antigo pela mesma reta de mínimos quadrados em NumPy)")
+
+def modelo_antigo(x_min, y, horas):
+    if LinearRegression is not None:
+        modelo = LinearRegression().fit(x_min.reshape(-1, 1), y)
+        return modelo.predict([[horas * 60]])[0]
+    inclinacao, intercepto = np.polyfit(x_min, y, 1)
+    return intercepto + inclinacao * horas * 60
+
+validos = np.flatnonzero(~np.isnan(niveis))
+treino = validos[epochs[validos] < corte]
+teste = validos[epochs[validos] >= corte]
+taxa_1h = taxas_rio.taxas_grade(niveis)["1h"]
+
+def avaliar(indices, pesos, com_antigo=False):
+    """Erros absolutos de cada horizonte nos slots `indices` (o previsor só vê esses slots)."""
+    previsor = previsao_rio.PrevisorTendencia(*pesos)
+    erros = {"antigo": {h: [] for h in previsao_rio.HORIZONTES}, "novo": {h: [] for h in previsao_rio.HORIZONTES}}
+    dentro_faixa = {h: [] for h in previsao_rio.HORIZONTES}
+    em_cheia = {h: [] for h in previsao_rio.HORIZONTES}
+    tempo = 0.0
+    for i in indices:
+        t = time.perf_counter()
+        previsor.atualizar(float(epochs[i]), float(niveis[i]))
+        tempo += time.perf_counter() - t
+        if i % AVALIAR_A_CADA or previsor.leituras < 3:
+            continue
+
+        passadas = indices[(indices <= i) & (indices > i - 4 * 6)][-PONTOS_MODELO_ANTIGO:] if com_antigo else None
+        if com_antigo and len(passadas) < 3:
+            continue
+        for h in previsao_rio.HORIZONTES:
+            alvo = i + int(h / previsao_rio.PASSO_HORAS)
+            if alvo >= len(niveis) or np.isnan(niveis[alvo]):
+                continue
+            real = niveis[alvo]
+            valor, inferior, superior = previsor.prever(h)
+            erros["novo"][h].append(abs(valor - real))
+            if com_antigo:
+                x_min = (epochs[passadas] - epochs[i]) / 60.0
+                erros["antigo"][h].append(abs(modelo_antigo(x_min, niveis[passadas], h) - real))
+            if inferior is not None:
+                dentro_faixa[h].append(inferior <= real <= superior)
+            em_cheia[h].append(taxa_1h[i] >= SUBIDA_RAPIDA)
+    return erros, dentro_faixa, em_cheia, tempo
+
+# 1. Ajuste dos pesos no treino (soma dos MAE dos horizontes)
+print(f"\nAjustando ALFA/BETA/AMORTECIMENTO em {len(treino)} leituras até {INICIO_TESTE:%d/%m/%Y}...")
+t = time.perf_counter()
+melhor, melhor_custo = None, float("inf")
+for pesos in itertools.product(GRADE_ALFA, GRADE_BETA, GRADE_AMORTECIMENTO):
+    erros, _, _, _ = avaliar(treino, pesos)
+    custo = sum(np.mean(erros["novo"][h]) for h in previsao_rio.HORIZONTES)
+    if custo < melhor_custo:
+        melhor, melhor_custo = pesos, custo
+atuais = (previsao_rio.ALFA, previsao_rio.BETA, previsao_rio.AMORTECIMENTO)
+print(f"Melhor no treino: ALFA={melhor[0]} BETA={melhor[1]} AMORTECIMENTO={melhor[2]} "
+      f"(no previsao_rio: {atuais[0]}/{atuais[1]}/{atuais[2]}) em {time.perf_counter() - t:.0f}s")
+
+# 2. Relatório no teste, com os pesos do previsao_rio (que o monitor usa)
+erros, dentro_faixa, em_cheia, tempo_novo = avaliar(teste, atuais, com_antigo=True)
+print(f"\nTESTE (fora da amostra): {len(teste)} leituras a partir de {INICIO_TESTE:%d/%m/%Y}, pesos do previsao_rio")
+print(f"{'Horizonte':<10}{'Avaliações':>12}{'MAE antigo':>12}{'MAE novo':>10}{'Cheia antigo':>14}{'Cheia novo':>12}{'Na faixa':>10}")
+for h in previsao_rio.HORIZONTES:
+    antigo, novo = np.array(erros["antigo"][h]), np.array(erros["novo"][h])
+    cheia = np.array(em_cheia[h], dtype=bool)
+    faixa = np.mean(dentro_faixa[h]) * 100 if dentro_faixa[h] else float("nan")
+    print(f"+{h}h{'':<7}{len(novo):>12}{antigo.mean():>11.1f}{novo.mean():>10.1f}"
+          f"{antigo[cheia].mean():>13.1f}{novo[cheia].mean():>12.1f}{faixa:>9.0f}%")
+if melhor != atuais:
+    print("⚠️ Os pesos do previsao_rio não são os melhores do treino: atualize as constantes.")
+
+# Tempo por chamada, como no monitor
+amostra = validos[validos > 48][:CHAMADAS_CRONOMETRADAS]
+t = time.perf_counter()
+for i in amostra:
+    passadas = validos[(validos <= i) & (validos > i - 24)][-PONTOS_MODELO_ANTIGO:]
+    modelo_antigo((epochs[passadas] - epochs[i]) / 60.0, niveis[passadas], 1)
+tempo_antigo = (time.perf_counter() - t) / len(amostra)
+
+print(f"\nModelo antigo: {tempo_antigo * 1e6:.0f} µs por previsão (refaz a regressão)")
+print(f"Modelo novo:   {tempo_novo / len(teste) * 1e6:.1f} µs por leitura nova (atualização incremental)")
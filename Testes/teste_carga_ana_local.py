@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import cliente_ana
+from servidor_ana_local import ServidorAnaLocal, carregar_series
+
+# Configuração
+PORTA = 8799
+REQUISICOES = 200
+SIMULTANEAS = 8
+LATENCIA = 0.05      # atraso simulado por resposta (s)
+TAXA_ERRO = 0.05     # 5% de 503 (o cliente tenta de novo sozinho)
+PERIODO = ("01/01/2022", "02/01/2022")   # ~24h, como o monitor pede
+ESTACAO = "56696000"
+
+print("=" * 40)
+print("   TESTE DE CARGA - ANA LOCAL")
+print("=" * 40)
+
+servidor = ServidorAnaLocal(("127.0.0.1", PORTA), carregar_series(), latencia=LATENCIA, taxa_erro=TAXA_ERRO)
+threading.Thread(target=servidor.serve_forever, daemon=True).start()
+url = f"http://127.0.0.1:{PORTA}/ServiceANA.asmx"
+
+def uma_busca(_):
+    inicio = time.perf_counter()
+    serie = cliente_ana.buscar_serie(ESTACAO, *PERIODO, url_base=url)
+    return time.perf_counter() - inicio, len(serie)
+
+t0 = time.perf_counter()
+with ThreadPoolExecutor(max_workers=SIMULTANEAS) as executor:
+    resultados = list(executor.map(uma_busca, range(REQUISICOES)))
+total = time.perf_counter() - t0
+servidor.shutdown()
+
+tempos = np.array([r[0] for r in resultados]) * 1000
+print(f"\nLeituras por resposta: {resultados[0][1]}")
+print(f"Requisições: {REQUISICOES} em {total:.2f}s ({REQUISICOES / total:.1f} req/s)")
+print(f"Latência p50: {np.percentile(tempos, 50):.0f} ms | p90: {np.percentile(tempos, 90):.0f} ms | p99: {np.percentile(tempos, 99):.0f} ms")
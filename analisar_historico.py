@@ -1,14 +1,62 @@
 import csv
 from datetime import datetime
+import banco_rio
+import estacoes
 
 # Nome do arquivo CSV (Verifique se o nome está exato)
 ARQUIVO = "historico_guilman.csv"
 
-def analisar_padroes():
-    print(f"📊 Analisando histórico de: {ARQUIVO}...")
+def picos_do_banco():
+    """
+    Picos anuais de vazão da Guilman pelo resumo diário do rio_doce.db
+    (algumas centenas de linhas, em vez de varrer o CSV inteiro):
+    {ano: (pico, data dd/mm/aaaa)}. Retorna {} se o banco ainda não tiver a Guilman.
+    """
+    try:
+        conn = banco_rio.conectar()
+        picos = banco_rio.picos_anuais(conn, estacoes.codigo("guilman"), "vazao")
+        conn.close()
+    except Exception as e:
+        print(f"⚠️ Banco indisponível ({e}), só o CSV.")
+        return {}
+    return {str(ano): (pico, dia.strftime("%d/%m/%Y")) for ano, (pico, dia) in picos.items()}
+
+def juntar_picos(*fontes):
+    """Pico de cada ano entre as fontes ({ano: (pico, data)}): o banco pode ter só os últimos dias, o CSV não tem os mais novos."""
+    picos = {}
+    for fonte in fontes:
+        for ano, (pico, data) in fonte.items():
+            if ano not in picos or pico > picos[ano][0]:
+                picos[ano] = (pico, data)
+    return picos
+
+def imprimir_resultado(picos_anuais, maxima_historica, data_maxima, linhas_lidas):
+    print(f"\n--- 🌊 ANÁLISE CONCLUÍDA ({linhas_lidas} registros) ---")
+    print(f"🚨 MAIOR VAZÃO JÁ REGISTRADA: {maxima_historica:.0f} m³/s")
+    print(f"📅 Data do recorde: {data_maxima}")
+    
+    print("\n📈 Picos de Vazão por Ano:")
+    anos_ordenados = sorted(picos_anuais.keys())
+    for ano in anos_ordenados:
+        print(f"   • {ano}: {picos_anuais[ano]:.0f} m³/s")
+        
+    # CÁLCULO DOS GATILHOS (A parte mais importante!)
+    # Sugestão: Alerta em 50% do pior caso, Crítico em 80%
+    gatilho_alerta = maxima_historica * 0.5 
+    gatilho_critico = maxima_historica * 0.8 
     
-    maxima_historica = 0.0
-    data_maxima = ""
+    print("\n⚙️ COPIL NO 'MONITOR_DEFINITIVO.PY':")
+    print("-" * 40)
+    print(f"VAZAO_ALERTA_GUILMAN = {gatilho_alerta:.0f}   # Início de Atenção")
+    print(f"VAZAO_CRITICA_GUILMAN = {gatilho_critico:.0f}  # Risco Real de Enchente")
+    print("-" * 40)
+
+def picos_do_csv():
+    """
+    Picos anuais de vazão lidos do ARQUIVO: ({ano: (pico, data)}, linhas lidas).
+    Sem o arquivo (ou sem as colunas), ({}, 0).
+    """
+    print(f"📊 Analisando histórico de: {ARQUIVO}...")
     
     # Dicionário para guardar o pico de cada ano/temporada
     picos_anuais = {} 
@@ -32,7 +80,7 @@ def analisar_padroes():
             if 'vazao' not in leitor.fieldnames or 'data_hora' not in leitor.fieldnames:
                 print(f"❌ Erro: As colunas 'vazao' e 'data_hora' não foram encontradas.")
                 print(f"Colunas detectadas: {leitor.fieldnames}")
-                return
+                return {}, 0
 
             print(f"✅ Colunas detectadas: {leitor.fieldnames}")
 
@@ -51,13 +99,8 @@ def analisar_padroes():
                     vazao = float(vazao_str)
                     
                     linhas_lidas += 1
-                    
-                    # 1. Checar Máxima Histórica
-                    if vazao > maxima_historica:
-                        maxima_historica = vazao
-                        data_maxima = data_str
                         
-                    # 2. Agrupar por Ano (para ver tendências)
+                    # Agrupar por Ano (para ver tendências)
                     # Pega os últimos 4 caracteres da data (supõe formato .../YYYY)
                     # Se sua data for YYYY-..., ajustaremos
                     if "/" in data_str:
@@ -67,37 +110,32 @@ def analisar_padroes():
                     else:
                         ano = "Desc."
 
-                    if ano not in picos_anuais or vazao > picos_anuais[ano]:
-                        picos_anuais[ano] = vazao
+                    if ano not in picos_anuais or vazao > picos_anuais[ano][0]:
+                        picos_anuais[ano] = (vazao, data_str)
                         
                 except ValueError:
                     linhas_ignoradas += 1
                     continue
 
-        print(f"\n--- 🌊 ANÁLISE CONCLUÍDA ({linhas_lidas} registros) ---")
-        print(f"🚨 MAIOR VAZÃO JÁ REGISTRADA: {maxima_historica:.0f} m³/s")
-        print(f"📅 Data do recorde: {data_maxima}")
-        
-        print("\n📈 Picos de Vazão por Ano:")
-        anos_ordenados = sorted(picos_anuais.keys())
-        for ano in anos_ordenados:
-            print(f"   • {ano}: {picos_anuais[ano]:.0f} m³/s")
-            
-        # CÁLCULO DOS GATILHOS (A parte mais importante!)
-        # Sugestão: Alerta em 50% do pior caso, Crítico em 80%
-        gatilho_alerta = maxima_historica * 0.5 
-        gatilho_critico = maxima_historica * 0.8 
-        
-        print("\n⚙️ COPIL NO 'MONITOR_DEFINITIVO.PY':")
-        print("-" * 40)
-        print(f"VAZAO_ALERTA_GUILMAN = {gatilho_alerta:.0f}   # Início de Atenção")
-        print(f"VAZAO_CRITICA_GUILMAN = {gatilho_critico:.0f}  # Risco Real de Enchente")
-        print("-" * 40)
-
     except FileNotFoundError:
         print(f"❌ Erro: Arquivo '{ARQUIVO}' não encontrado.")
     except Exception as e:
         print(f"❌ Erro inesperado: {e}")
+    return picos_anuais, linhas_lidas
+
+def analisar_padroes():
+    picos_csv, linhas_lidas = picos_do_csv()
+    picos_banco = picos_do_banco()
+    if picos_banco:
+        print(f"📊 Completando com o resumo diário do rio_doce.db ({len(picos_banco)} anos)...")
+    picos = juntar_picos(picos_csv, picos_banco)
+    if not picos:
+        print("❌ Nenhum dado de vazão da Guilman (nem CSV nem banco).")
+        return
+
+    ano_max = max(picos, key=lambda ano: picos[ano][0])
+    imprimir_resultado({ano: pico for ano, (pico, _data) in picos.items()},
+                       picos[ano_max][0], picos[ano_max][1], linhas_lidas)
 
 if __name__ == "__main__":
     analisar_padroes()
\ No newline at end of file
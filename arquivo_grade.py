@@ -0,0 +1,214 @@
+"""
+ARQUIVO BINÁRIO EM GRADE DE 15 MINUTOS
+Um arquivo por estação em arquivo_rio/<codigo>.grade: cabeçalho de 16 bytes
+(marca + epoch do primeiro slot) e depois um registro float32 (nivel, vazao, chuva)
+por slot de 15 min, NaN onde não houve leitura. Aberto com numpy.memmap:
+achar um horário é uma conta (slot = (epoch - origem) / 900) e um período é uma
+fatia do arquivo, sem carregar CSV nem criar objetos Python por leitura.
+Os epochs são os mesmos da série (horário local da ANA, ver serie_estacao).
+
+Uso: python arquivo_grade.py   (atualiza a grade de todas as estações a partir do rio_doce.db)
+     python arquivo_grade.py reconstruir   (apaga e refaz do zero)
+"""
+import os
+import sys
+from datetime import timedelta
+
+import numpy as np
+
+import banco_rio
+import estacoes
+from serie_estacao import SerieEstacao, datetime_para_epoch, epoch_para_datetime
+
+PASTA_GRADE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "arquivo_rio")
+
+INTERVALO = 900  # segundos por slot (15 min, a cadência da telemetria)
+CAMPOS = ("nivel", "vazao", "chuva")
+MARCA = b"RIOGRD01"
+CABECALHO = np.dtype([("marca", "S8"), ("origem", "<i8")])
+REGISTRO = np.dtype("<f4")
+TOLERANCIA_PADRAO = 4  # slots (1h) de folga quando o horário exato não tem leitura
+
+# ==============================================================================
+# ABERTURA
+# ==============================================================================
+def caminho_grade(codigo):
+    return os.path.join(PASTA_GRADE, f"{codigo}.grade")
+
+def abrir(codigo, modo="r"):
+    """
+    (origem, dados) da estação: `dados` é um memmap (slots, 3) float32 com as
+    colunas de CAMPOS. Retorna (None, None) se a estação ainda não tem grade.
+    """
+    caminho = caminho_grade(codigo)
+    if not os.path.exists(caminho):
+        return None, None
+    cabecalho = np.fromfile(caminho, dtype=CABECALHO, count=1)
+    if not len(cabecalho) or cabecalho[0]["marca"] != MARCA:
+        raise ValueError(f"Arquivo de grade inválido: {caminho}")
+    origem = int(cabecalho[0]["origem"])
+    slots = (os.path.getsize(caminho) - CABECALHO.itemsize) // (REGISTRO.itemsize * len(CAMPOS))
+    if slots == 0:
+        return origem, np.empty((0, len(CAMPOS)), dtype=REGISTRO)
+    dados = np.memmap(caminho, dtype=REGISTRO, mode=modo, offset=CABECALHO.itemsize, shape=(slots, len(CAMPOS)))
+    return origem, dados
+
+def _criar(codigo, origem, dados):
+    """Escreve a grade inteira num arquivo novo (troca atômica com o antigo)."""
+    os.makedirs(PASTA_GRADE, exist_ok=True)
+    caminho = caminho_grade(codigo)
+    temporario = caminho + ".tmp"
+    cabecalho = np.array([(MARCA, origem)], dtype=CABECALHO)
+    with open(temporario, "wb") as f:
+        cabecalho.tofile(f)
+        np.ascontiguousarray(dados, dtype=REGISTRO).tofile(f)
+    os.replace(temporario, caminho)
+
+# ==============================================================================
+# ESCRITA
+# ==============================================================================
+def gravar_serie(serie):
+    """
+    Coloca as leituras da SerieEstacao na grade (cada uma no slot mais próximo).
+    Cresce o arquivo no fim quando chegam datas novas; NaN não apaga valor já gravado.
+    Retorna quantos slots foram escritos.
+    """
+    if not len(serie):
+        return 0
+    slots = np.rint(serie.epoch / INTERVALO).astype(np.int64) * INTERVALO
+    valores = np.column_stack([serie.nivel, serie.vazao, serie.chuva]).astype(REGISTRO)
+
+    origem, dados = abrir(serie.codigo)
+    if origem is None or slots.min() < origem:
+        # Grade nova, ou leituras antes do início: refaz o arquivo com a origem recuada
+        nova_origem = int(slots.min()) if origem is None else min(origem, int(slots.min()))
+        fim = int(slots.max()) if origem is None else max(int(slots.max()), origem + (len(dados) - 1) * INTERVALO)
+        grade = np.full(((fim - nova_origem) // INTERVALO + 1, len(CAMPOS)), np.nan, dtype=REGISTRO)
+        if origem is not None and len(dados):
+            inicio = (origem - nova_origem) // INTERVALO
+            grade[inicio:inicio + len(dados)] = dados
+            del dados
+        _mesclar(grade, (slots - nova_origem) // INTERVALO, valores)
+        _criar(serie.codigo, nova_origem, grade)
+        return len(slots)
+
+    atuais = len(dados)
+    del dados
+    necessarios = (int(slots.max()) - origem) // INTERVALO + 1
+    if necessarios > atuais:
+        with open(caminho_grade(serie.codigo), "ab") as f:
+            np.full((necessarios - atuais, len(CAMPOS)), np.nan, dtype=REGISTRO).tofile(f)
+    origem, dados = abrir(serie.codigo, "r+")
+    _mesclar(dados, (slots - origem) // INTERVALO, valores)
+    dados.flush()
+    del dados
+    return len(slots)
+
+def _mesclar(grade, indices, valores):
+    atuais = grade[indices]
+    grade[indices] = np.where(np.isnan(valores), atuais, valores)
+
+def atualizar_do_banco(codigo, conn=None):
+    """
+    Traz para a grade o que a série `leituras` tem de novo (a partir de um dia
+    antes do fim da grade, para pegar leituras atrasadas). Retorna os slots escritos.
+    """
+    origem, dados = abrir(codigo)
+    desde = None
+    if origem is not None and len(dados):
+        ultimo = origem + (len(dados) - 1) * INTERVALO
+        desde = epoch_para_datetime(ultimo) - timedelta(days=1)
+    del dados
+
+    proprio = conn is None
+    conn = conn or banco_rio.conectar()
+    try:
+        serie = banco_rio.ler_serie(conn, codigo, inicio=desde)
+    finally:
+        if proprio:
+            conn.close()
+    return gravar_serie(serie)
+
+# ==============================================================================
+# LEITURA
+# ==============================================================================
+def janela(codigo, inicio, fim):
+    """
+    Grade entre dois datetimes: (epochs, dados) com `dados` (slots, 3) sendo uma
+    fatia do memmap (sem cópia). Fora do arquivo, devolve vetores vazios.
+    """
+    origem, dados = abrir(codigo)
+    if origem is None:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(CAMPOS)), dtype=REGISTRO)
+    i = max(0, -(-(datetime_para_epoch(inicio) - origem) // INTERVALO))
+    j = min(len(dados), (datetime_para_epoch(fim) - origem) // INTERVALO + 1)
+    if j <= i:
+        return np.empty(0, dtype=np.int64), dados[0:0]
+    epochs = origem + np.arange(i, j, dtype=np.int64) * INTERVALO
+    return epochs, dados[i:j]
+
+def serie(codigo, inicio, fim):
+    """SerieEstacao do período (só os slots com alguma leitura)."""
+    epochs, dados = janela(codigo, inicio, fim)
+    com_leitura = ~np.isnan(dados).all(axis=1)
+    return SerieEstacao(codigo, epochs[com_leitura], dados[com_leitura, 0], dados[com_leitura, 1], dados[com_leitura, 2])
+
+def _valor_proximo(origem, dados, momento, coluna, tolerancia_slots):
+    alvo = int(round((datetime_para_epoch(momento) - origem) / INTERVALO))
+    i, j = max(0, alvo - tolerancia_slots), min(len(dados), alvo + tolerancia_slots + 1)
+    if j <= i:
+        return None
+    trecho = np.asarray(dados[i:j, coluna])
+    validos = np.flatnonzero(~np.isnan(trecho))
+    if not validos.size:
+        return None
+    melhor = validos[np.argmin(np.abs(validos + i - alvo))]
+    return round(float(trecho[melhor]), 2)  # float32 -> as 2 casas que a ANA manda
+
+def valor_em(codigo, momento, campo="nivel", tolerancia_slots=TOLERANCIA_PADRAO):
+    """
+    Valor de `campo` no slot de `momento` ou, se estiver vazio, no slot com leitura
+    mais próximo dentro da tolerância. None se não houver.
+    """
+    origem, dados = abrir(codigo)
+    if origem is None:
+        return None
+    return _valor_proximo(origem, dados, momento, CAMPOS.index(campo), tolerancia_slots)
+
+def no_ano(momento, ano):
+    """O mesmo dia/horário em `ano` (29/02 vira 28/02 em ano não bissexto)."""
+    try:
+        return momento.replace(year=ano)
+    except ValueError:
+        return momento.replace(year=ano, day=28)
+
+def mesma_data(codigo, momento, anos, campo="nivel", tolerancia_slots=TOLERANCIA_PADRAO):
+    """{ano: valor} do mesmo dia/horário de `momento` em cada ano (29/02 vira 28/02 em ano comum)."""
+    origem, dados = abrir(codigo)
+    if origem is None:
+        return {}
+    resultado = {}
+    for ano in anos:
+        valor = _valor_proximo(origem, dados, no_ano(momento, ano), CAMPOS.index(campo), tolerancia_slots)
+        if valor is not None:
+            resultado[ano] = valor
+    return resultado
+
+# ==============================================================================
+# MANUTENÇÃO
+# ==============================================================================
+def atualizar_todas(do_zero=False):
+    conn = banco_rio.conectar()
+    try:
+        for item in estacoes.ativas():
+            if do_zero and os.path.exists(caminho_grade(item["codigo"])):
+                os.remove(caminho_grade(item["codigo"]))
+            total = atualizar_do_banco(item["codigo"], conn)
+            origem, dados = abrir(item["codigo"])
+            tamanho = 0 if dados is None else len(dados)
+            print(f"✅ {item['nome']}: {total} leituras gravadas, grade com {tamanho} slots.")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    atualizar_todas(do_zero="reconstruir" in sys.argv[1:])
@@ -1,107 +1,199 @@
-import requests
-import xml.etree.ElementTree as ET
 import sqlite3
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, date, timedelta
 import time
+import arquivo_grade
+import cliente_ana
+import banco_rio
+import estacoes
+from serie_estacao import datetime_para_epoch
 
-# Estação Timóteo
-ESTACAO_ID = "56750000" 
+# Estação Timóteo (a tabela `historico` é sempre de Timóteo)
+ESTACAO_ID = estacoes.codigo("timoteo")
+TAMANHO_LOTE = 5000  # leituras por INSERT em lote
+
+# --- MOTOR DE COLHEITA ---
+DIAS_POR_BLOCO = 10       # blocos pequenos: um timeout perde só 10 dias, não 2 meses
+TRABALHADORES = 3         # blocos baixando ao mesmo tempo
+INTERVALO_MINIMO = 1.0    # segundos entre o início de duas requisições (limite global)
+MAX_RODADAS = 3           # quantas vezes repetimos os blocos que falharam
 
 def salvar_no_banco(dados):
     if not dados: return
-    conn = sqlite3.connect("rio_doce.db")
-    cursor = conn.cursor()
-    # Usamos INSERT OR IGNORE para evitar duplicados
-    cursor.executemany(
-        "INSERT OR IGNORE INTO historico (data_hora, nivel) VALUES (?, ?)", dados
-    )
-    conn.commit()
-    conn.close()
+    # Upsert na conexão de escrita compartilhada: repetir um bloco não duplica nada
+    with banco_rio.escrita() as conn:
+        banco_rio.gravar_leituras(conn, ESTACAO_ID, dados)
 
 def buscar_ana_v2(data_inicio, data_fim):
     """
-    Usa o endpoint de telemetria que é mais estável para dados históricos.
+    Vai no endpoint da ANA mais rápido no momento (o SNIRH entra na rotação).
+    Gera tuplas (epoch, nivel, vazao, chuva) para a tabela `leituras`
+    conforme o XML chega (streaming), sem montar a resposta inteira na memória.
     """
-    # A API da ANA exige o formato dd/mm/yyyy
-    url = "https://www.snirh.gov.br/ServiceANA/ServiceANA.asmx/DadosHidrometrologicos"
-    params = {
-        "codEstacao": ESTACAO_ID,
-        "dataInicio": data_inicio,
-        "dataFim": data_fim
+    leituras = cliente_ana.iterar_leituras(
+        ESTACAO_ID, data_inicio, data_fim, timeout=60, valor_ausente=None
+    )
+    for data, nivel, vazao, chuva in leituras:
+        # Leituras sem nenhum valor (campos vazios) não entram no banco
+        if nivel is not None or vazao is not None or chuva is not None:
+            yield (datetime_para_epoch(data), nivel, vazao, chuva)
+
+def salvar_em_lotes(leituras):
+    """Grava o fluxo de leituras no banco em lotes (memória constante). Retorna o total."""
+    total = 0
+    lote = []
+    for linha in leituras:
+        lote.append(linha)
+        if len(lote) >= TAMANHO_LOTE:
+            salvar_no_banco(lote)
+            total += len(lote)
+            lote = []
+    salvar_no_banco(lote)
+    return total + len(lote)
+
+# ==============================================================================
+# LIMITADOR DE TAXA E CHECKPOINT
+# ==============================================================================
+class LimitadorTaxa:
+    """Garante um intervalo mínimo entre requisições, somando todas as threads."""
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self.proxima = 0.0
+        self.trava = threading.Lock()
+
+    def aguardar(self):
+        with self.trava:
+            agora = time.monotonic()
+            espera = self.proxima - agora
+            self.proxima = max(agora, self.proxima) + self.intervalo
+        if espera > 0:
+            time.sleep(espera)
+
+def preparar_checkpoint(conn, blocos):
+    """Registra os blocos a colher. Blocos já concluídos em execuções anteriores são mantidos."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS colheita_blocos (
+            codigo TEXT NOT NULL,
+            inicio TEXT NOT NULL,
+            fim TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pendente',
+            registros INTEGER DEFAULT 0,
+            tentativas INTEGER DEFAULT 0,
+            erro TEXT,
+            atualizado_em TEXT,
+            PRIMARY KEY (codigo, inicio, fim)
+        )
+    """)
+    conn.executemany(
+        "INSERT OR IGNORE INTO colheita_blocos (codigo, inicio, fim) VALUES (?, ?, ?)",
+        [(ESTACAO_ID, ini.isoformat(), fim.isoformat()) for ini, fim in blocos]
+    )
+    conn.commit()
+
+def marcar_bloco(conn, inicio, fim, status, registros=0, erro=None):
+    conn.execute("""
+        UPDATE colheita_blocos
+        SET status = ?, registros = ?, erro = ?, tentativas = tentativas + 1, atualizado_em = ?
+        WHERE codigo = ? AND inicio = ? AND fim = ?
+    """, (status, registros, erro, datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+          ESTACAO_ID, inicio.isoformat(), fim.isoformat()))
+    conn.commit()
+
+def blocos_pendentes(conn, blocos):
+    """Dos blocos pedidos, os que ainda não foram concluídos (pendentes ou com falha)."""
+    concluidos = {
+        (ini, fim) for ini, fim in conn.execute(
+            "SELECT inicio, fim FROM colheita_blocos WHERE codigo = ? AND status = 'ok'", (ESTACAO_ID,)
+        )
     }
-    
+    return [(ini, fim) for ini, fim in blocos if (ini.isoformat(), fim.isoformat()) not in concluidos]
+
+# ==============================================================================
+# MOTOR DE COLHEITA
+# ==============================================================================
+def periodos_temporada(anos):
+    """Temporada de chuvas de cada ano: 1º de novembro até o fim de fevereiro seguinte."""
+    return [(date(ano, 11, 1), date(ano + 1, 3, 1) - timedelta(days=1)) for ano in anos]
+
+def dividir_em_blocos(periodos, dias=DIAS_POR_BLOCO, hoje=None):
+    """Quebra os períodos em blocos de `dias` dias, sem passar de ontem (dia completo)."""
+    limite = (hoje or date.today()) - timedelta(days=1)
+    blocos = []
+    for inicio, fim in periodos:
+        fim = min(fim, limite)
+        while inicio <= fim:
+            fim_bloco = min(inicio + timedelta(days=dias - 1), fim)
+            blocos.append((inicio, fim_bloco))
+            inicio = fim_bloco + timedelta(days=1)
+    return blocos
+
+def colher_bloco(inicio, fim, limitador):
+    limitador.aguardar()
+    return salvar_em_lotes(buscar_ana_v2(inicio.strftime("%d/%m/%Y"), fim.strftime("%d/%m/%Y")))
+
+def levar_para_grade(blocos):
+    """Passa os blocos colhidos para a grade binária, de onde o monitor lê a "mesma data"."""
+    conn = banco_rio.conectar()
     try:
-        response = requests.get(url, params=params, timeout=60)
-        
-        # Se não for 200 ou estiver vazio, aborta
-        if response.status_code != 200 or not response.content:
-            print(f"⚠️ Erro API: Status {response.status_code}")
-            return []
-
-        # Tenta parsear o XML
-        tree = ET.fromstring(response.content)
-        dados_batch = []
-        
-        for dado in tree.findall(".//DadosHidrometrologicos"):
-            # A API da ANA pode retornar 'Cota' ou 'Nivel' dependendo do endpoint
-            data_str = dado.find("DataHora").text if dado.find("DataHora") is not None else None
-            nivel = dado.find("Cota").text if dado.find("Cota") is not None else None
-            
-            if data_str and nivel and nivel.strip():
-                try:
-                    # Formata a data para o padrão do SQLite (YYYY-MM-DD HH:MM:SS)
-                    # A ANA envia: 2019-11-01 00:00:00 ou dd/mm/yyyy...
-                    # Vamos garantir o parse correto:
-                    if "-" in data_str:
-                        dt = datetime.strptime(data_str, "%Y-%m-%d %H:%M:%S")
-                    else:
-                        dt = datetime.strptime(data_str, "%d/%m/%Y %H:%M:%S")
-                    
-                    dados_batch.append((dt.strftime("%Y-%m-%d %H:%M:%S"), float(nivel)))
-                except:
-                    continue
-        
-        return dados_batch
-    except Exception as e:
-        print(f"❌ Erro na requisição: {e}")
-        return []
-
-def executor_colheita_historica():
+        for ini, fim in blocos:
+            inicio = datetime.combine(ini, datetime.min.time())
+            final = datetime.combine(fim, datetime.max.time())
+            arquivo_grade.gravar_serie(banco_rio.ler_serie(conn, ESTACAO_ID, inicio, final))
+    finally:
+        conn.close()
+
+def executor_colheita_historica(anos=range(2019, 2026)):
+    """
+    Colheita paralela e retomável: blocos pequenos, alguns ao mesmo tempo sob um
+    limitador global. Cada bloco concluído fica registrado em `colheita_blocos`;
+    se o processo cair, a próxima execução pula o que já foi feito e repete só
+    os blocos que falharam.
+    """
     print("🌊 Iniciando Colheita Automática de Dados Críticos (Nov-Fev)...")
-    
-    # Range de anos solicitado
-    anos = range(2019, 2026) # De 2019 até 2025
-    
-    for ano in anos:
-        # Definimos os dois blocos críticos por ano
-        periodos = [
-            (f"01/11/{ano}", f"31/12/{ano}"),  # Início da temporada
-            (f"01/01/{ano+1}", f"28/02/{ano+1}") # Pico da temporada
-        ]
-        
-        for inicio, fim in periodos:
-            # Não buscar datas no futuro (ex: fev/2026)
-            dt_fim_obj = datetime.strptime(fim, "%d/%m/%Y")
-            if dt_fim_obj > datetime.now():
-                continue
-
-            print(f"⏳ Baixando: {inicio} até {fim}...")
-            dados = buscar_ana_v2(inicio, fim)
-            
-            if dados:
-                salvar_no_banco(dados)
-                print(f"✅ {len(dados)} registros salvos no banco.")
-            else:
-                print("ℹ️ Nenhum dado encontrado neste período.")
-            
-            # Pausa para não sobrecarregar a API
-            time.sleep(3)
 
-if __name__ == "__main__":
-    # Garante que a tabela existe antes de começar
-    conn = sqlite3.connect("rio_doce.db")
-    conn.execute("CREATE TABLE IF NOT EXISTS historico (data_hora DATETIME UNIQUE, nivel REAL)")
+    blocos = dividir_em_blocos(periodos_temporada(anos))
+    conn = sqlite3.connect(banco_rio.CAMINHO_BANCO, timeout=30)
+    preparar_checkpoint(conn, blocos)
+    limitador = LimitadorTaxa(INTERVALO_MINIMO)
+    total_geral = 0
+    colhidos = []
+
+    for rodada in range(1, MAX_RODADAS + 1):
+        pendentes = blocos_pendentes(conn, blocos)
+        if not pendentes:
+            break
+        print(f"⏳ Rodada {rodada}: {len(pendentes)} de {len(blocos)} blocos a baixar...")
+
+        with ThreadPoolExecutor(max_workers=TRABALHADORES) as executor:
+            futuros = {executor.submit(colher_bloco, ini, fim, limitador): (ini, fim) for ini, fim in pendentes}
+            for futuro in as_completed(futuros):
+                ini, fim = futuros[futuro]
+                periodo = f"{ini:%d/%m/%Y} até {fim:%d/%m/%Y}"
+                try:
+                    total = futuro.result()
+                    marcar_bloco(conn, ini, fim, "ok", registros=total)
+                    total_geral += total
+                    if total:
+                        colhidos.append((ini, fim))
+                    print(f"✅ {periodo}: {total} registros salvos no banco.")
+                except Exception as e:
+                    marcar_bloco(conn, ini, fim, "falhou", erro=str(e))
+                    print(f"❌ {periodo}: {e}")
+
+    restantes = blocos_pendentes(conn, blocos)
     conn.close()
-    
+
+    print(f"📊 {total_geral} registros gravados nesta execução.")
+    if colhidos:
+        levar_para_grade(colhidos)
+        print(f"🗂️ {len(colhidos)} blocos levados para a grade binária (arquivo_rio/).")
+    if restantes:
+        print(f"⚠️ {len(restantes)} blocos ainda falhando. Rode de novo para tentar só eles.")
+
+if __name__ == "__main__":
+    # Garante que as tabelas existem (e migra a `historico` antiga) antes de começar
+    banco_rio.conectar().close()
+
     executor_colheita_historica()
-    print("\n✨ Processo finalizado! Seu banco local agora tem os dados críticos.")
\ No newline at end of file
+    print("\n✨ Processo finalizado! Seu banco local agora tem os dados críticos.")
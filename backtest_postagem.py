@@ -0,0 +1,220 @@
+"""
+BACKTEST DA ESTRATÉGIA DE POSTAGEM
+Repassa o histórico de Timóteo (arquivo_rio/) pelo estrategia_postagem como se
+o monitor rodasse a cada 15 min desde 2019, com relógio simulado: cada slot da
+grade é um ciclo. As regras são aplicadas em vetores para todos os ciclos de uma
+vez; só o relógio das postagens (intervalo desde a última) anda ciclo a ciclo.
+Responde: quantas postagens sairiam, com quanta antecedência o primeiro alerta
+chegou antes de a água passar da cota de cada rua (dados_ruas) e quantos
+alertas foram alarme falso (o rio não chegou nem na rua mais baixa).
+
+Uso: python backtest_postagem.py                         (histórico inteiro, limites atuais)
+     python backtest_postagem.py 2020 2022                (só esses anos)
+     python backtest_postagem.py limite_alerta=580 velocidade_alerta=8 intervalo_rotina=120
+                                                          (compara com os limites atuais)
+"""
+import sys
+import time
+
+import numpy as np
+
+import arquivo_grade
+import estacoes
+import estrategia_postagem
+import taxas_rio
+from dados_ruas import calcular_risco_por_rua
+
+INTERVALO = arquivo_grade.INTERVALO
+MAX_IDADE_LEITURA_HORAS = 6   # sem leitura nova há mais que isso, o ciclo fica "Sem dados"
+EPISODIO_HORAS = 12           # alertas com menos que isso entre si são o mesmo episódio
+CONFIRMACAO_HORAS = 24        # depois do episódio, prazo para a água chegar na rua mais baixa
+SEPARACAO_CRUZAMENTOS_HORAS = 24  # a mesma cota cruzada de novo antes disso é a mesma cheia
+# Postagens que contam como alerta (subida gradual e rotina são informativas)
+CASOS_ALERTA = (estrategia_postagem.EMERGENCIA, estrategia_postagem.NIVEL_ALTO, estrategia_postagem.SUBIDA_RAPIDA)
+
+# ==============================================================================
+# CICLOS SIMULADOS
+# ==============================================================================
+def ciclos(epochs, niveis):
+    """
+    O que o monitor veria em cada slot: (nível atual, nível anterior, velocidade
+    cm/h, tem_dados). Slot sem leitura repete a última (como a lista da ANA).
+    """
+    n = len(niveis)
+    validos = ~np.isnan(niveis)
+    posicoes = np.arange(n)
+    ultima = np.maximum.accumulate(np.where(validos, posicoes, -1))
+    tem_dados = (ultima >= 0) & ((posicoes - ultima) * INTERVALO <= MAX_IDADE_LEITURA_HORAS * 3600)
+    ultima = np.maximum(ultima, 0)
+
+    # Leitura anterior à última (d_timoteo[1] no monitor)
+    indices_validos = np.flatnonzero(validos)
+    anterior_de = np.zeros(n, dtype=np.int64)
+    anterior_de[indices_validos[1:]] = indices_validos[:-1]
+    if len(indices_validos):
+        anterior_de[indices_validos[0]] = indices_validos[0]
+
+    # Velocidade do monitor: taxa de 1h, ou a de 15 min; sem nenhuma, 0.0
+    taxas = taxas_rio.taxas_grade(niveis, {"15min": 900, "1h": 3600})
+    velocidade = np.where(np.isnan(taxas["1h"]), taxas["15min"], taxas["1h"])
+    velocidade = np.nan_to_num(velocidade, nan=0.0)
+
+    return niveis[ultima], niveis[anterior_de[ultima]], velocidade[ultima], tem_dados
+
+def simular(epochs, niveis, p=estrategia_postagem.PARAMETROS_PADRAO, dados_ciclos=None):
+    """
+    Roda a estratégia em todos os ciclos. Retorna (postagens, casos): índices dos
+    slots em que a postagem sairia e o caso de cada uma (estrategia_postagem.EMERGENCIA...).
+    """
+    nivel, anterior, velocidade, tem_dados = dados_ciclos or ciclos(epochs, niveis)
+    deve, intervalo, caso = estrategia_postagem.decidir_vetor(nivel, anterior, velocidade, p)
+    candidatos = np.flatnonzero(deve & tem_dados)
+
+    # Relógio simulado: só esta parte depende da postagem anterior
+    postagens = []
+    ultima = None
+    for i, minutos_intervalo in zip(candidatos.tolist(), intervalo[candidatos].tolist()):
+        minutos = None if ultima is None else (i - ultima) * INTERVALO / 60
+        if estrategia_postagem.liberar(minutos_intervalo, minutos):
+            postagens.append(i)
+            ultima = i
+    postagens = np.array(postagens, dtype=np.int64)
+    return postagens, caso[postagens]
+
+# ==============================================================================
+# MEDIDAS
+# ==============================================================================
+def cotas_das_ruas():
+    """{cota: [ruas]} do dados_ruas, da mais baixa para a mais alta."""
+    cotas = {}
+    for rua in calcular_risco_por_rua(0):
+        cotas.setdefault(rua["cota_limite"], []).append(f"{rua['nome']} ({rua['apelido']})")
+    return dict(sorted(cotas.items()))
+
+def _cruzamentos(nivel, tem_dados, cota):
+    """Slots em que o nível passou a cota subindo (uma vez por cheia)."""
+    acima = tem_dados & (nivel >= cota)
+    subidas = np.flatnonzero(acima[1:] & ~acima[:-1]) + 1
+    separacao = SEPARACAO_CRUZAMENTOS_HORAS * 3600 // INTERVALO
+    mantidos = []
+    for i in subidas.tolist():
+        if not mantidos or i - mantidos[-1] >= separacao:
+            mantidos.append(i)
+    return np.array(mantidos, dtype=np.int64)
+
+def _episodios(alertas):
+    """Postagens de alerta agrupadas: arrays (início, fim) de cada episódio."""
+    if not len(alertas):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    quebras = np.flatnonzero(np.diff(alertas) > EPISODIO_HORAS * 3600 // INTERVALO)
+    inicios = alertas[np.concatenate(([0], quebras + 1))]
+    fins = alertas[np.concatenate((quebras, [len(alertas) - 1]))]
+    return inicios, fins
+
+def avaliar(epochs, niveis, p=estrategia_postagem.PARAMETROS_PADRAO, anos=None, dados_ciclos=None):
+    """Postagens, antecedência por cota de rua e alarmes falsos (dicionário para imprimir/comparar)."""
+    dados_ciclos = dados_ciclos or ciclos(epochs, niveis)
+    nivel, _, _, tem_dados = dados_ciclos
+    postagens, casos = simular(epochs, niveis, p, dados_ciclos)
+
+    no_periodo = np.ones(len(niveis), dtype=bool)
+    if anos:
+        ano_do_slot = np.asarray(epochs, dtype="datetime64[s]").astype("datetime64[Y]").astype(np.int64) + 1970
+        no_periodo = np.isin(ano_do_slot, list(anos))
+
+    alertas = postagens[np.isin(casos, CASOS_ALERTA)]
+    inicios, fins = _episodios(alertas)
+    cotas = cotas_das_ruas()
+    menor_cota = min(cotas)
+
+    # Alarme falso: o rio não chegou na rua mais baixa até CONFIRMACAO_HORAS depois do episódio
+    confirmacao = CONFIRMACAO_HORAS * 3600 // INTERVALO
+    falsos = 0
+    episodios = 0
+    for inicio, fim in zip(inicios.tolist(), fins.tolist()):
+        if not no_periodo[inicio]:
+            continue
+        episodios += 1
+        fim_confirmacao = min(len(nivel), fim + confirmacao + 1)
+        if not np.any(nivel[inicio:fim_confirmacao][tem_dados[inicio:fim_confirmacao]] >= menor_cota):
+            falsos += 1
+
+    # Antecedência: do início do episódio de alerta em curso até a água passar a cota
+    ruas = []
+    for cota, nomes in cotas.items():
+        cruzamentos = _cruzamentos(nivel, tem_dados, cota)
+        cruzamentos = cruzamentos[no_periodo[cruzamentos]]
+        antecedencias = []
+        sem_aviso = 0
+        for c in cruzamentos.tolist():
+            j = int(np.searchsorted(inicios, c, side="right")) - 1
+            if j >= 0 and fins[j] >= c - EPISODIO_HORAS * 3600 // INTERVALO:
+                antecedencias.append((c - inicios[j]) * INTERVALO / 3600)
+            else:
+                sem_aviso += 1
+        ruas.append({"cota": cota, "ruas": nomes, "cruzamentos": len(cruzamentos),
+                     "sem_aviso": sem_aviso, "antecedencias": antecedencias})
+
+    postagens_periodo = no_periodo[postagens]
+    por_caso = {estrategia_postagem.NOMES_CASOS[c]: int(np.sum(postagens_periodo & (casos == c)))
+                for c in range(len(estrategia_postagem.NOMES_CASOS))}
+    dias = max(1, int(np.sum(no_periodo & tem_dados)) * INTERVALO / 86400)
+    return {
+        "postagens": int(np.sum(postagens_periodo)),
+        "por_dia": float(np.sum(postagens_periodo)) / dias,
+        "por_caso": por_caso,
+        "episodios": episodios,
+        "falsos": falsos,
+        "ruas": ruas,
+    }
+
+# ==============================================================================
+# RELATÓRIO
+# ==============================================================================
+def _mediana(valores):
+    return f"{np.median(valores):5.1f}h" if valores else "    —"
+
+def imprimir(resultado, titulo):
+    print(f"\n=== {titulo} ===")
+    print(f"Postagens: {resultado['postagens']} ({resultado['por_dia']:.1f} por dia com dados)")
+    print("   " + " | ".join(f"{nome}: {total}" for nome, total in resultado["por_caso"].items() if total))
+    falsos = resultado["falsos"]
+    episodios = resultado["episodios"]
+    proporcao = f" ({falsos / episodios * 100:.0f}%)" if episodios else ""
+    print(f"Episódios de alerta: {episodios}, alarmes falsos: {falsos}{proporcao}")
+    print(f"{'Cota':>6}  {'Cheias':>6}  {'Sem aviso':>9}  {'Antecedência mediana':>20}  Ruas")
+    for rua in resultado["ruas"]:
+        print(f"{rua['cota']:>6}  {rua['cruzamentos']:>6}  {rua['sem_aviso']:>9}  {_mediana(rua['antecedencias']):>20}  "
+              f"{'; '.join(rua['ruas'])}")
+
+def _ler_argumentos(argumentos):
+    anos, alteracoes = [], {}
+    for argumento in argumentos:
+        if "=" in argumento:
+            nome, valor = argumento.split("=", 1)
+            alteracoes[nome] = float(valor)
+        else:
+            anos.append(int(argumento))
+    return anos, alteracoes
+
+if __name__ == "__main__":
+    anos, alteracoes = _ler_argumentos(sys.argv[1:])
+    testados = estrategia_postagem.parametros(**alteracoes)  # nome errado para aqui, antes de carregar tudo
+
+    codigo = estacoes.codigo("timoteo")
+    origem, dados = arquivo_grade.abrir(codigo)
+    if origem is None:
+        print("❌ Timóteo ainda não tem grade. Rode: python importar_planilha.py")
+        sys.exit(1)
+    niveis = np.asarray(dados[:, arquivo_grade.CAMPOS.index("nivel")], dtype=np.float64)
+    epochs = origem + np.arange(len(niveis), dtype=np.int64) * INTERVALO
+
+    inicio = time.perf_counter()
+    dados_ciclos = ciclos(epochs, niveis)
+    atual = avaliar(epochs, niveis, estrategia_postagem.PARAMETROS_PADRAO, anos, dados_ciclos)
+    periodo = ", ".join(map(str, anos)) if anos else "histórico inteiro"
+    imprimir(atual, f"Limites atuais ({periodo})")
+    if alteracoes:
+        testado = avaliar(epochs, niveis, testados, anos, dados_ciclos)
+        imprimir(testado, "Testado: " + ", ".join(f"{k}={v:g}" for k, v in alteracoes.items()))
+    print(f"\n⏱️ {len(niveis)} ciclos simulados em {time.perf_counter() - inicio:.1f}s")
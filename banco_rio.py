@@ -0,0 +1,376 @@
+"""
+BANCO LOCAL (rio_doce.db)
+Conexão e tabelas compartilhadas pelo monitor, pelo cliente da ANA e pelos scripts de histórico.
+
+Série histórica: tabela `leituras`, chave (codigo, epoch) com epoch inteiro em
+segundos no horário local da ANA (o mesmo de serie_estacao), WITHOUT ROWID para
+que as leituras de uma estação fiquem juntas no disco e em ordem de tempo.
+A antiga tabela `historico` (só Timóteo, só nível, data em texto) é migrada
+automaticamente na primeira conexão e vira uma VIEW de compatibilidade.
+
+O banco roda em modo WAL: toda escrita passa por uma única conexão persistente
+(`escrita()`), e leitores (painel, pesquisador) nunca bloqueiam nem são bloqueados por ela.
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import estacoes
+from serie_estacao import SerieEstacao, datetime_para_epoch, epoch_para_datetime
+
+CAMINHO_BANCO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rio_doce.db")
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S"
+
+CAMPOS = ("nivel", "vazao", "chuva")
+
+# Resumos por período (segundos de cada período -> tabela)
+TABELAS_RESUMO = {3600: "resumo_hora", 86400: "resumo_dia"}
+
+_escrita = None
+_trava_escrita = threading.Lock()
+# Bancos em que o criar_tabelas (DDL + migração) já rodou neste processo
+_bancos_prontos = set()
+_trava_tabelas = threading.Lock()
+
+def configurar_conexao(conn):
+    # WAL: leitores enxergam o último commit sem travar quem escreve.
+    # NORMAL: em WAL, o commit não espera fsync (só o checkpoint), e o banco continua íntegro se o PC desligar.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+def garantir_tabelas(conn, caminho=None):
+    """criar_tabelas uma vez por processo (e por arquivo); depois disso não custa nada."""
+    caminho = caminho or CAMINHO_BANCO
+    if caminho in _bancos_prontos:
+        return
+    with _trava_tabelas:
+        if caminho not in _bancos_prontos:
+            criar_tabelas(conn)
+            conn.commit()
+            _bancos_prontos.add(caminho)
+
+def conectar():
+    """Abre uma conexão com o rio_doce.db (sempre ao lado dos scripts); as tabelas só são garantidas na primeira."""
+    conn = sqlite3.connect(CAMINHO_BANCO, timeout=30)
+    configurar_conexao(conn)
+    garantir_tabelas(conn)
+    return conn
+
+@contextmanager
+def escrita():
+    """
+    Conexão de escrita única do processo, aberta uma vez e reaproveitada.
+    Cada bloco `with escrita() as conn:` é uma transação (commit no fim, rollback
+    em erro); threads diferentes esperam a vez em vez de disputar o arquivo.
+    """
+    global _escrita
+    with _trava_escrita:
+        if _escrita is None:
+            _escrita = sqlite3.connect(CAMINHO_BANCO, timeout=30, check_same_thread=False)
+            configurar_conexao(_escrita)
+            garantir_tabelas(_escrita)
+        with _escrita:
+            yield _escrita
+
+def fechar_escrita():
+    """Fecha a conexão de escrita (ao encerrar o processo); a próxima escrita reabre."""
+    global _escrita
+    with _trava_escrita:
+        if _escrita is not None:
+            _escrita.close()
+            _escrita = None
+
+def criar_tabelas(conn):
+    # Série histórica de todas as estações (ver docstring do módulo)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS leituras (
+            codigo TEXT NOT NULL,
+            epoch INTEGER NOT NULL,
+            nivel REAL,
+            vazao REAL,
+            chuva REAL,
+            PRIMARY KEY (codigo, epoch)
+        ) WITHOUT ROWID
+    """)
+    # A coluna calculada mes_dia e o seu índice não têm mais uso (a "mesma data"
+    # sai da grade binária); saem dos bancos que já tinham
+    conn.execute("DROP INDEX IF EXISTS idx_leituras_mes_dia")
+    colunas = {linha[1] for linha in conn.execute("PRAGMA table_xinfo(leituras)")}
+    if "mes_dia" in colunas:
+        conn.execute("ALTER TABLE leituras DROP COLUMN mes_dia")
+    # Leituras recentes de cada estação (janela deslizante usada pelo monitor)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS leituras_recentes (
+            codigo TEXT NOT NULL,
+            data_hora TEXT NOT NULL,
+            nivel REAL,
+            vazao REAL,
+            chuva REAL,
+            PRIMARY KEY (codigo, data_hora)
+        )
+    """)
+    # Marca d'água: a leitura mais nova que já temos de cada estação
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS marca_estacoes (
+            codigo TEXT PRIMARY KEY,
+            ultima_leitura TEXT NOT NULL
+        )
+    """)
+    # A "mesma data em anos anteriores" sai da grade binária (arquivo_grade);
+    # o índice antigo em tabela fica só ocupando espaço nos bancos que já tinham
+    conn.execute("DROP TABLE IF EXISTS indice_mesma_data")
+    for tabela in TABELAS_RESUMO.values():
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {tabela} (
+                codigo TEXT NOT NULL,
+                inicio INTEGER NOT NULL,
+                leituras INTEGER NOT NULL,
+                {", ".join(f"{c}_min REAL, {c}_max REAL, {c}_media REAL, {c}_ultimo REAL" for c in CAMPOS)},
+                chuva_total REAL,
+                PRIMARY KEY (codigo, inicio)
+            ) WITHOUT ROWID
+        """)
+    migrar_historico(conn)
+
+# ==============================================================================
+# MIGRAÇÃO DA TABELA ANTIGA `historico`
+# ==============================================================================
+def migrar_historico(conn):
+    """
+    Copia a tabela antiga `historico` (data_hora TEXT, nivel) para `leituras`
+    como Timóteo, guarda o original em `historico_migrado` e cria no lugar uma
+    VIEW `historico` (data_hora, nivel) para consultas antigas continuarem
+    funcionando, e refaz os resumos do trecho copiado (o INSERT direto não passa
+    pelo gravar_leituras). Não faz nada se já migrou. Retorna quantas linhas copiou.
+    """
+    tipo = conn.execute("SELECT type FROM sqlite_master WHERE name = 'historico'").fetchone()
+    if tipo and tipo[0] == "view":
+        return 0
+
+    copiadas = 0
+    with conn:
+        if tipo:
+            # strftime('%s') trata a data como UTC, o que dá exatamente o epoch "horário local" da série
+            cursor = conn.execute("""
+                INSERT INTO leituras (codigo, epoch, nivel)
+                SELECT ?, CAST(strftime('%s', data_hora) AS INTEGER), nivel FROM historico
+                WHERE strftime('%s', data_hora) IS NOT NULL
+                ON CONFLICT(codigo, epoch) DO UPDATE SET nivel = COALESCE(leituras.nivel, excluded.nivel)
+            """, (estacoes.codigo("timoteo"),))
+            copiadas = cursor.rowcount
+            conn.execute("ALTER TABLE historico RENAME TO historico_migrado")
+            faixa = conn.execute("""
+                SELECT MIN(CAST(strftime('%s', data_hora) AS INTEGER)), MAX(CAST(strftime('%s', data_hora) AS INTEGER))
+                FROM historico_migrado WHERE strftime('%s', data_hora) IS NOT NULL
+            """).fetchone()
+            if faixa[0] is not None:
+                atualizar_resumos(conn, estacoes.codigo("timoteo"), faixa[0], faixa[1])
+
+        conn.execute(f"""
+            CREATE VIEW IF NOT EXISTS historico AS
+            SELECT datetime(epoch, 'unixepoch') AS data_hora, nivel FROM leituras
+            WHERE codigo = '{estacoes.codigo("timoteo")}'
+        """)
+    if copiadas:
+        print(f"🗃️ Migração: {copiadas} leituras de 'historico' copiadas para 'leituras'.")
+    return copiadas
+
+# ==============================================================================
+# SÉRIE HISTÓRICA (TABELA `leituras`)
+# ==============================================================================
+def gravar_leituras(conn, codigo, linhas):
+    """
+    Upsert de (epoch, nivel, vazao, chuva) de uma estação. None não apaga um
+    valor que já estava gravado (ex: planilha só com nível não zera a vazão).
+    Quem chama controla a transação. Retorna quantas linhas foram enviadas.
+    """
+    linhas = [(codigo, int(e), n, v, c) for e, n, v, c in linhas]
+    conn.executemany("""
+        INSERT INTO leituras (codigo, epoch, nivel, vazao, chuva) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(codigo, epoch) DO UPDATE SET
+            nivel = COALESCE(excluded.nivel, nivel),
+            vazao = COALESCE(excluded.vazao, vazao),
+            chuva = COALESCE(excluded.chuva, chuva)
+    """, linhas)
+    if linhas:
+        atualizar_resumos(conn, codigo, min(l[1] for l in linhas), max(l[1] for l in linhas))
+    return len(linhas)
+
+def linhas_de_leituras(leituras):
+    """Lista de dicionários {'data', 'nivel', 'vazao', 'chuva'} -> tuplas para gravar_leituras."""
+    return [
+        (datetime_para_epoch(l['data']), l.get('nivel'), l.get('vazao'), l.get('chuva'))
+        for l in leituras
+    ]
+
+def _serie_de_linhas(codigo, linhas):
+    """Linhas (epoch, nivel, vazao, chuva) do SQLite -> SerieEstacao (NULL vira NaN)."""
+    if not linhas:
+        return SerieEstacao.vazia(codigo)
+    epoch, nivel, vazao, chuva = zip(*linhas)
+    nan = float("nan")
+    return SerieEstacao(
+        codigo, epoch,
+        [nan if x is None else x for x in nivel],
+        [nan if x is None else x for x in vazao],
+        [nan if x is None else x for x in chuva],
+    )
+
+def ler_serie(conn, codigo, inicio=None, fim=None):
+    """
+    SerieEstacao da estação entre dois datetimes (inclusive). É uma varredura de
+    faixa na chave primária: serve para gráficos e backtests de anos inteiros.
+    """
+    ini = datetime_para_epoch(inicio) if inicio else -2**62
+    fim = datetime_para_epoch(fim) if fim else 2**62
+    linhas = conn.execute("""
+        SELECT epoch, nivel, vazao, chuva FROM leituras
+        WHERE codigo = ? AND epoch BETWEEN ? AND ?
+        ORDER BY epoch
+    """, (codigo, ini, fim)).fetchall()
+    return _serie_de_linhas(codigo, linhas)
+
+# ==============================================================================
+# LEITURAS RECENTES + MARCA D'ÁGUA
+# ==============================================================================
+def ler_marca(codigo):
+    """Data da leitura mais nova já gravada da estação (ou None)."""
+    conn = conectar()
+    try:
+        linha = conn.execute("SELECT ultima_leitura FROM marca_estacoes WHERE codigo = ?", (codigo,)).fetchone()
+    finally:
+        conn.close()
+    return datetime.strptime(linha[0], FORMATO_DATA) if linha else None
+
+def gravar_recentes(codigo, leituras, descartar_antes=None):
+    """
+    Mescla leituras novas no armazenamento local e avança a marca d'água.
+    Todas as leituras da busca também entram na série `leituras` (histórico
+    completo), tudo na mesma transação da conexão de escrita.
+    Se `descartar_antes` for informado, apaga as recentes mais velhas que ele.
+    """
+    with escrita() as conn:
+        if leituras:
+            conn.executemany(
+                "INSERT OR REPLACE INTO leituras_recentes (codigo, data_hora, nivel, vazao, chuva) VALUES (?, ?, ?, ?, ?)",
+                [(codigo, l['data'].strftime(FORMATO_DATA), l['nivel'], l['vazao'], l['chuva']) for l in leituras]
+            )
+            gravar_leituras(conn, codigo, linhas_de_leituras(leituras))
+            mais_nova = max(l['data'] for l in leituras).strftime(FORMATO_DATA)
+            conn.execute("""
+                INSERT INTO marca_estacoes (codigo, ultima_leitura) VALUES (?, ?)
+                ON CONFLICT(codigo) DO UPDATE SET ultima_leitura = MAX(ultima_leitura, excluded.ultima_leitura)
+            """, (codigo, mais_nova))
+        if descartar_antes:
+            conn.execute(
+                "DELETE FROM leituras_recentes WHERE codigo = ? AND data_hora < ?",
+                (codigo, descartar_antes.strftime(FORMATO_DATA))
+            )
+
+def ler_recentes(codigo, desde, valor_ausente=0.0):
+    """
+    Leituras da estação a partir de `desde`, da mais recente para a mais antiga.
+    Campos sem leitura (NULL) voltam como `valor_ausente`, como no formato antigo.
+    """
+    conn = conectar()
+    try:
+        linhas = conn.execute("""
+            SELECT data_hora, nivel, vazao, chuva FROM leituras_recentes
+            WHERE codigo = ? AND data_hora >= ?
+            ORDER BY data_hora DESC
+        """, (codigo, desde.strftime(FORMATO_DATA))).fetchall()
+    finally:
+        conn.close()
+    def valor(v):
+        return valor_ausente if v is None else v
+
+    return [
+        {"data": datetime.strptime(dt, FORMATO_DATA), "nivel": valor(nivel), "vazao": valor(vazao), "chuva": valor(chuva)}
+        for dt, nivel, vazao, chuva in linhas
+    ]
+
+# ==============================================================================
+# RESUMOS POR HORA E POR DIA
+# ==============================================================================
+def atualizar_resumos(conn, codigo, epoch_inicio, epoch_fim):
+    """
+    Recalcula, a partir da série `leituras`, os resumos por hora e por dia que
+    cobrem [epoch_inicio, epoch_fim]. Só os períodos tocados são refeitos, então
+    gravar uma leitura nova custa uma hora e um dia, e um valor corrigido nunca
+    deixa a média errada. Chamado por gravar_leituras, na mesma transação.
+    """
+    estatisticas = ",\n".join(
+        f"MIN({c}) AS {c}_min, MAX({c}) AS {c}_max, AVG({c}) AS {c}_media, "
+        f"MAX(CASE WHEN {c} IS NOT NULL THEN epoch END) AS epoch_{c}"
+        for c in CAMPOS
+    )
+    colunas = ", ".join(f"{c}_min, {c}_max, {c}_media, {c}_ultimo" for c in CAMPOS)
+    valores = ", ".join(f"g.{c}_min, g.{c}_max, g.{c}_media, u_{c}.{c}" for c in CAMPOS)
+    juncoes = "\n".join(
+        f"LEFT JOIN leituras u_{c} ON u_{c}.codigo = g.codigo AND u_{c}.epoch = g.epoch_{c}"
+        for c in CAMPOS
+    )
+    for periodo, tabela in TABELAS_RESUMO.items():
+        inicio = epoch_inicio - epoch_inicio % periodo
+        fim = epoch_fim - epoch_fim % periodo + periodo
+        conn.execute(f"DELETE FROM {tabela} WHERE codigo = ? AND inicio >= ? AND inicio < ?", (codigo, inicio, fim))
+        conn.execute(f"""
+            WITH g AS (
+                SELECT codigo, epoch - epoch % {periodo} AS inicio, COUNT(*) AS leituras,
+                       {estatisticas}, SUM(chuva) AS chuva_total
+                FROM leituras
+                WHERE codigo = ? AND epoch >= ? AND epoch < ?
+                GROUP BY epoch - epoch % {periodo}
+            )
+            INSERT INTO {tabela} (codigo, inicio, leituras, {colunas}, chuva_total)
+            SELECT g.codigo, g.inicio, g.leituras, {valores}, g.chuva_total
+            FROM g
+            {juncoes}
+        """, (codigo, inicio, fim))
+
+def reconstruir_resumos(conn):
+    """Refaz do zero os resumos de todas as estações (depois de importações antigas ou mudança de regra)."""
+    totais = {}
+    with conn:
+        for tabela in TABELAS_RESUMO.values():
+            conn.execute(f"DELETE FROM {tabela}")
+        estacoes_banco = conn.execute(
+            "SELECT codigo, MIN(epoch), MAX(epoch) FROM leituras GROUP BY codigo"
+        ).fetchall()
+        for codigo, inicio, fim in estacoes_banco:
+            atualizar_resumos(conn, codigo, inicio, fim)
+            totais[codigo] = conn.execute("SELECT COUNT(*) FROM resumo_dia WHERE codigo = ?", (codigo,)).fetchone()[0]
+    return totais
+
+def ler_resumo(conn, codigo, escala="dia", estatistica="media", inicio=None, fim=None):
+    """
+    SerieEstacao com um ponto por hora ('hora') ou por dia ('dia'): `estatistica`
+    ('min', 'max', 'media' ou 'ultimo') de cada campo. Para gráficos de meses ou
+    anos sem carregar as leituras de 15 em 15 minutos.
+    """
+    tabela = {"hora": "resumo_hora", "dia": "resumo_dia"}[escala]
+    if estatistica not in ("min", "max", "media", "ultimo"):
+        raise ValueError(f"Estatística inválida: {estatistica}")
+    ini = datetime_para_epoch(inicio) if inicio else -2**62
+    fim = datetime_para_epoch(fim) if fim else 2**62
+    linhas = conn.execute(f"""
+        SELECT inicio, nivel_{estatistica}, vazao_{estatistica}, chuva_{estatistica} FROM {tabela}
+        WHERE codigo = ? AND inicio BETWEEN ? AND ?
+        ORDER BY inicio
+    """, (codigo, ini, fim)).fetchall()
+    return _serie_de_linhas(codigo, linhas)
+
+def picos_anuais(conn, codigo, campo="nivel"):
+    """{ano: (máximo de `campo`, datetime do dia do pico)} lido do resumo diário."""
+    if campo not in CAMPOS:
+        raise ValueError(f"Campo inválido: {campo}")
+    linhas = conn.execute(f"""
+        SELECT CAST(strftime('%Y', inicio, 'unixepoch') AS INTEGER) AS ano, MAX({campo}_max), inicio
+        FROM resumo_dia
+        WHERE codigo = ? AND {campo}_max IS NOT NULL
+        GROUP BY ano
+        ORDER BY ano
+    """, (codigo,)).fetchall()
+    return {ano: (pico, epoch_para_datetime(dia)) for ano, pico, dia in linhas}
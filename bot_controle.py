@@ -1,13 +1,11 @@
 import telebot
 from telebot import types
-import json
-import os
+import estado_sistema
 
 # ==============================================================================
 # CONFIGURAÇÕES
 # ==============================================================================
 TOKEN_CONTROLE = "8452015218:AAFd0WC9gQ7kKiLqtSo0HYRao_BzlT-GiAU" # Pegue no BotFather
-ARQUIVO_TRAVA = "trava_instagram.json"
 
 bot = telebot.TeleBot(TOKEN_CONTROLE)
 
@@ -17,19 +15,15 @@ bot = telebot.TeleBot(TOKEN_CONTROLE)
 # ==============================================================================
 # FUNÇÕES DE ESTADO
 # ==============================================================================
+# A trava fica no rio_doce.db (estado_sistema), o mesmo que o monitor lê em outro processo
 def ler_estado():
-    if os.path.exists(ARQUIVO_TRAVA):
-        try:
-            with open(ARQUIVO_TRAVA, "r") as f:
-                dados = json.load(f)
-                return dados.get("ativo", True)
-        except:
-            return True # Padrão é ligado se der erro
-    return True # Padrão é ligado se não existir arquivo
+    try:
+        return estado_sistema.instagram_liberado()
+    except Exception:
+        return True # Padrão é ligado se der erro
 
 def salvar_estado(ativo):
-    with open(ARQUIVO_TRAVA, "w") as f:
-        json.dump({"ativo": ativo}, f)
+    estado_sistema.definir_instagram(ativo)
 
 def criar_teclado():
     markup = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
@@ -1,11 +1,14 @@
 import telebot
 from telebot import types
-import requests
-import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
 import csv
 import os
 import re
+import numpy as np
+import cliente_ana
+import banco_rio
+import estacoes
+from serie_estacao import datetime_para_epoch
 
 # --- CORREÇÃO DO ERRO GUI ---
 import matplotlib
@@ -23,15 +26,8 @@ TOKEN_PESQUISADOR = "8421767351:AAGDWLADJ95X4Xz6j3MBfWNGa7v98-jMN5c"
 
 bot = telebot.TeleBot(TOKEN_PESQUISADOR)
 
-# Mapeamento de Nomes para Códigos ANA
-ESTACOES = {
-    "timoteo": "56696000",
-    "timóteo": "56696000",
-    "nova era": "56661000",
-    "guilman": "56675080",
-    "barragem": "56675080",
-    "sa carvalho": "56675080"
-}
+# Nomes e códigos ANA vêm do cadastro (estacoes.json)
+ESTACAO_PADRAO = estacoes.estacao("timoteo")
 
 def criar_menu_principal():
     markup = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
@@ -54,74 +50,66 @@ def criar_menu_principal():
 # FUNÇÕES DE BUSCA
 # ==============================================================================
 def buscar_historico_ana(codigo, data_inicio, data_fim):
-    """Busca dados brutos na ANA e retorna uma lista de dicionários"""
-    url = "https://telemetriaws1.ana.gov.br/ServiceANA.asmx/DadosHidrometeorologicos"
-    
-    params = {
-        "codEstacao": codigo,
-        "dataInicio": data_inicio,
-        "dataFim": data_fim
-    }
-    
+    """Busca dados brutos na ANA e retorna uma SerieEstacao (colunas NumPy) ou None"""
     try:
-        response = requests.get(url, params=params, timeout=60)
-        if response.status_code == 200:
-            root = ET.fromstring(response.content)
-            dados = []
-            
-            for leitura in root.iter("DadosHidrometereologicos"):
-                dt_str = leitura.find("DataHora")
-                nivel = leitura.find("Nivel")
-                vazao = leitura.find("Vazao")
-                chuva = leitura.find("Chuva") # <--- [NOVO]
-                
-                if dt_str is not None:
-                    try:
-                        val_nivel = float(nivel.text) if (nivel is not None and nivel.text) else 0.0
-                        val_vazao = float(vazao.text) if (vazao is not None and vazao.text) else 0.0
-                        # [NOVO] Captura Chuva (se vazio, assume 0)
-                        val_chuva = float(chuva.text) if (chuva is not None and chuva.text) else 0.0
-                        
-                        dados.append({
-                            "Data": dt_str.text.strip(),
-                            "Nivel_cm": val_nivel,
-                            "Vazao_m3s": val_vazao,
-                            "Chuva_mm": val_chuva # <--- [NOVO]
-                        })
-                    except: continue
-            
-            dados.sort(key=lambda x: datetime.strptime(x['Data'], "%Y-%m-%d %H:%M:%S"))
-            return dados
+        # Streaming + colunas: períodos de anos não viram XML inteiro nem milhares de dicionários
+        return cliente_ana.buscar_serie(codigo, data_inicio, data_fim, timeout=60)
     except Exception as e:
         print(f"Erro na API: {e}")
-        return []
-    return []
+        return None
+
+# Períodos maiores que isso saem do resumo por hora do rio_doce.db (máximo de cada hora)
+DIAS_PARA_RESUMO = 31
+
+def buscar_resumo_local(codigo, data_inicio, data_fim):
+    """
+    Para períodos longos: um ponto por hora lido do resumo do banco local
+    (centenas de linhas em vez de dezenas de milhares). Retorna None se o
+    período for curto ou se o banco não cobrir o período todo.
+    """
+    inicio = datetime.strptime(data_inicio, "%d/%m/%Y")
+    fim = min(datetime.strptime(data_fim, "%d/%m/%Y") + timedelta(days=1), datetime.now())
+    if (fim - inicio).days <= DIAS_PARA_RESUMO:
+        return None
+    try:
+        conn = banco_rio.conectar()
+        serie = banco_rio.ler_resumo(conn, codigo, "hora", "max", inicio, fim)
+        conn.close()
+    except Exception as e:
+        print(f"Erro no banco local: {e}")
+        return None
+    # Só vale se cobrir as pontas (com um dia de folga)
+    if not len(serie) or serie.epoch[0] > datetime_para_epoch(inicio) + 86400 or serie.epoch[-1] < datetime_para_epoch(fim) - 86400:
+        return None
+    return serie
 
-def gerar_csv(dados, nome_arquivo):
-    if not dados: return None
+def gerar_csv(serie, nome_arquivo):
+    if serie is None or not len(serie): return None
     caminho = f"{nome_arquivo}.csv"
+    # Leitura sem valor sai como 0.0 (formato de sempre do CSV)
+    colunas = [np.nan_to_num(serie.nivel).tolist(), np.nan_to_num(serie.vazao).tolist(), np.nan_to_num(serie.chuva).tolist()]
+    datas = np.datetime_as_string(serie.datas(), unit='s')
     with open(caminho, mode='w', newline='') as f:
-        # [NOVO] Adicionado "Chuva_mm" no cabeçalho
-        writer = csv.DictWriter(f, fieldnames=["Data", "Nivel_cm", "Vazao_m3s", "Chuva_mm"])
-        writer.writeheader()
-        writer.writerows(dados)
+        writer = csv.writer(f)
+        writer.writerow(["Data", "Nivel_cm", "Vazao_m3s", "Chuva_mm"])
+        writer.writerows(zip((d.replace("T", " ") for d in datas), *colunas))
     return caminho
 
 # ==============================================================================
 # LÓGICA DO CHAT (BOT)
 # ==============================================================================
-def gerar_grafico_memoria(dados, nome_estacao):
-    datas = [datetime.strptime(d['Data'], "%Y-%m-%d %H:%M:%S") for d in dados]
-    chuvas = [d['Chuva_mm'] for d in dados]
+def gerar_grafico_memoria(serie, nome_estacao):
+    datas = serie.datas()
+    chuvas = np.nan_to_num(serie.chuva)
     
     # Define se o foco principal é Vazão (Guilman) ou Nível (Timóteo)
-    if "Vazao_m3s" in dados[0] and dados[0]["Vazao_m3s"] > 0 and "Guilman" in nome_estacao:
-        valores_principais = [d['Vazao_m3s'] for d in dados]
+    if "Guilman" in nome_estacao and np.nanmax(serie.vazao, initial=0) > 0:
+        valores_principais = serie.vazao
         label_principal = "Vazão (m³/s)"
         cor_principal = "#d35400" # Laranja Escuro
         limite_alerta = 1200
     else:
-        valores_principais = [d['Nivel_cm'] for d in dados]
+        valores_principais = serie.nivel
         label_principal = "Nível (cm)"
         cor_principal = "#c0392b" # Vermelho Escuro
         limite_alerta = 620
@@ -139,8 +127,8 @@ def gerar_grafico_memoria(dados, nome_estacao):
     
     # Define limite mínimo para o eixo da chuva para as barras não ocuparem a tela toda
     # Se a chuva máx for 10mm, o eixo vai até 30mm, deixando as barras baixinhas
-    if max(chuvas) > 0:
-        ax2.set_ylim(0, max(chuvas) * 3) 
+    if chuvas.max() > 0:
+        ax2.set_ylim(0, chuvas.max() * 3) 
     
     # 2. Plot do RIO (Linha no Eixo Principal - Fica POR CIMA das barras)
     # zorder=10 garante que a linha desenhe sobre a barra
@@ -188,8 +176,8 @@ def processar_pedido(message):
     chat_id = message.chat.id
     
     # Variáveis para busca
-    codigo_estacao = "56696000" # Padrão Timóteo
-    nome_estacao = "Timóteo"
+    codigo_estacao = ESTACAO_PADRAO["codigo"]
+    nome_estacao = ESTACAO_PADRAO["nome"]
     dt_inicio = ""
     dt_fim = ""
     
@@ -227,13 +215,11 @@ def processar_pedido(message):
             dt_inicio = datas_encontradas[0]
             dt_fim = datas_encontradas[1]
             
-            # Verifica se o usuário pediu outra estação
-            if "guilman" in msg.lower() or "barragem" in msg.lower():
-                codigo_estacao = "56675080"
-                nome_estacao = "UHE Guilman"
-            elif "nova era" in msg.lower():
-                codigo_estacao = "56661000"
-                nome_estacao = "Nova Era"
+            # Verifica se o usuário pediu outra estação (qualquer uma do cadastro)
+            pedida = estacoes.procurar_no_texto(msg)
+            if pedida:
+                codigo_estacao = pedida["codigo"]
+                nome_estacao = pedida["nome"]
         else:
             bot.reply_to(message, "⚠️ Não entendi. Use os botões abaixo ou digite datas no formato DD/MM/AAAA.")
             return
@@ -241,27 +227,32 @@ def processar_pedido(message):
     # --- EXECUÇÃO DA BUSCA (Igual ao anterior) ---
     bot.reply_to(message, f"🔎 Buscando **{nome_estacao}**\n📅 {dt_inicio} até {dt_fim}...", parse_mode="Markdown")
 
-    dados = buscar_historico_ana(codigo_estacao, dt_inicio, dt_fim)
+    serie = buscar_resumo_local(codigo_estacao, dt_inicio, dt_fim)
+    por_hora = serie is not None
+    if not por_hora:
+        serie = buscar_historico_ana(codigo_estacao, dt_inicio, dt_fim)
     
-    if not dados:
+    if serie is None or not len(serie):
         bot.reply_to(message, "❌ Nenhum dado encontrado ou erro na ANA.")
         return
 
     # Gera Resumo Texto
-    niveis = [d['Nivel_cm'] for d in dados if d['Nivel_cm'] > 0]
+    niveis = serie.nivel[serie.nivel > 0]
     resumo = f"📊 **Resultados: {nome_estacao}**\n"
-    if niveis:
-        resumo += f"🌊 Máx: {max(niveis)} cm | Mín: {min(niveis)} cm\n"
+    if por_hora:
+        resumo += "🗂️ Período longo: máximo de cada hora (banco local)\n"
+    if niveis.size:
+        resumo += f"🌊 Máx: {niveis.max()} cm | Mín: {niveis.min()} cm\n"
     
     # Gera Gráfico (Função que criamos antes)
     try:
-        foto = gerar_grafico_memoria(dados, nome_estacao)
+        foto = gerar_grafico_memoria(serie, nome_estacao)
         bot.send_photo(chat_id, foto, caption=resumo, parse_mode="Markdown")
     except Exception as e:
         bot.reply_to(message, f"Erro no gráfico: {e}")
 
     # Gera CSV
-    arquivo_csv = gerar_csv(dados, f"dados_{nome_estacao}")
+    arquivo_csv = gerar_csv(serie, f"dados_{nome_estacao}")
     with open(arquivo_csv, 'rb') as f:
         bot.send_document(chat_id, f)
     os.remove(arquivo_csv)
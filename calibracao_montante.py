@@ -0,0 +1,240 @@
+"""
+CALIBRAÇÃO DE ATRASO E GANHO (MONTANTE/BARRAGEM -> TIMÓTEO)
+Para cada estação rio acima, mede no histórico inteiro (arquivo_rio/) quantas
+horas uma variação lá leva para aparecer em Timóteo (atraso) e quanto dela chega
+(ganho: cm em Timóteo por cm, ou por m³/s no caso de barragem). A conta é a
+correlação cruzada das variações de DIFERENCA_HORAS horas, feita por FFT para
+todos os atrasos de uma vez (com as lacunas da telemetria descontadas), e
+separada por regime de vazão/nível da estação de cima: a onda de uma cheia
+não viaja como a água de estiagem.
+
+O resultado vai para parametros_montante.json, que o cerebro_ia lê no primeiro
+uso. Sem calibração (ou com correlação fraca), vale o viagem_horas do cadastro.
+
+Uso: python calibracao_montante.py   (recalcula e grava a tabela; rodar a cada estação chuvosa)
+"""
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+import arquivo_grade
+import estacoes
+import taxas_rio
+
+CAMINHO_PARAMETROS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parametros_montante.json")
+
+DIFERENCA_HORAS = 3        # variações comparadas (mesma janela do cerebro_ia)
+MAX_ATRASO_HORAS = 24      # maior atraso testado
+MIN_PARES = 500            # pares (montante, Timóteo) mínimos para confiar num regime
+CORRELACAO_MINIMA = 0.3    # abaixo disso o resultado é descartado
+GANHO_PADRAO = 0.6         # Timóteo sobe ~60% do que Nova Era subiu (sem calibração)
+# Regimes pelo valor da estação de cima no momento da variação (percentis do histórico)
+REGIMES = (("normal", 50), ("alto", 90), ("cheia", None))
+
+_parametros = None
+
+# ==============================================================================
+# SÉRIES
+# ==============================================================================
+def campo_comparado(estacao):
+    """Barragem é comparada pela vazão liberada; rio acima, pelo nível."""
+    return "vazao" if estacao["papel"] == "barragem" else "nivel"
+
+def _grade(codigo, campo):
+    """(origem, valores float64) do histórico inteiro da estação, sem picos isolados."""
+    origem, dados = arquivo_grade.abrir(codigo)
+    if origem is None or not len(dados):
+        return None, None
+    valores = np.asarray(dados[:, arquivo_grade.CAMPOS.index(campo)], dtype=np.float64)
+    del dados
+    return origem, taxas_rio.tirar_picos(valores)
+
+def _alinhar(origem_a, a, origem_b, b):
+    """Trecho comum das duas grades (mesmos slots). Vetores vazios se não se cruzam."""
+    inicio = max(origem_a, origem_b)
+    fim = min(origem_a + len(a) * arquivo_grade.INTERVALO, origem_b + len(b) * arquivo_grade.INTERVALO)
+    if fim <= inicio:
+        return np.empty(0), np.empty(0)
+    i = (inicio - origem_a) // arquivo_grade.INTERVALO
+    j = (inicio - origem_b) // arquivo_grade.INTERVALO
+    slots = (fim - inicio) // arquivo_grade.INTERVALO
+    return a[i:i + slots], b[j:j + slots]
+
+def _variacao(valores, passos):
+    """Variação em `passos` slots terminando em cada slot (NaN onde falta uma das pontas)."""
+    saida = np.full_like(valores, np.nan)
+    saida[passos:] = valores[passos:] - valores[:-passos]
+    return saida
+
+# ==============================================================================
+# CORRELAÇÃO CRUZADA POR FFT
+# ==============================================================================
+def correlacao_por_atraso(x, y, max_passos, mascara_x=None):
+    """
+    Para cada atraso k = 0..max_passos, correlação de Pearson e inclinação
+    (ganho) entre x[t] e y[t + k], só com os pares em que os dois existem (e
+    mascara_x[t] é True). Seis correlações cruzadas por FFT no lugar de refazer
+    a soma para cada atraso. Retorna (correlacao, ganho, pares), vetores de tamanho max_passos + 1.
+    """
+    mx = ~np.isnan(x) if mascara_x is None else (~np.isnan(x) & mascara_x)
+    my = ~np.isnan(y)
+    x0 = np.where(mx, x, 0.0)
+    y0 = np.where(my, y, 0.0)
+    mx = mx.astype(np.float64)
+    my = my.astype(np.float64)
+
+    tamanho = 1 << int(len(x) + max_passos).bit_length()  # zeros no fim: sem dar a volta
+    X, X2, MX = (np.fft.rfft(v, tamanho) for v in (x0, x0 * x0, mx))
+    Y, Y2, MY = (np.fft.rfft(v, tamanho) for v in (y0, y0 * y0, my))
+
+    def cruzada(a, b):  # soma de a[t] * b[t + k]
+        return np.fft.irfft(np.conj(a) * b, tamanho)[:max_passos + 1]
+
+    pares = np.rint(cruzada(MX, MY))
+    sx, sy = cruzada(X, MY), cruzada(MX, Y)
+    sxy, sxx, syy = cruzada(X, Y), cruzada(X2, MY), cruzada(MX, Y2)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy - sx * sy / pares
+        var_x = sxx - sx * sx / pares
+        var_y = syy - sy * sy / pares
+        correlacao = np.where((pares >= 2) & (var_x > 0) & (var_y > 0), cov / np.sqrt(var_x * var_y), np.nan)
+        ganho = np.where((pares >= 2) & (var_x > 0), cov / var_x, np.nan)
+    return correlacao, ganho, pares.astype(np.int64)
+
+def _melhor_atraso(correlacao, ganho, pares):
+    """Atraso (horas) de maior correlação com pares suficientes, ou None."""
+    validos = (pares >= MIN_PARES) & ~np.isnan(correlacao)
+    if not validos.any():
+        return None
+    k = int(np.argmax(np.where(validos, correlacao, -np.inf)))
+    return {
+        "atraso_horas": k * arquivo_grade.INTERVALO / 3600,
+        "ganho": round(float(ganho[k]), 4),
+        "correlacao": round(float(correlacao[k]), 3),
+        "pares": int(pares[k]),
+    }
+
+# ==============================================================================
+# CALIBRAÇÃO
+# ==============================================================================
+def calibrar_estacao(estacao, destino):
+    """Parâmetros de uma estação de cima em relação a `destino` (código), ou None sem histórico em comum."""
+    campo = campo_comparado(estacao)
+    origem_m, montante = _grade(estacao["codigo"], campo)
+    origem_d, jusante = _grade(destino, "nivel")
+    if origem_m is None or origem_d is None:
+        return None
+    montante, jusante = _alinhar(origem_m, montante, origem_d, jusante)
+
+    passos = int(DIFERENCA_HORAS * 3600 / arquivo_grade.INTERVALO)
+    max_passos = int(MAX_ATRASO_HORAS * 3600 / arquivo_grade.INTERVALO)
+    x = _variacao(montante, passos)
+    y = _variacao(jusante, passos)
+
+    geral = _melhor_atraso(*correlacao_por_atraso(x, y, max_passos))
+    if geral is None:
+        return None
+
+    # Regimes: pelo valor da estação de cima no fim da variação
+    com_valor = montante[~np.isnan(montante)]
+    regimes = []
+    anterior = -np.inf
+    for nome, percentil in REGIMES:
+        limite = np.inf if percentil is None else float(np.percentile(com_valor, percentil))
+        mascara = (montante > anterior) & (montante <= limite)
+        resultado = _melhor_atraso(*correlacao_por_atraso(x, y, max_passos, mascara))
+        if resultado is not None:
+            regimes.append({"regime": nome, "ate": None if percentil is None else round(limite, 2), **resultado})
+        anterior = limite
+
+    return {
+        "nome": estacao["nome"],
+        "campo": campo,
+        "unidade_ganho": "cm/(m³/s)" if campo == "vazao" else "cm/cm",
+        "geral": geral,
+        "regimes": regimes,
+    }
+
+def calibrar_todas(caminho=CAMINHO_PARAMETROS):
+    """Calibra todas as estações ativas rio acima contra a estação local e grava a tabela."""
+    destino = estacoes.ativas("local")[0]
+    tabela = {
+        "_comentario": "Gerado por 'python calibracao_montante.py'. atraso_horas: tempo até a variação aparecer "
+                       f"em {destino['nome']}; ganho: quanto dela chega; regimes pelo valor da estação de cima ('ate').",
+        "gerado_em": datetime.now().strftime("%Y-%m-%d %H:%M"),
+        "destino": destino["codigo"],
+        "diferenca_horas": DIFERENCA_HORAS,
+        "estacoes": {},
+    }
+    for estacao in estacoes.ativas():
+        if estacao["papel"] == "local":
+            continue
+        inicio = time.perf_counter()
+        resultado = calibrar_estacao(estacao, destino["codigo"])
+        if resultado is None:
+            print(f"⚠️ {estacao['nome']}: sem histórico em comum com {destino['nome']} (fica o cadastro: ~{estacao['viagem_horas']}h)")
+            continue
+        tabela["estacoes"][estacao["codigo"]] = resultado
+        geral = resultado["geral"]
+        print(f"✅ {estacao['nome']}: atraso {geral['atraso_horas']:.2f}h, ganho {geral['ganho']:.3f} {resultado['unidade_ganho']}, "
+              f"r={geral['correlacao']:.2f} ({geral['pares']} pares, {time.perf_counter() - inicio:.2f}s)")
+        for regime in resultado["regimes"]:
+            print(f"   {regime['regime']:<7} atraso {regime['atraso_horas']:.2f}h, ganho {regime['ganho']:.3f}, r={regime['correlacao']:.2f}")
+
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(tabela, f, ensure_ascii=False, indent=2)
+    global _parametros
+    _parametros = None
+    return tabela
+
+# ==============================================================================
+# USO NA PREVISÃO
+# ==============================================================================
+def carregar(caminho=CAMINHO_PARAMETROS):
+    """Tabela calibrada (lida do arquivo no primeiro uso); {} se ainda não foi gerada."""
+    global _parametros
+    if _parametros is None:
+        try:
+            with open(caminho, encoding="utf-8") as f:
+                _parametros = json.load(f).get("estacoes", {})
+        except FileNotFoundError:
+            _parametros = {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ parametros_montante.json ilegível, usando o cadastro: {e}")
+            _parametros = {}
+    return _parametros
+
+def parametros(codigo, valor=None):
+    """
+    {'atraso_horas', 'ganho', 'correlacao', 'calibrado'} da estação: o regime
+    onde `valor` (nível ou vazão atual lá em cima) cai; sem valor, o geral.
+    Sem calibração confiável: viagem_horas do cadastro e GANHO_PADRAO (só para nível).
+    """
+    calibrada = carregar().get(codigo)
+    if calibrada:
+        escolhido = calibrada["geral"]
+        if valor is not None:
+            for regime in calibrada["regimes"]:
+                if regime["ate"] is None or valor <= regime["ate"]:
+                    escolhido = regime
+                    break
+        if escolhido["correlacao"] < CORRELACAO_MINIMA:
+            escolhido = calibrada["geral"]
+        if escolhido["correlacao"] >= CORRELACAO_MINIMA:
+            return {"atraso_horas": escolhido["atraso_horas"], "ganho": escolhido["ganho"],
+                    "correlacao": escolhido["correlacao"], "calibrado": True}
+
+    estacao = estacoes.por_codigo(codigo) or {}
+    return {
+        "atraso_horas": estacao.get("viagem_horas"),
+        "ganho": GANHO_PADRAO if estacao.get("papel") == "montante" else None,
+        "correlacao": None,
+        "calibrado": False,
+    }
+
+if __name__ == "__main__":
+    calibrar_todas()
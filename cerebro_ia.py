@@ -1,40 +1,46 @@
-import numpy as np
-from sklearn.linear_model import LinearRegression
 from datetime import datetime, timedelta
 
-def prever_proxima_hora(historico_recente):
+import calibracao_montante
+import estacoes
+import previsao_rio
 
-    """PREVISÃO CURTO PRAZO (1h): Usa a inércia do próprio rio em Timóteo."""
+def prever_proxima_hora(historico_recente, codigo=None):
+
+    """
+    PREVISÃO CURTO PRAZO (1h): Usa a inércia do próprio rio em Timóteo.
+    Com `codigo`, usa o previsor guardado da estação (só as leituras novas custam);
+    sem ele, monta um previsor só com a lista recebida.
+    """
     if not historico_recente or len(historico_recente) < 3:
         return None, "Dados insuficientes"
 
-    marco_zero = historico_recente[-1]['data'] 
-    
-    X = [] 
-    y = [] 
-
-    for item in historico_recente:
-        delta_minutos = (item['data'] - marco_zero).total_seconds() / 60
-        X.append([delta_minutos])
-        y.append(item['nivel'])
-
-    model = LinearRegression()
-    model.fit(X, y)
+    atual = _previsor(historico_recente, codigo)
+    previsoes = previsao_rio.prever(atual, horizontes=(1,))
+    if not previsoes:
+        return None, "Dados insuficientes"
 
-    X_cronologico = sorted(X)
-    ultimo_minuto_real = X_cronologico[-1][0]
-    minuto_futuro = ultimo_minuto_real + 60 # +1 Hora
-    
-    previsao = model.predict([[minuto_futuro]])
-    nivel_futuro = previsao[0]
+    nivel_futuro = previsoes[1][0]
+    return nivel_futuro, f"{atual.tendencia:+.1f} cm/h"
 
-    velocidade_minuto = model.coef_[0]
-    velocidade_hora = velocidade_minuto * 60
+def prever_horizontes(historico_recente, codigo=None):
+    """PREVISÃO +1h, +3h e +6h com faixa de confiança: {horas: (valor, inferior, superior)}."""
+    if not historico_recente:
+        return {}
+    return previsao_rio.prever(_previsor(historico_recente, codigo))
 
-    return nivel_futuro, f"{velocidade_hora:+.1f} cm/h"
+def _previsor(historico_recente, codigo):
+    if codigo:
+        return previsao_rio.atualizar_leituras(codigo, historico_recente)
+    return previsao_rio.de_leituras(historico_recente)
 
 def prever_com_nova_era(dados_timoteo, dados_nova_era):
-    """PREVISÃO MÉDIO PRAZO: Compara Nível Atual vs Nível de 4 a 6 horas atrás em Nova Era."""
+    """
+    PREVISÃO MÉDIO PRAZO: Compara Nível Atual vs Nível de DIFERENCA_HORAS (3h) atrás em Nova Era.
+    Ganho e atraso vêm do parametros_montante.json (calibracao_montante.py), no
+    regime do nível atual de Nova Era: o ganho foi medido sobre variações de
+    DIFERENCA_HORAS, então é nela que ele é aplicado; o atraso só diz quando o
+    impacto chega. Sem calibração, 60% e o viagem_horas do cadastro.
+    """
     if not dados_timoteo or not dados_nova_era:
         return None, None
 
@@ -43,41 +49,45 @@ def prever_com_nova_era(dados_timoteo, dados_nova_era):
     nivel_atual_ne = leitura_atual['nivel']
     data_atual_ne = leitura_atual['data']
 
-    # 2. Procurar na lista uma leitura que tenha ocorrido entre 3h e 6h atrás
+    # 2. Procurar a leitura mais próxima de DIFERENCA_HORAS atrás (aceita de 2h30 a 6h)
     # Isso evita pegar dados de ontem (24h atrás) e achar que foi uma subida repentina
+    alvo = timedelta(hours=calibracao_montante.DIFERENCA_HORAS)
+    janela_minima = alvo - timedelta(minutes=30)
+    janela_maxima = 2 * alvo
+
     leitura_passada = None
-    
-    janela_minima = timedelta(hours=3)
-    janela_maxima = timedelta(hours=6)
-    
     for dado in dados_nova_era:
         diferenca_tempo = data_atual_ne - dado['data']
-        
         if janela_minima <= diferenca_tempo <= janela_maxima:
-            leitura_passada = dado
-            break # Encontramos a leitura ideal (ex: 4h atrás), paramos de procurar.
-    
+            if leitura_passada is None or abs(diferenca_tempo - alvo) < abs(data_atual_ne - leitura_passada['data'] - alvo):
+                leitura_passada = dado
+
     if not leitura_passada:
         # Se não achou dados nesse intervalo (estação caiu?), aborta para não dar falso positivo.
-        return None, "Sem dados recentes de ~4h em Nova Era"
+        return None, f"Sem dados de ~{calibracao_montante.DIFERENCA_HORAS}h atrás em Nova Era"
 
     # 3. Calcular a variação REAL nesse período curto
     nivel_antigo_ne = leitura_passada['nivel']
     delta_nova_era = nivel_atual_ne - nivel_antigo_ne
     horas_decorridas = (data_atual_ne - leitura_passada['data']).total_seconds() / 3600
-    
-    # Se a variação for pequena (menos de 5cm em 4h), ignoramos (ruído normal)
+
+    # Se a variação for pequena (menos de 5cm em ~3h), ignoramos (ruído normal)
     if abs(delta_nova_era) < 5:
         return None, "Variação irrelevante"
 
     # 4. Projetar impacto
-    # Fator 0.6: Timóteo sobe ~60% do que Nova Era subiu (o rio alarga)
-    FATOR_AMORTECIMENTO = 0.6 
-    impacto_previsto = delta_nova_era * FATOR_AMORTECIMENTO
+    # Ganho calibrado: quanto do que Nova Era subiu em DIFERENCA_HORAS chega a Timóteo (o rio alarga).
+    # Leitura passada um pouco fora das 3h: a variação é levada para a mesma base do ganho.
+    calibrado = calibracao_montante.parametros(estacoes.codigo("nova_era"), nivel_atual_ne)
+    delta_na_base = delta_nova_era * calibracao_montante.DIFERENCA_HORAS / horas_decorridas
+    impacto_previsto = delta_na_base * calibrado["ganho"]
     
     timoteo_atual = dados_timoteo[0]['nivel']
     nivel_projetado = timoteo_atual + impacto_previsto
     
-    texto_explicativo = f"Nova Era variou {delta_nova_era:+.0f}cm em {horas_decorridas:.1f}h."
+    texto_explicativo = f"Nova Era variou {delta_nova_era:+.0f}cm em {horas_decorridas:.1f}h"
+    if calibrado["atraso_horas"] is not None:
+        texto_explicativo += f"; chega em ~{calibrado['atraso_horas']:.0f}h"
+    texto_explicativo += "."
     
     return nivel_projetado, texto_explicativo
\ No newline at end of file
@@ -0,0 +1,303 @@
+"""
+CHEIAS PARECIDAS (BUSCA DE ANÁLOGOS NO HISTÓRICO)
+"Isso está parecido com 2020 ou com 2022?": pega as últimas 12 a 48h de Timóteo
+(e das estações de cima que tiverem histórico) e procura, em toda janela de
+15 min do arquivo_rio/, as de forma mais parecida. A comparação é pela
+distância z-normalizada (forma da curva, não o nível absoluto), que para
+janelas de mesmo tamanho é 2m(1 - correlação): por isso a distância para
+TODAS as janelas sai de uma correlação cruzada por FFT contra o índice em
+memória (grade com lacunas curtas preenchidas, somas acumuladas e espectro
+de cada estação), sem laço por janela. Para cada janela achada, diz o que
+aconteceu em Timóteo nas HORAS_DEPOIS horas seguintes.
+
+Uso: python cheias_parecidas.py [AAAA-MM-DD HH:MM] [horas]   (sem data: agora)
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import arquivo_grade
+import banco_rio
+import calibracao_montante
+import estacoes
+import memoria_recente
+from serie_estacao import datetime_para_epoch, epoch_para_datetime
+
+HORAS_PADRAO = 24
+HORAS_MINIMA = 12
+HORAS_MAXIMA = 48
+HORAS_DEPOIS = 24           # quanto do "o que aconteceu depois" é mostrado
+MARCOS_DEPOIS = (6, 12, 24)  # horas depois do fim da janela com a variação registrada
+K_PADRAO = 3
+SEPARACAO_DIAS = 3          # dois resultados não podem ser da mesma cheia
+IGNORAR_DIAS = 7            # janelas perto da consulta (a própria cheia) ficam de fora
+DESVIO_MINIMO = 2.0         # cm; janela mais parada que isso não tem forma para comparar
+ESCALA_MAXIMA = 2.0         # análogo com variação até 2x maior ou menor que a de agora (forma igual, porte parecido)
+MAX_LACUNA_SLOTS = 8        # lacunas de até 2h são preenchidas por interpolação
+PESO_MONTANTE = 0.5         # peso de cada estação de cima (Timóteo vale 1)
+
+INTERVALO = arquivo_grade.INTERVALO
+_indices = {}
+
+# ==============================================================================
+# ÍNDICE EM MEMÓRIA
+# ==============================================================================
+def _preencher_lacunas(valores, max_slots=MAX_LACUNA_SLOTS):
+    """Interpola lacunas de até `max_slots` slots (nas pontas, repete o vizinho); as maiores ficam NaN."""
+    saida = np.array(valores, dtype=np.float64)
+    validos = np.flatnonzero(~np.isnan(saida))
+    if not len(validos) or len(validos) == len(saida):
+        return saida
+    vazios = np.flatnonzero(np.isnan(saida))
+    seguinte = np.searchsorted(validos, vazios)
+    anterior_i = np.where(seguinte > 0, validos[np.maximum(seguinte - 1, 0)], -1)
+    seguinte_i = np.where(seguinte < len(validos), validos[np.minimum(seguinte, len(validos) - 1)], len(saida))
+    tamanho = seguinte_i - anterior_i - 1  # nas pontas, -1 e len(saida) fazem o papel do vizinho
+    curtas = vazios[tamanho <= max_slots]
+    saida[curtas] = np.interp(curtas, validos, saida[validos])
+    return saida
+
+class IndiceEstacao:
+    """Histórico de uma estação pronto para a busca: somas acumuladas e espectro para a FFT."""
+    __slots__ = ("codigo", "campo", "origem", "valores", "tamanho_arquivo", "soma", "soma2", "vazios",
+                 "espectro", "tamanho_fft", "media")
+
+    def __init__(self, codigo, campo):
+        self.codigo = codigo
+        self.campo = campo
+        self.tamanho_arquivo = os.path.getsize(arquivo_grade.caminho_grade(codigo))
+        origem, dados = arquivo_grade.abrir(codigo)
+        self.origem = origem
+        self.valores = _preencher_lacunas(np.asarray(dados[:, arquivo_grade.CAMPOS.index(campo)], dtype=np.float64))
+        del dados
+
+        vazio = np.isnan(self.valores)
+        self.media = float(np.nanmean(self.valores)) if (~vazio).any() else 0.0
+        centrado = np.where(vazio, 0.0, self.valores - self.media)  # centrar evita perder precisão nas somas
+        self.soma = np.concatenate(([0.0], np.cumsum(centrado)))
+        self.soma2 = np.concatenate(([0.0], np.cumsum(centrado * centrado)))
+        self.vazios = np.concatenate(([0], np.cumsum(vazio)))
+        self.tamanho_fft = 1 << int(len(self.valores) + HORAS_MAXIMA * 3600 // INTERVALO).bit_length()
+        self.espectro = np.fft.rfft(centrado, self.tamanho_fft)
+
+    def correlacoes(self, janela):
+        """
+        Correlação de Pearson da `janela` (m valores, sem NaN) com cada janela de m
+        slots do histórico (posição = slot inicial), e o desvio de cada uma.
+        NaN onde a janela do histórico tem buraco ou é plana demais.
+        """
+        m = len(janela)
+        if len(self.valores) < m:
+            return np.empty(0), np.empty(0)
+        consulta = janela - janela.mean()
+        desvio_consulta = np.sqrt((consulta * consulta).mean())
+        produtos = np.fft.irfft(np.conj(np.fft.rfft(consulta, self.tamanho_fft)) * self.espectro,
+                                self.tamanho_fft)[:len(self.valores) - m + 1]
+
+        media = (self.soma[m:] - self.soma[:-m]) / m
+        variancia = (self.soma2[m:] - self.soma2[:-m]) / m - media * media
+        desvio = np.sqrt(np.maximum(variancia, 0.0))
+        ok = (self.vazios[m:] - self.vazios[:-m] == 0) & (desvio >= DESVIO_MINIMO)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # soma de consulta centrada * (valor - media): o termo da média some porque a consulta soma zero
+            correlacao = np.where(ok, produtos / (m * desvio_consulta * desvio), np.nan)
+        return np.clip(correlacao, -1.0, 1.0), desvio
+
+def indice(codigo, campo):
+    """Índice da estação, montado no primeiro uso e refeito quando a grade cresce. None sem grade."""
+    if not os.path.exists(arquivo_grade.caminho_grade(codigo)):
+        return None
+    atual = _indices.get((codigo, campo))
+    if atual is None or atual.tamanho_arquivo != os.path.getsize(arquivo_grade.caminho_grade(codigo)):
+        atual = IndiceEstacao(codigo, campo)
+        _indices[(codigo, campo)] = atual
+    return atual
+
+def _estacoes_comparadas():
+    """[(codigo, campo, peso)]: Timóteo primeiro, depois as de cima."""
+    local = estacoes.ativas("local")[0]
+    lista = [(local["codigo"], "nivel", 1.0)]
+    for estacao in estacoes.ativas():
+        if estacao["papel"] != "local":
+            lista.append((estacao["codigo"], calibracao_montante.campo_comparado(estacao), PESO_MONTANTE))
+    return lista
+
+# ==============================================================================
+# BUSCA
+# ==============================================================================
+def _janela_na_grade(epochs, valores, fim_slot, slots):
+    """Leituras soltas -> `slots` valores na grade terminando no slot `fim_slot` (None se sobrar buraco)."""
+    janela = np.full(slots, np.nan)
+    if len(epochs):
+        posicoes = np.rint(np.asarray(epochs, dtype=np.float64) / INTERVALO).astype(np.int64) - (fim_slot - slots + 1)
+        dentro = (posicoes >= 0) & (posicoes < slots)
+        janela[posicoes[dentro]] = np.asarray(valores, dtype=np.float64)[dentro]
+    janela = _preencher_lacunas(janela)
+    return None if np.isnan(janela).any() else janela
+
+def buscar_janelas(janelas, fim_epoch, k=K_PADRAO):
+    """
+    Núcleo da busca. `janelas` = {codigo: (campo, peso, valores da janela ou None)},
+    com Timóteo primeiro, todas terminando em `fim_epoch`. Retorna os k análogos
+    (dicionários, do mais parecido para o menos).
+    """
+    (codigo_local, (campo_local, peso_local, janela_local)), *demais = janelas.items()
+    base = indice(codigo_local, campo_local)
+    if base is None or janela_local is None or np.std(janela_local) < DESVIO_MINIMO:
+        return []
+    m = len(janela_local)
+    depois = int(HORAS_DEPOIS * 3600 // INTERVALO)
+    if len(base.valores) < m + depois:
+        return []  # histórico curto demais para ter uma janela e as HORAS_DEPOIS seguintes
+    correlacao_local, desvios = base.correlacoes(janela_local)
+    if not len(correlacao_local):
+        return []
+
+    # Distância média normalizada: 1 - correlação, ponderada entre as estações que têm a janela
+    soma = peso_local * (1 - correlacao_local)
+    pesos = np.full_like(soma, peso_local)
+    for codigo, (campo, peso, janela) in demais:
+        outro = indice(codigo, campo) if janela is not None and np.std(janela) >= DESVIO_MINIMO else None
+        if outro is None:
+            continue
+        correlacao, _ = outro.correlacoes(janela)
+        deslocamento = (base.origem - outro.origem) // INTERVALO
+        posicoes = np.arange(len(soma)) + deslocamento
+        dentro = (posicoes >= 0) & (posicoes < len(correlacao))
+        alinhada = np.full_like(soma, np.nan)
+        alinhada[dentro] = correlacao[posicoes[dentro]]
+        tem = ~np.isnan(alinhada)
+        soma[tem] += peso * (1 - alinhada[tem])
+        pesos[tem] += peso
+    distancia = soma / pesos
+
+    # Fora: porte muito diferente (a forma de uma marola não responde pela de uma cheia)
+    desvio_consulta = float(np.std(janela_local))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        escala = desvio_consulta / desvios
+    distancia[(escala > ESCALA_MAXIMA) | (escala < 1 / ESCALA_MAXIMA)] = np.nan
+    # Fora também: a própria cheia (perto da consulta) e janelas sem as HORAS_DEPOIS seguintes
+    fins = base.origem + (np.arange(len(distancia)) + m - 1) * INTERVALO
+    distancia[np.abs(fins - fim_epoch) < IGNORAR_DIAS * 86400] = np.nan
+    distancia[len(base.valores) - depois - m + 1:] = np.nan
+
+    separacao = int(SEPARACAO_DIAS * 86400 // INTERVALO)
+    escolhidos = []
+    for inicio in np.argsort(distancia):  # NaN vai para o fim
+        if np.isnan(distancia[inicio]) or len(escolhidos) == k:
+            break
+        if all(abs(inicio - outro) >= separacao for outro in escolhidos):
+            escolhidos.append(int(inicio))
+
+    return [_o_que_aconteceu(base, inicio, m, 1 - float(distancia[inicio]), float(escala[inicio]))
+            for inicio in escolhidos]
+
+def _o_que_aconteceu(base, inicio, m, semelhanca, escala):
+    fim = inicio + m - 1
+    depois = int(HORAS_DEPOIS * 3600 // INTERVALO)
+    nivel_fim = float(base.valores[fim])
+    seguintes = base.valores[fim + 1:fim + 1 + depois]
+    if np.isnan(seguintes).all():
+        pico, horas_ate_pico = None, None
+    else:
+        i = int(np.nanargmax(seguintes))
+        pico, horas_ate_pico = float(seguintes[i]), (i + 1) * INTERVALO / 3600
+    variacoes = {}
+    for horas in MARCOS_DEPOIS:
+        i = int(horas * 3600 // INTERVALO) - 1
+        valor = seguintes[i] if i < len(seguintes) else np.nan
+        variacoes[horas] = None if np.isnan(valor) else float(valor) - nivel_fim
+    return {
+        "inicio": epoch_para_datetime(base.origem + inicio * INTERVALO),
+        "fim": epoch_para_datetime(base.origem + fim * INTERVALO),
+        "semelhanca": semelhanca,
+        "nivel_fim": nivel_fim,
+        "pico": pico,
+        "horas_ate_pico": horas_ate_pico,
+        "variacoes": variacoes,
+        "escala": escala,  # desvio da consulta / desvio do análogo: leva a subida de lá para a escala de agora
+    }
+
+def _limitar_horas(horas):
+    return min(HORAS_MAXIMA, max(HORAS_MINIMA, horas))
+
+def buscar(horas=HORAS_PADRAO, k=K_PADRAO):
+    """Análogos das últimas `horas` horas (leituras ao vivo: memória recente, ou o banco acima de 24h)."""
+    horas = _limitar_horas(horas)
+    slots = int(horas * 3600 // INTERVALO)
+    comparadas = _estacoes_comparadas()
+
+    series = {}
+    conn = None
+    try:
+        for codigo, campo, _ in comparadas:
+            if horas <= memoria_recente.HORAS_MEMORIA:
+                series[codigo] = memoria_recente.serie(codigo, horas, campo)
+            else:
+                conn = conn or banco_rio.conectar()
+                serie = banco_rio.ler_serie(conn, codigo, inicio=datetime.now() - timedelta(hours=horas))
+                series[codigo] = (serie.epoch, getattr(serie, campo))
+    finally:
+        if conn is not None:
+            conn.close()
+
+    epochs_local = series[comparadas[0][0]][0]
+    if not len(epochs_local):
+        return []
+    fim_slot = int(round(epochs_local[-1] / INTERVALO))
+    janelas = {codigo: (campo, peso, _janela_na_grade(*series[codigo], fim_slot, slots))
+               for codigo, campo, peso in comparadas}
+    return buscar_janelas(janelas, fim_slot * INTERVALO, k)
+
+def buscar_em(momento, horas=HORAS_PADRAO, k=K_PADRAO):
+    """Análogos de uma janela do próprio histórico (ex: a subida de 10/01/2022). Para o pesquisador e backtests."""
+    horas = _limitar_horas(horas)
+    slots = int(horas * 3600 // INTERVALO)
+    fim_slot = int(round(datetime_para_epoch(momento) / INTERVALO))
+    janelas = {}
+    for codigo, campo, peso in _estacoes_comparadas():
+        atual = indice(codigo, campo)
+        janela = None
+        if atual is not None:
+            inicio = fim_slot - slots + 1 - atual.origem // INTERVALO
+            if inicio >= 0 and inicio + slots <= len(atual.valores):
+                janela = atual.valores[inicio:inicio + slots]
+                janela = None if np.isnan(janela).any() else janela
+        janelas[codigo] = (campo, peso, janela)
+    return buscar_janelas(janelas, fim_slot * INTERVALO, k)
+
+# ==============================================================================
+# TEXTO
+# ==============================================================================
+def formatar(analogos):
+    """Uma linha por análogo: data, semelhança e o que aconteceu depois em Timóteo."""
+    linhas = []
+    for a in analogos:
+        texto = f"📅 {a['fim'].strftime('%d/%m/%Y %H:%M')} ({a['semelhanca'] * 100:.0f}%): estava em {a['nivel_fim']:.0f} cm"
+        subida = None if a["pico"] is None else a["pico"] - a["nivel_fim"]
+        if subida is not None and subida >= 1:
+            texto += f", subiu até {a['pico']:.0f} cm em {a['horas_ate_pico']:.1f}h ({subida:+.0f} cm"
+            texto += f"; na escala de agora ≈ {subida * a['escala']:+.0f} cm)"
+        else:
+            # Sem a leitura de +HORAS_DEPOIS, vale o último marco que tiver leitura
+            marcos = [h for h in MARCOS_DEPOIS if a["variacoes"].get(h) is not None]
+            if marcos:
+                texto += f", não subiu mais ({a['variacoes'][marcos[-1]]:+.0f} cm em {marcos[-1]}h)"
+            elif a["pico"] is not None:
+                texto += f", não subiu mais (máximo de {a['pico']:.0f} cm nas leituras seguintes)"
+            else:
+                texto += ", sem leituras depois para saber o que aconteceu"
+        linhas.append(texto)
+    return "\n".join(linhas)
+
+if __name__ == "__main__":
+    argumentos = sys.argv[1:]
+    horas = float(argumentos.pop()) if argumentos and argumentos[-1].replace(".", "").isdigit() else HORAS_PADRAO
+    if argumentos:
+        momento = datetime.strptime(" ".join(argumentos), "%Y-%m-%d %H:%M")
+        analogos = buscar_em(momento, horas)
+    else:
+        analogos = buscar(horas)
+    print(formatar(analogos) if analogos else "Nenhuma janela parecida (rio parado ou sem histórico).")
@@ -0,0 +1,419 @@
+"""
+CLIENTE DA TELEMETRIA ANA
+Ponto único de acesso ao webservice da ANA (DadosHidrometeorologicos).
+Mantém uma sessão HTTP persistente (keep-alive + pool de conexões),
+retentativas limitadas com backoff e um parser único do XML.
+Distribui as buscas entre os endpoints da ANA pela latência recente de cada um:
+se o mais rápido passar do próprio p90, dispara uma cópia no segundo melhor e
+fica com quem responder primeiro. Endpoint que falha seguido fica de castigo.
+Todos os scripts (monitor, pesquisador, colheita, vigia) devem passar por aqui.
+"""
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+import banco_rio
+from serie_estacao import SerieEstacao
+
+load_dotenv()
+
+# ==============================================================================
+# CONFIGURAÇÕES (ÚNICO LUGAR PARA AJUSTAR)
+# ==============================================================================
+# ANA_URL_BASE no .env desvia TODOS os acessos (monitor, pesquisador, colheita)
+# para outro servidor, ex: o servidor_ana_local.py -> http://127.0.0.1:8765/ServiceANA.asmx
+URL_LOCAL = os.getenv("ANA_URL_BASE")
+URL_TELEMETRIA = URL_LOCAL or "https://telemetriaws1.ana.gov.br/ServiceANA.asmx"
+URL_TELEMETRIA_HTTP = URL_LOCAL or "http://telemetriaws1.ana.gov.br/ServiceANA.asmx"
+URL_SNIRH = URL_LOCAL or "https://www.snirh.gov.br/ServiceANA/ServiceANA.asmx"
+METODO_DADOS = "DadosHidrometeorologicos"
+
+# Endpoints que servem os mesmos dados, em ordem de preferência inicial
+ENDPOINTS = [URL_LOCAL] if URL_LOCAL else [URL_TELEMETRIA, URL_TELEMETRIA_HTTP, URL_SNIRH]
+
+TIMEOUT_PADRAO = 30      # segundos por tentativa
+TENTATIVAS = 3           # retentativas em erro de conexão / 5xx
+BACKOFF = 1.0            # espera 1s, 2s, 4s... entre tentativas
+TAMANHO_POOL = 10        # conexões mantidas abertas por host
+RETENCAO_RECENTES_DIAS = 3  # quanto tempo as leituras ficam no armazenamento local
+
+JANELA_LATENCIA = 50     # últimas N buscas bem-sucedidas de cada endpoint
+AMOSTRAS_MINIMAS = 5     # abaixo disso o p90 ainda não vale
+HEDGE_SEM_HISTORICO = 5.0  # espera (s) antes da cópia enquanto não há p90
+HEDGE_MINIMO = 1.0       # nunca dispara a cópia antes disso (s)
+FALHAS_PARA_ABRIR = 3    # falhas seguidas que tiram o endpoint da rotação
+PAUSA_DISJUNTOR = 300    # segundos fora da rotação antes de tentar de novo
+
+# A ANA escreve a tag com erro de grafia, e o SNIRH usa outra variação
+TAGS_LEITURA = ("DadosHidrometereologicos", "DadosHidrometrologicos", "DadosHidrometeorologicos")
+
+_sessao = None
+_sessao_direta = None
+_trava_sessao = threading.Lock()
+_endpoints = {}
+_trava_endpoints = threading.Lock()
+_executor_hedge = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge-ana")
+
+# ==============================================================================
+# SESSÃO HTTP
+# ==============================================================================
+def obter_sessao():
+    """Cria (uma única vez) a sessão compartilhada com pool e política de retentativa."""
+    global _sessao
+    if _sessao is None:
+        with _trava_sessao:
+            if _sessao is None:
+                retry = Retry(
+                    total=TENTATIVAS,
+                    connect=TENTATIVAS,
+                    read=TENTATIVAS,
+                    backoff_factor=BACKOFF,
+                    status_forcelist=(500, 502, 503, 504),
+                    allowed_methods=frozenset(["GET"]),
+                    raise_on_status=False,
+                )
+                adaptador = HTTPAdapter(max_retries=retry, pool_connections=TAMANHO_POOL, pool_maxsize=TAMANHO_POOL)
+                sessao = requests.Session()
+                sessao.mount("https://", adaptador)
+                sessao.mount("http://", adaptador)
+                _sessao = sessao
+    return _sessao
+
+def obter_sessao_direta():
+    """
+    Sessão com o mesmo pool, mas sem retentativa: cada pedido é uma tentativa só.
+    Para a busca ao vivo do monitor, que tem prazo curto por ciclo.
+    """
+    global _sessao_direta
+    if _sessao_direta is None:
+        with _trava_sessao:
+            if _sessao_direta is None:
+                adaptador = HTTPAdapter(max_retries=0, pool_connections=TAMANHO_POOL, pool_maxsize=TAMANHO_POOL)
+                sessao = requests.Session()
+                sessao.mount("https://", adaptador)
+                sessao.mount("http://", adaptador)
+                _sessao_direta = sessao
+    return _sessao_direta
+
+# ==============================================================================
+# ENDPOINTS (LATÊNCIA, HEDGE E DISJUNTOR)
+# ==============================================================================
+class Endpoint:
+    """Latência recente e disjuntor de um endpoint da ANA."""
+
+    def __init__(self, url):
+        self.url = url
+        self.latencias = deque(maxlen=JANELA_LATENCIA)
+        self.falhas_seguidas = 0
+        self.aberto_ate = 0.0
+        self.trava = threading.Lock()
+
+    def __repr__(self):
+        return f"Endpoint({self.url!r}, mediana={self.mediana()}, falhas={self.falhas_seguidas})"
+
+    def _percentil(self, fracao):
+        with self.trava:
+            amostras = sorted(self.latencias)
+        if len(amostras) < AMOSTRAS_MINIMAS:
+            return None
+        return amostras[min(int(len(amostras) * fracao), len(amostras) - 1)]
+
+    def mediana(self):
+        return self._percentil(0.5)
+
+    def p90(self):
+        return self._percentil(0.9)
+
+    def espera_hedge(self):
+        """Quanto esperar por este endpoint antes de disparar a cópia no próximo."""
+        p90 = self.p90()
+        return max(HEDGE_MINIMO, HEDGE_SEM_HISTORICO if p90 is None else p90)
+
+    def disponivel(self):
+        return time.monotonic() >= self.aberto_ate
+
+    def registrar_sucesso(self, duracao):
+        with self.trava:
+            self.latencias.append(duracao)
+            self.falhas_seguidas = 0
+            self.aberto_ate = 0.0
+
+    def registrar_falha(self):
+        # Depois de aberto, uma nova falha na tentativa de teste reabre na hora
+        with self.trava:
+            self.falhas_seguidas += 1
+            if self.falhas_seguidas >= FALHAS_PARA_ABRIR:
+                self.aberto_ate = time.monotonic() + PAUSA_DISJUNTOR
+                print(f"⚡ ANA: {self.url} fora da rotação por {PAUSA_DISJUNTOR}s ({self.falhas_seguidas} falhas seguidas)")
+
+def obter_endpoint(url):
+    """Estado compartilhado do endpoint (criado no primeiro uso)."""
+    with _trava_endpoints:
+        if url not in _endpoints:
+            _endpoints[url] = Endpoint(url)
+        return _endpoints[url]
+
+def ordem_endpoints():
+    """
+    Endpoints disponíveis do mais rápido para o mais lento (mediana recente).
+    Se todos estiverem com o disjuntor aberto, tenta mesmo assim, começando
+    pelo que volta primeiro: sem dado nenhum o alerta não sai.
+    """
+    todos = [obter_endpoint(url) for url in ENDPOINTS]
+    disponiveis = [e for e in todos if e.disponivel()]
+    if not disponiveis:
+        return sorted(todos, key=lambda e: e.aberto_ate)
+
+    def chave(endpoint):
+        mediana = endpoint.mediana()
+        return HEDGE_SEM_HISTORICO if mediana is None else mediana
+    return sorted(disponiveis, key=chave)  # sorted é estável: empate mantém a ordem de ENDPOINTS
+
+def _medir(endpoint, funcao):
+    inicio = time.monotonic()
+    try:
+        resultado = funcao(endpoint.url)
+    except Exception:
+        endpoint.registrar_falha()
+        raise
+    endpoint.registrar_sucesso(time.monotonic() - inicio)
+    return resultado
+
+def executar_com_hedge(funcao, max_endpoints=None):
+    """
+    Roda `funcao(url_base)` no melhor endpoint. Se ele passar do próprio p90 sem
+    responder, dispara uma cópia no segundo melhor e devolve o primeiro resultado
+    bom (a outra busca termina sozinha e só alimenta as estatísticas).
+    Se um falhar, passa para o próximo; se todos falharem, o último erro sobe.
+    Com `max_endpoints`, só os N melhores entram na rodada.
+    """
+    ordem = ordem_endpoints()[:max_endpoints]
+    pendentes = {}
+    proximo = 0
+    ultimo_erro = None
+
+    def disparar():
+        nonlocal proximo
+        endpoint = ordem[proximo]
+        proximo += 1
+        pendentes[_executor_hedge.submit(_medir, endpoint, funcao)] = endpoint
+
+    disparar()
+    limite_hedge = time.monotonic() + ordem[0].espera_hedge()
+    copia_disparada = False
+
+    while pendentes:
+        espera = None
+        if not copia_disparada and proximo < len(ordem):
+            espera = max(0.0, limite_hedge - time.monotonic())
+        feitos, _ = wait(pendentes, timeout=espera, return_when=FIRST_COMPLETED)
+
+        if not feitos:
+            disparar()
+            copia_disparada = True
+            continue
+
+        for futuro in feitos:
+            pendentes.pop(futuro)
+            try:
+                return futuro.result()
+            except Exception as e:
+                ultimo_erro = e
+
+        if not pendentes and proximo < len(ordem):
+            disparar()
+            copia_disparada = True
+
+    raise ultimo_erro
+
+def _formatar_data(valor):
+    """A ANA só aceita dd/mm/aaaa. Aceita datetime ou string já formatada."""
+    if isinstance(valor, datetime):
+        return valor.strftime("%d/%m/%Y")
+    return valor
+
+def abrir_resposta(codigo, data_inicio, data_fim, timeout=TIMEOUT_PADRAO, url_base=None, retentar=True):
+    """
+    Faz a requisição em streaming e devolve a resposta aberta (use com `with`).
+    Sem `url_base`, usa o endpoint mais rápido no momento; `retentar=False` faz
+    uma tentativa só (obter_sessao_direta).
+    Status diferente de 200 e erros de rede sobem para quem chamou.
+    """
+    url_base = url_base or ordem_endpoints()[0].url
+    params = {
+        "codEstacao": codigo,
+        "dataInicio": _formatar_data(data_inicio),
+        "dataFim": _formatar_data(data_fim),
+    }
+    sessao = obter_sessao() if retentar else obter_sessao_direta()
+    resposta = sessao.get(f"{url_base}/{METODO_DADOS}", params=params, timeout=timeout, stream=True)
+    try:
+        resposta.raise_for_status()
+    except Exception:
+        resposta.close()
+        raise
+    resposta.raw.decode_content = True  # descompacta gzip no caminho
+    return resposta
+
+def verificar_servico(timeout=10, url_base=URL_TELEMETRIA_HTTP):
+    """
+    Retorna o status HTTP da página do serviço (usado pelo vigia_ana).
+    Uma tentativa só, fora da sessão com retentativa: o vigia quer saber se o
+    servidor responde agora, em no máximo `timeout` segundos.
+    """
+    return requests.get(url_base, timeout=timeout).status_code
+
+# ==============================================================================
+# PARSER ÚNICO (STREAMING)
+# ==============================================================================
+def converter_data(texto):
+    """Converte a data da ANA (aaaa-mm-dd HH:MM:SS ou dd/mm/aaaa HH:MM:SS) fatiando o texto."""
+    t = texto.strip()
+    if t[4] == "-":
+        return datetime(int(t[0:4]), int(t[5:7]), int(t[8:10]), int(t[11:13]), int(t[14:16]), int(t[17:19]))
+    return datetime(int(t[6:10]), int(t[3:5]), int(t[0:2]), int(t[11:13]), int(t[14:16]), int(t[17:19]))
+
+def _texto(elemento, *tags):
+    """Texto do primeiro campo preenchido entre as tags (ex: Nivel ou Cota), ou ''."""
+    for tag in tags:
+        campo = elemento.find(tag)
+        if campo is not None and campo.text and campo.text.strip():
+            return campo.text.strip()
+    return ""
+
+def iterar_textos(fonte):
+    """
+    Lê o XML aos pedaços (iterparse) e devolve cada leitura como os textos crus
+    (data, nivel, vazao, chuva) assim que ela fecha. Cada elemento é descartado
+    logo depois de lido, então a memória fica constante mesmo em períodos de anos.
+    """
+    pilha = []
+    for evento, elemento in ET.iterparse(fonte, events=("start", "end")):
+        if evento == "start":
+            pilha.append(elemento)
+            continue
+
+        pilha.pop()
+        if elemento.tag not in TAGS_LEITURA:
+            continue
+
+        data_hora = _texto(elemento, "DataHora")
+        if len(data_hora) >= 19:
+            yield data_hora, _texto(elemento, "Nivel", "Cota"), _texto(elemento, "Vazao"), _texto(elemento, "Chuva")
+
+        # Solta a leitura já processada (o pai ficaria acumulando filhos vazios)
+        elemento.clear()
+        if pilha:
+            pilha[-1].remove(elemento)
+
+def iterar_xml(fonte, valor_ausente=0.0):
+    """Leituras do XML como tuplas compactas (data, nivel, vazao, chuva), na ordem em que chegam."""
+    for data_hora, nivel, vazao, chuva in iterar_textos(fonte):
+        try:
+            yield (
+                converter_data(data_hora),
+                float(nivel) if nivel else valor_ausente,
+                float(vazao) if vazao else valor_ausente,
+                float(chuva) if chuva else valor_ausente,
+            )
+        except ValueError:
+            continue
+
+def ler_serie_xml(fonte, codigo):
+    """Monta a SerieEstacao (colunas NumPy) direto do XML, sem dicionários no meio."""
+    datas, niveis, vazoes, chuvas = [], [], [], []
+    for data_hora, nivel, vazao, chuva in iterar_textos(fonte):
+        datas.append(data_hora)
+        niveis.append(nivel)
+        vazoes.append(vazao)
+        chuvas.append(chuva)
+    return SerieEstacao.de_textos(codigo, datas, niveis, vazoes, chuvas)
+
+# ==============================================================================
+# API DE ALTO NÍVEL
+# ==============================================================================
+def buscar_serie(codigo, data_inicio, data_fim, timeout=TIMEOUT_PADRAO, url_base=None,
+                 retentar=True, max_endpoints=None):
+    """
+    Formato principal da ingestão: SerieEstacao ordenada da mais antiga para a mais nova.
+    Sem `url_base`, a busca corre entre os endpoints com hedge (ver executar_com_hedge).
+    `retentar=False` e `max_endpoints` limitam o pior caso (busca ao vivo com prazo).
+    """
+    def baixar(url):
+        with abrir_resposta(codigo, data_inicio, data_fim, timeout=timeout, url_base=url, retentar=retentar) as resposta:
+            return ler_serie_xml(resposta.raw, codigo)
+
+    if url_base:
+        return _medir(obter_endpoint(url_base), baixar)
+    return executar_com_hedge(baixar, max_endpoints=max_endpoints)
+
+def buscar_leituras(codigo, data_inicio, data_fim, timeout=TIMEOUT_PADRAO, url_base=None,
+                    mais_recentes_primeiro=True, valor_ausente=0.0, retentar=True, max_endpoints=None):
+    """Adaptador para quem usa a lista de dicionários: {'data', 'nivel', 'vazao', 'chuva'}."""
+    serie = buscar_serie(codigo, data_inicio, data_fim, timeout=timeout, url_base=url_base,
+                         retentar=retentar, max_endpoints=max_endpoints)
+    return serie.para_leituras(mais_recentes_primeiro=mais_recentes_primeiro, valor_ausente=valor_ausente)
+
+def iterar_leituras(codigo, data_inicio, data_fim, timeout=TIMEOUT_PADRAO, url_base=None, valor_ausente=0.0):
+    """
+    Para gravar períodos longos em lotes: devolve as leituras (tuplas de iterar_xml)
+    conforme chegam, sem guardar o corpo nem o DOM inteiro.
+    A ordem é a que a ANA manda (normalmente da mais nova para a mais antiga).
+    Streaming não tem hedge (quem consome já está gravando): vai no melhor endpoint,
+    e como no _medir a resposta inteira conta para o disjuntor dele: erro ao abrir
+    ou no meio da leitura é falha, corpo lido até o fim é sucesso.
+    """
+    endpoint = obter_endpoint(url_base or ordem_endpoints()[0].url)
+    inicio = time.monotonic()
+    try:
+        with abrir_resposta(codigo, data_inicio, data_fim, timeout=timeout, url_base=endpoint.url) as resposta:
+            yield from iterar_xml(resposta.raw, valor_ausente=valor_ausente)
+    except GeneratorExit:
+        raise  # quem consome parou antes do fim: não diz nada sobre o endpoint
+    except Exception:
+        endpoint.registrar_falha()
+        raise
+    endpoint.registrar_sucesso(time.monotonic() - inicio)
+
+# ==============================================================================
+# BUSCA INCREMENTAL ("DESDE A ÚLTIMA LEITURA")
+# ==============================================================================
+def atualizar_recentes(codigo, timeout=TIMEOUT_PADRAO, agora=None, cadencia_min=None,
+                       retentar=True, max_endpoints=None):
+    """
+    Pede à ANA só a janela desde a leitura mais nova já gravada (marca d'água no
+    rio_doce.db) e mescla o que for novo. A ANA só aceita datas sem hora, então
+    a janela começa no dia da marca d'água. Retorna quantas leituras eram novas.
+    Com `cadencia_min`, nem vai à ANA (retorna None) se a próxima leitura da
+    estação ainda não pode ter saído. `retentar`/`max_endpoints` vão para o buscar_serie.
+    Erros de rede sobem para quem chamou; o armazenamento local continua válido.
+    """
+    agora = agora or datetime.now()
+    marca = banco_rio.ler_marca(codigo)
+    if cadencia_min and marca and agora < marca + timedelta(minutes=cadencia_min):
+        return None
+    inicio = agora - timedelta(days=1)
+    if marca and marca > inicio:
+        inicio = marca
+
+    # Sem leitura fica NULL no banco (não 0.0); ler_recentes devolve 0.0 para o monitor
+    leituras = buscar_leituras(codigo, inicio, agora, timeout=timeout, valor_ausente=None,
+                               retentar=retentar, max_endpoints=max_endpoints)
+    novas = [l for l in leituras if marca is None or l["data"] > marca]
+    banco_rio.gravar_recentes(codigo, novas, descartar_antes=agora - timedelta(days=RETENCAO_RECENTES_DIAS))
+    return len(novas)
+
+def ler_recentes(codigo, agora=None, valor_ausente=0.0):
+    """A lista 'das últimas 24h' de sempre (desde ontem 00:00), servida do armazenamento local."""
+    agora = agora or datetime.now()
+    ontem = (agora - timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return banco_rio.ler_recentes(codigo, ontem, valor_ausente=valor_ausente)
@@ -0,0 +1,138 @@
+"""
+CSVs DE COLETA SEM LINHAS REPETIDAS
+historico_rio.csv e historico_guilman_coletado.csv ganham uma linha por ciclo
+do monitor, mas o ciclo (15 min) nem sempre traz leitura nova da ANA e a mesma
+linha era anexada de novo. Aqui cada (arquivo, estação) lembra o horário da
+última linha gravada e só entra leitura mais nova. Esse horário vem do fim do
+próprio CSV na primeira gravação do processo (sem ler o arquivo inteiro).
+
+Uso: python csv_coletado.py compactar   (tira as repetições que já estão nos arquivos)
+"""
+import csv
+import os
+import sys
+import threading
+from datetime import datetime
+
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S"
+
+# Arquivo -> cabeçalho e coluna com o nome da estação (None: arquivo de uma estação só)
+ARQUIVOS = {
+    "historico_rio.csv": {"cabecalho": ["DataHora", "Estacao", "Nivel", "Tendencia"], "coluna_estacao": 1},
+    "historico_guilman_coletado.csv": {"cabecalho": ["Data", "Vazao_m3s", "Nivel_cm"], "coluna_estacao": None},
+}
+
+BYTES_FIM_ARQUIVO = 64 * 1024  # quanto do fim do CSV é lido para achar as últimas datas
+
+_ultimas = {}        # (arquivo, estação) -> datetime da última linha gravada
+_arquivos_lidos = set()
+_trava = threading.Lock()
+
+# ==============================================================================
+# ÚLTIMA LINHA POR ESTAÇÃO
+# ==============================================================================
+def _data(texto):
+    try:
+        return datetime.fromisoformat(texto.strip())
+    except ValueError:
+        return None
+
+def _estacao(arquivo, linha):
+    coluna = ARQUIVOS[arquivo]["coluna_estacao"]
+    return linha[coluna] if coluna is not None and len(linha) > coluna else ""
+
+def _ler_fim(arquivo):
+    """Últimas datas por estação, lendo só o fim do arquivo (as linhas entram em ordem de horário)."""
+    if not os.path.exists(arquivo):
+        return
+    with open(arquivo, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - BYTES_FIM_ARQUIVO))
+        fim = f.read().decode("utf-8", errors="replace").splitlines()
+    for linha in csv.reader(fim[1:] if len(fim) > 1 else fim):  # a 1ª pode estar cortada
+        if not linha:
+            continue
+        data = _data(linha[0])
+        if data is None:
+            continue
+        chave = (arquivo, _estacao(arquivo, linha))
+        if chave not in _ultimas or data > _ultimas[chave]:
+            _ultimas[chave] = data
+
+# ==============================================================================
+# GRAVAÇÃO
+# ==============================================================================
+def anexar(arquivo, data_hora, *colunas):
+    """
+    Anexa [data_hora, *colunas] ao CSV se a leitura for mais nova que a última
+    gravada daquela estação. Retorna True se gravou, False se era repetida.
+    """
+    with _trava:
+        if arquivo not in _arquivos_lidos:
+            _ler_fim(arquivo)
+            _arquivos_lidos.add(arquivo)
+
+        linha = [data_hora.strftime(FORMATO_DATA), *colunas]
+        chave = (arquivo, _estacao(arquivo, linha))
+        ultima = _ultimas.get(chave)
+        if ultima is not None and data_hora <= ultima:
+            return False
+
+        existe = os.path.exists(arquivo)
+        with open(arquivo, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if not existe:
+                writer.writerow(ARQUIVOS[arquivo]["cabecalho"])
+            writer.writerow(linha)
+        _ultimas[chave] = data_hora
+        return True
+
+# ==============================================================================
+# LIMPEZA DOS ARQUIVOS ANTIGOS
+# ==============================================================================
+def compactar(arquivo):
+    """Reescreve o CSV sem as linhas repetidas (mesma estação e horário). Retorna (antes, depois)."""
+    with open(arquivo, newline="", encoding="utf-8") as f:
+        terminador = "\r\n" if f.readline().endswith("\r\n") else "\n"  # mantém o fim de linha do arquivo
+        f.seek(0)
+        linhas = list(csv.reader(f))
+    if not linhas:
+        return 0, 0
+    cabecalho, dados = linhas[0], linhas[1:]
+
+    vistas = set()
+    mantidas = []
+    for linha in dados:
+        if not linha:
+            continue
+        chave = (_estacao(arquivo, linha), linha[0].strip())
+        if chave in vistas:
+            continue
+        vistas.add(chave)
+        mantidas.append(linha)
+
+    temporario = arquivo + ".tmp"
+    with open(temporario, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, lineterminator=terminador)
+        writer.writerow(cabecalho)
+        writer.writerows(mantidas)
+    os.replace(temporario, arquivo)
+
+    with _trava:
+        _arquivos_lidos.discard(arquivo)
+        for chave in [c for c in _ultimas if c[0] == arquivo]:
+            del _ultimas[chave]
+    return len(dados), len(mantidas)
+
+def compactar_todos():
+    for arquivo in ARQUIVOS:
+        if not os.path.exists(arquivo):
+            continue
+        antes, depois = compactar(arquivo)
+        print(f"✅ {arquivo}: {antes} -> {depois} linhas ({antes - depois} repetidas removidas)")
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["compactar"]:
+        compactar_todos()
+    else:
+        print(__doc__)
@@ -0,0 +1,98 @@
+"""
+CADASTRO DE ESTAÇÕES
+Lê o estacoes.json (ao lado dos scripts): código ANA, papel (local, montante,
+barragem), cadência esperada de leituras e tempo de viagem da água até Timóteo.
+É daqui que monitor, pesquisador, colheita e índice histórico tiram os códigos;
+incluir uma estação da bacia é só acrescentar um bloco no arquivo.
+"""
+import json
+import os
+import unicodedata
+
+CAMINHO_CADASTRO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "estacoes.json")
+
+PAPEIS = ("local", "montante", "barragem")
+CADENCIA_PADRAO_MIN = 15
+
+_cadastro = None
+
+# ==============================================================================
+# CARGA
+# ==============================================================================
+def _normalizar(texto):
+    """Minúsculas e sem acento, para comparar nomes digitados pelo usuário."""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c)).strip()
+
+def carregar_estacoes(caminho=CAMINHO_CADASTRO):
+    """Lê e valida o cadastro. Retorna {apelido: estacao} na ordem do arquivo."""
+    with open(caminho, encoding="utf-8") as f:
+        bruto = json.load(f)
+
+    estacoes = {}
+    codigos = set()
+    for item in bruto["estacoes"]:
+        apelido = item["apelido"]
+        codigo = str(item["codigo"])
+        papel = item.get("papel", "montante")
+        if papel not in PAPEIS:
+            raise ValueError(f"Estação {apelido}: papel inválido '{papel}' (use {', '.join(PAPEIS)})")
+        if apelido in estacoes or codigo in codigos:
+            raise ValueError(f"Estação repetida no cadastro: {apelido} ({codigo})")
+        codigos.add(codigo)
+
+        estacoes[apelido] = {
+            "apelido": apelido,
+            "codigo": codigo,
+            "nome": item.get("nome", apelido),
+            "papel": papel,
+            "cadencia_min": item.get("cadencia_min", CADENCIA_PADRAO_MIN),
+            "viagem_horas": item.get("viagem_horas"),
+            "nomes_busca": [_normalizar(n) for n in item.get("nomes_busca", [apelido])],
+            "csv_historico": item.get("csv_historico"),
+            "ativa": item.get("ativa", True),
+        }
+    return estacoes
+
+def cadastro():
+    """Cadastro em memória (lido do arquivo no primeiro uso)."""
+    global _cadastro
+    if _cadastro is None:
+        _cadastro = carregar_estacoes()
+    return _cadastro
+
+# ==============================================================================
+# CONSULTAS
+# ==============================================================================
+def estacao(apelido):
+    return cadastro()[apelido]
+
+def codigo(apelido):
+    return cadastro()[apelido]["codigo"]
+
+def por_codigo(codigo_ana):
+    """Estação com esse código ANA (ou None)."""
+    for item in cadastro().values():
+        if item["codigo"] == codigo_ana:
+            return item
+    return None
+
+def ativas(papel=None):
+    """Estações ativas (opcionalmente só de um papel), da mais próxima para a mais distante de Timóteo."""
+    lista = [e for e in cadastro().values() if e["ativa"] and (papel is None or e["papel"] == papel)]
+    return sorted(lista, key=lambda e: e["viagem_horas"] or 0)
+
+def codigos_ativos():
+    return [e["codigo"] for e in ativas()]
+
+def procurar_no_texto(texto):
+    """Primeira estação cujo nome aparece no texto (ex: 'Guilman 01/01/2023 a 05/01/2023')."""
+    texto = _normalizar(texto)
+    for item in cadastro().values():
+        if any(nome in texto for nome in item["nomes_busca"]):
+            return item
+    return None
+
+def com_historico_csv():
+    """Pares (arquivo CSV, código) das estações que têm exportação histórica da ANA."""
+    return [(e["csv_historico"], e["codigo"]) for e in cadastro().values() if e["csv_historico"]]
@@ -0,0 +1,200 @@
+"""
+ESTADO DO SISTEMA (NO rio_doce.db)
+Substitui os JSONs que eram reescritos inteiros a cada ciclo
+(stories_ativos.json, trava_instagram.json, historico_velocidade.json) por
+duas tabelas pequenas:
+  - estado: chave -> valor (JSON), ex: contador de stories, trava do Instagram
+  - serie_recente: (nome, epoch) -> valor, ex: foto das últimas horas de
+    cada estação (memoria_recente)
+Toda alteração é uma transação do SQLite (BEGIN IMMEDIATE): monitor,
+bot_controle e reset_stories podem mexer ao mesmo tempo, de processos
+diferentes, sem perder escrita nem deixar arquivo pela metade.
+Os JSONs antigos são importados no primeiro uso e renomeados para .migrado.
+"""
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import banco_rio
+import estacoes
+from serie_estacao import datetime_para_epoch, epoch_para_datetime
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+
+# Chaves e séries usadas pelo monitor e pelo bot de controle
+CHAVE_STORIES = "stories_ativos"
+CHAVE_INSTAGRAM_ATIVO = "instagram_ativo"
+CHAVE_SEM_DADOS_MESMA_DATA = "sem_dados_mesma_data"  # {"codigo|aaaa-mm-dd": epoch para perguntar de novo}
+SERIE_NIVEL_TIMOTEO = f"nivel_{estacoes.codigo('timoteo')}"  # mesmo nome que a memoria_recente usa
+
+# Arquivos antigos -> importados uma vez
+JSON_STORIES = "stories_ativos.json"
+JSON_TRAVA = "trava_instagram.json"
+JSON_VELOCIDADE = "historico_velocidade.json"
+
+_tabelas_prontas = False
+_trava_tabelas = threading.Lock()
+
+# ==============================================================================
+# CONEXÃO
+# ==============================================================================
+def conectar():
+    """Conexão em autocommit (as transações são abertas à mão em `transacao`)."""
+    conn = sqlite3.connect(banco_rio.CAMINHO_BANCO, timeout=30, isolation_level=None)
+    banco_rio.configurar_conexao(conn)
+    _garantir_tabelas(conn)
+    return conn
+
+@contextmanager
+def transacao():
+    """
+    BEGIN IMMEDIATE pega a trava de escrita já na leitura: um ler-alterar-gravar
+    inteiro acontece sem outro processo no meio (o outro espera até 30 s).
+    """
+    conn = conectar()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+def _garantir_tabelas(conn):
+    global _tabelas_prontas
+    if _tabelas_prontas:
+        return
+    with _trava_tabelas:
+        if _tabelas_prontas:
+            return
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS estado (
+                chave TEXT PRIMARY KEY,
+                valor TEXT NOT NULL,
+                atualizado TEXT NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS serie_recente (
+                nome TEXT NOT NULL,
+                epoch INTEGER NOT NULL,
+                valor REAL NOT NULL,
+                PRIMARY KEY (nome, epoch)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _migrar_json(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        _tabelas_prontas = True
+
+# ==============================================================================
+# MIGRAÇÃO DOS JSONs ANTIGOS
+# ==============================================================================
+def _ler_json(nome):
+    caminho = os.path.join(DIRETORIO, nome)
+    if not os.path.exists(caminho):
+        return caminho, None
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            return caminho, json.load(f)
+    except (OSError, ValueError):
+        return caminho, None  # JSON corrompido: não há o que aproveitar
+
+def _migrar_json(conn):
+    """Traz o conteúdo dos JSONs (se existirem) sem sobrescrever o que já está no banco."""
+    agora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    migrados = []
+
+    caminho, dados = _ler_json(JSON_STORIES)
+    if isinstance(dados, dict):
+        conn.execute("INSERT OR IGNORE INTO estado VALUES (?, ?, ?)", (CHAVE_STORIES, json.dumps(dados), agora))
+    migrados.append(caminho)
+
+    caminho, dados = _ler_json(JSON_TRAVA)
+    if isinstance(dados, dict):
+        conn.execute("INSERT OR IGNORE INTO estado VALUES (?, ?, ?)",
+                     (CHAVE_INSTAGRAM_ATIVO, json.dumps(bool(dados.get("ativo", True))), agora))
+    migrados.append(caminho)
+
+    # As duas versões do calcular_velocidade_rio gravavam formatos diferentes: lista ou um único dict
+    caminho, dados = _ler_json(JSON_VELOCIDADE)
+    itens = dados if isinstance(dados, list) else [dados] if isinstance(dados, dict) else []
+    for item in itens:
+        try:
+            momento = datetime.strptime(item["data"], "%Y-%m-%d %H:%M:%S")
+            conn.execute("INSERT OR IGNORE INTO serie_recente VALUES (?, ?, ?)",
+                         (SERIE_NIVEL_TIMOTEO, datetime_para_epoch(momento), float(item["nivel"])))
+        except (KeyError, TypeError, ValueError):
+            continue
+    migrados.append(caminho)
+
+    for caminho in migrados:
+        if os.path.exists(caminho):
+            os.replace(caminho, caminho + ".migrado")
+            print(f"📦 {os.path.basename(caminho)} migrado para o rio_doce.db")
+
+# ==============================================================================
+# CHAVE / VALOR
+# ==============================================================================
+def _gravar(conn, chave, valor):
+    conn.execute(
+        "INSERT OR REPLACE INTO estado VALUES (?, ?, ?)",
+        (chave, json.dumps(valor), datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+    )
+
+def ler(chave, padrao=None):
+    conn = conectar()
+    try:
+        linha = conn.execute("SELECT valor FROM estado WHERE chave = ?", (chave,)).fetchone()
+    finally:
+        conn.close()
+    return padrao if linha is None else json.loads(linha[0])
+
+def gravar(chave, valor):
+    with transacao() as conn:
+        _gravar(conn, chave, valor)
+
+def alterar(chave, funcao, padrao=None):
+    """
+    Aplica `funcao(valor_atual) -> valor_novo` numa transação só e devolve o novo valor.
+    Dois processos alterando a mesma chave ficam em fila, nenhum perde a escrita do outro.
+    """
+    with transacao() as conn:
+        linha = conn.execute("SELECT valor FROM estado WHERE chave = ?", (chave,)).fetchone()
+        novo = funcao(padrao if linha is None else json.loads(linha[0]))
+        _gravar(conn, chave, novo)
+    return novo
+
+def instagram_liberado():
+    """True se as postagens estão liberadas (padrão), False se travadas pelo bot de controle."""
+    return bool(ler(CHAVE_INSTAGRAM_ATIVO, True))
+
+def definir_instagram(ativo):
+    gravar(CHAVE_INSTAGRAM_ATIVO, bool(ativo))
+
+# ==============================================================================
+# SÉRIES RECENTES
+# ==============================================================================
+def ler_pontos(nome, desde=None, ate=None):
+    """[(datetime, valor)] da série, do mais antigo para o mais novo."""
+    inicio = -2**62 if desde is None else datetime_para_epoch(desde)
+    fim = 2**62 if ate is None else datetime_para_epoch(ate)
+    conn = conectar()
+    try:
+        linhas = conn.execute(
+            "SELECT epoch, valor FROM serie_recente WHERE nome = ? AND epoch BETWEEN ? AND ? ORDER BY epoch",
+            (nome, inicio, fim),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [(epoch_para_datetime(epoch), valor) for epoch, valor in linhas]
@@ -0,0 +1,87 @@
+"""
+ESTRATÉGIA DE POSTAGEM (REGRAS SEM ESTADO)
+As regras que decidem se o monitor posta no Instagram, separadas do relógio e
+dos arquivos de estado: entram nível atual, nível anterior e velocidade (cm/h),
+sai (deve_postar, intervalo_minutos, motivo). A mesma conta funciona em vetores
+NumPy, para o backtest_postagem.py repassar anos de histórico de uma vez.
+Mudou um limite aqui, o monitor e o backtest mudam juntos.
+"""
+import numpy as np
+
+# Limites (o painel do monitor_definitivo importa daqui)
+LIMITE_ALERTA = 600       # cm: acima disso é emergência
+VELOCIDADE_ALERTA = 10    # cm/h: subida rápida
+VELOCIDADE_PANICO = 30    # cm/h: subida rápida com intervalo menor
+SUBIDA_GRADUAL = 2        # cm/h
+
+PARAMETROS_PADRAO = {
+    "limite_alerta": LIMITE_ALERTA,
+    "velocidade_alerta": VELOCIDADE_ALERTA,
+    "velocidade_panico": VELOCIDADE_PANICO,
+    "subida_gradual": SUBIDA_GRADUAL,
+    # Intervalos mínimos entre postagens (minutos)
+    "intervalo_emergencia": 20,
+    "intervalo_nivel_alto": 60,
+    "intervalo_subida_rapida": 30,
+    "intervalo_panico": 15,
+    "intervalo_gradual": 60,
+    "intervalo_rotina": 240,  # rotina: no máximo uma a cada 4h
+}
+
+# Casos, na ordem em que as regras são testadas
+EMERGENCIA, NIVEL_ALTO, ESTAGNOU, SUBIDA_RAPIDA, SUBIDA_LENTA, ROTINA = range(6)
+NOMES_CASOS = ("Emergência", "Nível alto", "Subida rápida estagnada", "Subida rápida", "Subida gradual", "Rotina")
+
+def parametros(**alteracoes):
+    """PARAMETROS_PADRAO com as alterações pedidas (nome errado é erro, não é ignorado)."""
+    desconhecidos = set(alteracoes) - set(PARAMETROS_PADRAO)
+    if desconhecidos:
+        raise ValueError(f"Parâmetros desconhecidos: {', '.join(sorted(desconhecidos))}")
+    return {**PARAMETROS_PADRAO, **alteracoes}
+
+# ==============================================================================
+# REGRAS
+# ==============================================================================
+def decidir_vetor(nivel, nivel_anterior, velocidade, p=PARAMETROS_PADRAO):
+    """
+    Regras para vetores (uma posição por ciclo). Retorna (deve_postar, intervalo
+    em minutos, caso), arrays do mesmo tamanho.
+    """
+    nivel = np.asarray(nivel, dtype=np.float64)
+    nivel_anterior = np.asarray(nivel_anterior, dtype=np.float64)
+    velocidade = np.asarray(velocidade, dtype=np.float64)
+
+    alto = nivel >= p["limite_alerta"]
+    rapida = ~alto & (velocidade >= p["velocidade_alerta"])
+    # Trava: subida rápida só posta se o nível realmente subiu em relação à última leitura
+    estagnou = rapida & (nivel <= nivel_anterior)
+    lenta = ~alto & ~rapida & (velocidade > p["subida_gradual"])
+
+    condicoes = [alto & (velocidade > 0), alto, estagnou, rapida, lenta]
+    caso = np.select(condicoes, [EMERGENCIA, NIVEL_ALTO, ESTAGNOU, SUBIDA_RAPIDA, SUBIDA_LENTA], ROTINA)
+    intervalo_rapida = np.where(velocidade >= p["velocidade_panico"], p["intervalo_panico"], p["intervalo_subida_rapida"])
+    intervalo = np.select(condicoes, [p["intervalo_emergencia"], p["intervalo_nivel_alto"], p["intervalo_subida_rapida"],
+                                      intervalo_rapida, p["intervalo_gradual"]], p["intervalo_rotina"])
+    return caso != ESTAGNOU, intervalo.astype(np.int64), caso
+
+def decidir(nivel_atual, nivel_anterior, velocidade, p=PARAMETROS_PADRAO):
+    """Um ciclo do monitor: (deve_postar, intervalo_minutos, motivo)."""
+    deve, intervalo, caso = decidir_vetor([nivel_atual], [nivel_anterior], [velocidade], p)
+    caso = int(caso[0])
+    motivos = {
+        EMERGENCIA: f"EMERGÊNCIA (Nível {nivel_atual})",
+        NIVEL_ALTO: "Nível Alto (Estável/Descendo)",
+        ESTAGNOU: f"Subida Rápida ({velocidade:.1f}cm/h), mas nível estagnou agora.",
+        SUBIDA_RAPIDA: f"SUBIDA RÁPIDA (+{velocidade:.1f} cm/h)",
+        SUBIDA_LENTA: "Subida Gradual",
+        ROTINA: "ROTINA (Estável/Baixando)",
+    }
+    return bool(deve[0]), int(intervalo[0]), motivos[caso]
+
+def liberar(intervalo, minutos_desde_ultima):
+    """
+    Relógio do job: a postagem decidida sai agora? Todo caso (rotina inclusive,
+    com o intervalo_rotina) espera o próprio intervalo desde a última postagem.
+    `minutos_desde_ultima` None = ainda não postou neste processo.
+    """
+    return minutos_desde_ultima is None or minutos_desde_ultima >= intervalo
@@ -1,68 +1,223 @@
-import sqlite3
-import pandas as pd
-from datetime import datetime
+"""
+IMPORTAÇÃO EM MASSA DE HISTÓRICOS (CSV / XLSX) PARA O rio_doce.db
+Reconhece os formatos que o projeto já usa pelo cabeçalho:
+  - exportação da ANA:  data;chuva;nivel;vazao  (historico_timoteo.csv, historico_guilman.csv e os .xlsx)
+  - planilha da Defesa Civil:  Data_Hora;Nivel_Adotado  (historico_anos.csv)
+  - CSVs do próprio sistema:  Data,Nivel_cm,Vazao_m3s[,Chuva_mm]  (coleta da Guilman, bot pesquisador)
+Lê tudo em colunas (pandas/NumPy, sem laço por linha), remove datas repetidas e
+grava na tabela `leituras` numa transação por arquivo (upsert: rodar de novo não duplica).
+
+Uso:
+    python importar_planilha.py                          (importa todos os históricos conhecidos da pasta)
+    python importar_planilha.py arquivo.csv [apelido]    (um arquivo; apelido da estação no estacoes.json)
+"""
 import os
+import sys
+import time
+import unicodedata
+import xml.etree.ElementTree as ET
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+import arquivo_grade
+import banco_rio
+import estacoes
+from serie_estacao import SerieEstacao
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+
+# Arquivos que vêm com o projeto (os que não existirem são pulados)
+ARQUIVOS_CONHECIDOS = [
+    "historico_timoteo.csv",
+    "historico_guilman.csv",
+    "historico_anos.xlsx",
+    "historico_guilman.xlsx",
+    "historico_anos.csv",
+    "historico_guilman_coletado.csv",
+    "historico_Guilman_07-01-2023.csv",
+]
+
+# Planilhas sem o nome da estação no arquivo são de Timóteo (ex: historico_anos.*)
+ESTACAO_PADRAO = "timoteo"
+
+# Data do Excel: dias desde 30/12/1899
+EXCEL_DIA_ZERO = np.datetime64("1899-12-30T00:00:00", "s")
+
+# ==============================================================================
+# DETECÇÃO DO FORMATO
+# ==============================================================================
+def _normalizar(texto):
+    texto = unicodedata.normalize("NFKD", str(texto).strip().lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+def mapear_colunas(cabecalho):
+    """
+    Posição de cada campo pelo nome da coluna: a data é a primeira que começa
+    com 'data'; nível, vazão e chuva pelo nome ('Nível adotado (cm)', 'Vazao_m3s'...).
+    """
+    nomes = [_normalizar(c) for c in cabecalho]
+    mapa = {}
+    for i, nome in enumerate(nomes):
+        if "data" not in mapa and nome.startswith("data"):
+            mapa["data"] = i
+        for campo in ("nivel", "vazao", "chuva"):
+            if campo not in mapa and campo in nome:
+                mapa[campo] = i
+    if "data" not in mapa or not ({"nivel", "vazao"} & set(mapa)):
+        raise ValueError(f"Formato não reconhecido. Colunas: {list(cabecalho)}")
+    return mapa
+
+def estacao_do_arquivo(caminho):
+    """Estação pelo nome do arquivo (csv_historico ou nome da estação no estacoes.json)."""
+    nome = _normalizar(os.path.basename(caminho))
+    for item in estacoes.cadastro().values():
+        if item["csv_historico"] and _normalizar(item["csv_historico"]) == nome:
+            return item
+    for item in estacoes.cadastro().values():
+        if any(n in nome for n in item["nomes_busca"]):
+            return item
+    return estacoes.estacao(ESTACAO_PADRAO)
+
+# ==============================================================================
+# LEITURA EM COLUNAS
+# ==============================================================================
+def _numeros(coluna):
+    """Textos com vírgula ou ponto decimal -> float64 (vazio ou inválido vira NaN)."""
+    texto = pd.Series(coluna, dtype="string").str.strip().str.replace(",", ".", regex=False)
+    return pd.to_numeric(texto, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+def _datas_texto(coluna):
+    """Datas 'dd/mm/aaaa HH:MM[:SS]' ou 'aaaa-mm-dd HH:MM:SS' -> epoch (NaT vira -1)."""
+    texto = pd.Series(coluna, dtype="string").str.strip()
+    amostra = texto[texto.str.len() > 0]
+    primeira = amostra.iloc[0] if len(amostra) else ""
+    if "/" in primeira:
+        # Formato fixo: o pandas converte tudo em C, sem adivinhar linha a linha
+        formato = "%d/%m/%Y %H:%M:%S" if len(primeira) >= 19 else "%d/%m/%Y %H:%M"
+    else:
+        formato = "ISO8601"
+    return _epochs(pd.to_datetime(texto, format=formato, errors="coerce"))
+
+def _datas_excel(coluna):
+    """Número de série do Excel (dias com fração) -> epoch, arredondado ao segundo."""
+    dias = _numeros(coluna)
+    segundos = np.round(dias * 86400)
+    epoch = EXCEL_DIA_ZERO.astype(np.int64) + np.nan_to_num(segundos, nan=0).astype(np.int64)
+    return np.where(np.isnan(dias), -1, epoch)
+
+def _epochs(datas):
+    valores = datas.to_numpy(dtype="datetime64[s]")
+    return np.where(np.isnat(valores), -1, valores.astype(np.int64))
+
+def ler_csv(caminho):
+    """CSV -> (cabeçalho, colunas de texto), pelo motor C do pandas."""
+    with open(caminho, encoding="utf-8-sig", errors="replace") as f:
+        primeira = f.readline()
+    separador = ";" if primeira.count(";") >= primeira.count(",") else ","
+    tabela = pd.read_csv(caminho, sep=separador, dtype=str, encoding="utf-8-sig",
+                         encoding_errors="replace", keep_default_na=False, engine="c")
+    return list(tabela.columns), [tabela[c].to_numpy() for c in tabela.columns]
+
+def ler_xlsx(caminho):
+    """
+    Primeira aba de um .xlsx -> (cabeçalho, colunas de texto), em streaming e só
+    com a biblioteca padrão (sem openpyxl). Datas ficam como número de série do Excel.
+    """
+    ns = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+    with zipfile.ZipFile(caminho) as z:
+        compartilhados = []
+        if "xl/sharedStrings.xml" in z.namelist():
+            with z.open("xl/sharedStrings.xml") as f:
+                for _, el in ET.iterparse(f):
+                    if el.tag == ns + "si":
+                        compartilhados.append("".join(t.text or "" for t in el.iter(ns + "t")))
+                        el.clear()
+
+        aba = sorted(n for n in z.namelist() if n.startswith("xl/worksheets/sheet"))[0]
+        linhas = []
+        with z.open(aba) as f:
+            for _, el in ET.iterparse(f):
+                if el.tag != ns + "row":
+                    continue
+                linha = {}
+                for celula in el.iter(ns + "c"):
+                    v = celula.find(ns + "v")
+                    if v is None or v.text is None:
+                        continue
+                    letras = "".join(ch for ch in celula.get("r", "") if ch.isalpha())
+                    coluna = 0
+                    for ch in letras:
+                        coluna = coluna * 26 + ord(ch) - 64
+                    linha[coluna - 1] = compartilhados[int(v.text)] if celula.get("t") == "s" else v.text
+                if linha:
+                    linhas.append(linha)
+                el.clear()
+
+    if not linhas:
+        return [], []
+    largura = max(linhas[0]) + 1
+    cabecalho = [linhas[0].get(i, "") for i in range(largura)]
+    colunas = [np.array([l.get(i, "") for l in linhas[1:]], dtype=object) for i in range(largura)]
+    return cabecalho, colunas
+
+def ler_arquivo(caminho, codigo):
+    """Qualquer formato conhecido -> SerieEstacao ordenada e sem datas repetidas."""
+    if caminho.lower().endswith(".xlsx"):
+        cabecalho, colunas = ler_xlsx(caminho)
+        mapa = mapear_colunas(cabecalho)
+        epoch = _datas_excel(colunas[mapa["data"]])
+    else:
+        cabecalho, colunas = ler_csv(caminho)
+        mapa = mapear_colunas(cabecalho)
+        epoch = _datas_texto(colunas[mapa["data"]])
+
+    vazio = np.full(len(epoch), np.nan)
+    campos = {c: _numeros(colunas[mapa[c]]) if c in mapa else vazio for c in ("nivel", "vazao", "chuva")}
+    validas = (epoch >= 0) & ~(np.isnan(campos["nivel"]) & np.isnan(campos["vazao"]))
+    serie = SerieEstacao(codigo, epoch[validas], campos["nivel"][validas], campos["vazao"][validas], campos["chuva"][validas])
+    return serie.ordenada()
+
+# ==============================================================================
+# GRAVAÇÃO
+# ==============================================================================
+def _com_none(valores):
+    """NaN -> None (NULL no SQLite) sem laço em Python puro por linha."""
+    objetos = valores.astype(object)
+    objetos[np.isnan(valores)] = None
+    return objetos.tolist()
+
+def importar_arquivo(caminho, apelido=None):
+    """Importa um arquivo para a tabela `leituras`. Retorna quantas leituras foram enviadas."""
+    estacao = estacoes.estacao(apelido) if apelido else estacao_do_arquivo(caminho)
+    inicio = time.perf_counter()
+    serie = ler_arquivo(caminho, estacao["codigo"])
+    linhas = zip(serie.epoch.tolist(), _com_none(serie.nivel), _com_none(serie.vazao), _com_none(serie.chuva))
+    with banco_rio.escrita() as conn:
+        total = banco_rio.gravar_leituras(conn, estacao["codigo"], linhas)
+    print(f"✅ {os.path.basename(caminho)} -> {estacao['nome']}: {total} leituras ({time.perf_counter() - inicio:.1f}s)")
+    return total
+
+def importar_tudo():
+    """Recria o histórico numa máquina nova: todos os arquivos conhecidos + grade binária."""
+    inicio = time.perf_counter()
+    total = 0
+    for nome in ARQUIVOS_CONHECIDOS:
+        caminho = os.path.join(DIRETORIO, nome)
+        if not os.path.exists(caminho):
+            continue
+        try:
+            total += importar_arquivo(caminho)
+        except Exception as e:
+            print(f"❌ {nome}: {e}")
 
-def importar_planilha_manual():
-    arquivo = "historico_anos.csv"
-    
-    if not os.path.exists(arquivo):
-        print(f"❌ Erro: O arquivo '{arquivo}' não foi encontrado.")
-        return
-
-    print(f"⏳ Lendo arquivo {arquivo} com as novas colunas...")
-    
-    try:
-        # Tenta ler o CSV (detectando separador automaticamente e usando latin1 para acentos)
-        df = pd.read_csv(arquivo, sep=None, engine='python', encoding='latin1')
-
-        # --- MAPEAMENTO COM OS NOVOS NOMES ---
-        col_data = "Data_Hora"
-        col_nivel = "Nivel_Adotado"
-
-        # Verifica se as colunas existem mesmo no arquivo
-        if col_data not in df.columns or col_nivel not in df.columns:
-            print(f"❌ Erro: Colunas não encontradas! As colunas no arquivo são: {list(df.columns)}")
-            return
-
-        print("🧹 Formatando dados...")
-        
-        # Converte a coluna de data (Pandas é inteligente para detectar o formato)
-        df[col_data] = pd.to_datetime(df[col_data], dayfirst=True, errors='coerce')
-        
-        # Remove linhas onde a data ou o nível são nulos
-        df = df.dropna(subset=[col_data, col_nivel])
-
-        # Conectar ao Banco de Dados
-        conn = sqlite3.connect("rio_doce.db")
-        cursor = conn.cursor()
-        
-        # Garante a existência da tabela
-        cursor.execute("CREATE TABLE IF NOT EXISTS historico (data_hora DATETIME UNIQUE, nivel REAL)")
-
-        registros_novos = 0
-        print("📥 Inserindo dados no SQLite...")
-        
-        for _, linha in df.iterrows():
-            try:
-                dt_str = linha[col_data].strftime("%Y-%m-%d %H:%M:%S")
-                nivel = float(linha[col_nivel])
-                
-                # INSERT OR IGNORE para não dar erro em datas duplicadas
-                cursor.execute("INSERT OR IGNORE INTO historico (data_hora, nivel) VALUES (?, ?)", (dt_str, nivel))
-                if cursor.rowcount > 0:
-                    registros_novos += 1
-            except:
-                continue
-
-        conn.commit()
-        conn.close()
-        
-        print(f"✅ Sucesso total!")
-        print(f"📊 Foram inseridos {registros_novos} registros no banco 'rio_doce.db'.")
-
-    except Exception as e:
-        print(f"❌ Erro crítico na importação: {e}")
+    print("⏳ Atualizando a grade binária (arquivo_rio/)...")
+    arquivo_grade.atualizar_todas()
+    print(f"📊 {total} leituras importadas em {time.perf_counter() - inicio:.1f}s.")
 
 if __name__ == "__main__":
-    importar_planilha_manual()
\ No newline at end of file
+    if len(sys.argv) > 1:
+        importar_arquivo(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        importar_tudo()
@@ -0,0 +1,221 @@
+"""
+MEMÓRIA RECENTE (BUFFER CIRCULAR POR ESTAÇÃO)
+As últimas HORAS_MEMORIA horas de leituras de cada estação ficam em memória,
+em vetores array('d') de tamanho fixo: acrescentar uma leitura, pegar as 3
+últimas ou a janela do gráfico/das taxas não lê nem grava disco.
+O conteúdo vai para o rio_doce.db (tabela serie_recente, via estado_sistema)
+só a cada INTERVALO_FOTO segundos e na saída do processo; ao abrir, o buffer
+começa com a última foto, então reiniciar o monitor não zera a velocidade.
+"""
+import atexit
+import math
+import threading
+import time
+from array import array
+
+import estacoes
+import estado_sistema
+from serie_estacao import datetime_para_epoch, epoch_para_datetime
+
+HORAS_MEMORIA = 24       # quanto de cada estação fica em memória
+INTERVALO_FOTO = 15 * 60  # segundos entre gravações no disco
+CAMPOS = ("nivel", "vazao", "chuva")
+
+_buffers = {}
+_trava = threading.RLock()
+_ultima_foto = time.monotonic()
+
+# ==============================================================================
+# BUFFER
+# ==============================================================================
+class BufferCircular:
+    """
+    Leituras de uma estação em ordem de horário, nos vetores de tamanho fixo
+    (epoch, nivel, vazao, chuva). Quando enche, a mais antiga é sobrescrita;
+    leituras mais velhas que `horas` em relação à mais nova também saem.
+    """
+    __slots__ = ("codigo", "capacidade", "horas", "epoch", "nivel", "vazao", "chuva", "inicio", "tamanho")
+
+    def __init__(self, codigo, capacidade, horas=HORAS_MEMORIA):
+        self.codigo = codigo
+        self.capacidade = capacidade
+        self.horas = horas
+        self.epoch = array("d", [0.0]) * capacidade
+        self.nivel = array("d", [math.nan]) * capacidade
+        self.vazao = array("d", [math.nan]) * capacidade
+        self.chuva = array("d", [math.nan]) * capacidade
+        self.inicio = 0
+        self.tamanho = 0
+
+    def __len__(self):
+        return self.tamanho
+
+    def _posicao(self, i):
+        """Posição no vetor da i-ésima leitura (0 = mais antiga, -1 = mais nova)."""
+        if i < 0:
+            i += self.tamanho
+        return (self.inicio + i) % self.capacidade
+
+    def adicionar(self, epoch, nivel=math.nan, vazao=math.nan, chuva=math.nan):
+        """
+        Acrescenta uma leitura. O mesmo horário de novo só completa/atualiza os
+        valores; horário mais antigo que a última leitura é ignorado (o histórico
+        completo está no banco). Retorna True se algo mudou.
+        """
+        if self.tamanho:
+            p = self._posicao(-1)
+            ultimo = self.epoch[p]
+            if epoch < ultimo:
+                return False
+            if epoch == ultimo:
+                for vetor, valor in ((self.nivel, nivel), (self.vazao, vazao), (self.chuva, chuva)):
+                    if valor == valor:  # não é NaN
+                        vetor[p] = valor
+                return True
+
+        if self.tamanho == self.capacidade:
+            self.inicio = (self.inicio + 1) % self.capacidade
+            self.tamanho -= 1
+        p = (self.inicio + self.tamanho) % self.capacidade
+        self.epoch[p], self.nivel[p], self.vazao[p], self.chuva[p] = epoch, nivel, vazao, chuva
+        self.tamanho += 1
+
+        # Janela de tempo: descarta o que ficou mais velho que `horas`
+        limite = epoch - self.horas * 3600
+        while self.tamanho and self.epoch[self.inicio] < limite:
+            self.inicio = (self.inicio + 1) % self.capacidade
+            self.tamanho -= 1
+        return True
+
+    def leitura(self, i):
+        """(epoch, nivel, vazao, chuva) da i-ésima leitura (0 = mais antiga, -1 = mais nova)."""
+        p = self._posicao(i)
+        return self.epoch[p], self.nivel[p], self.vazao[p], self.chuva[p]
+
+    def ultimos(self, quantidade, campo="nivel"):
+        """Valores de `campo` das `quantidade` leituras mais novas, da mais antiga para a mais nova."""
+        vetor = getattr(self, campo)
+        quantidade = min(quantidade, self.tamanho)
+        return [vetor[self._posicao(i)] for i in range(self.tamanho - quantidade, self.tamanho)]
+
+    def janela(self, desde_epoch, campo="nivel"):
+        """(epochs, valores) a partir de `desde_epoch`, em ordem de horário (para gráficos)."""
+        vetor = getattr(self, campo)
+        epochs, valores = array("d"), array("d")
+        for i in range(self.tamanho):
+            p = (self.inicio + i) % self.capacidade
+            if self.epoch[p] >= desde_epoch:
+                epochs.append(self.epoch[p])
+                valores.append(vetor[p])
+        return epochs, valores
+
+# ==============================================================================
+# BUFFERS POR ESTAÇÃO
+# ==============================================================================
+def nome_serie(codigo, campo):
+    """Nome da série da estação na tabela serie_recente (ex: nivel_56696000)."""
+    return f"{campo}_{codigo}"
+
+def _capacidade(codigo):
+    # Folga de 2x sobre a cadência cadastrada (a ANA às vezes manda leituras a cada 5 min)
+    cadastrada = estacoes.por_codigo(codigo)
+    cadencia = cadastrada["cadencia_min"] if cadastrada else estacoes.CADENCIA_PADRAO_MIN
+    return int(HORAS_MEMORIA * 60 / cadencia) * 2 + 1
+
+def buffer(codigo):
+    """Buffer da estação, criado no primeiro uso a partir da última foto gravada."""
+    with _trava:
+        if codigo not in _buffers:
+            novo = BufferCircular(codigo, _capacidade(codigo))
+            try:
+                pontos = {}
+                for campo in CAMPOS:
+                    for momento, valor in estado_sistema.ler_pontos(nome_serie(codigo, campo)):
+                        pontos.setdefault(datetime_para_epoch(momento), {})[campo] = valor
+                for epoch in sorted(pontos):
+                    novo.adicionar(epoch, **pontos[epoch])
+            except Exception as e:
+                print(f"⚠️ Memória recente de {codigo} começa vazia ({e})")
+            _buffers[codigo] = novo
+        return _buffers[codigo]
+
+def registrar(codigo, momento, nivel=None, vazao=None, chuva=None):
+    """Acrescenta uma leitura (datetime) ao buffer da estação; None vira 'sem leitura'."""
+    def numero(v):
+        return math.nan if v is None else float(v)
+    with _trava:
+        buffer(codigo).adicionar(datetime_para_epoch(momento), numero(nivel), numero(vazao), numero(chuva))
+    salvar_se_preciso()
+
+def registrar_leituras(codigo, leituras):
+    """Acrescenta leituras no formato do monitor ({'data', 'nivel', 'vazao', 'chuva'}), em qualquer ordem."""
+    with _trava:
+        atual = buffer(codigo)
+        for leitura in sorted(leituras, key=lambda l: l["data"]):
+            atual.adicionar(
+                datetime_para_epoch(leitura["data"]),
+                *(math.nan if leitura.get(c) is None else float(leitura[c]) for c in CAMPOS),
+            )
+    salvar_se_preciso()
+
+def ultimos(codigo, quantidade, campo="nivel"):
+    with _trava:
+        return buffer(codigo).ultimos(quantidade, campo)
+
+def serie(codigo, horas=HORAS_MEMORIA, campo="nivel"):
+    """(epochs, valores) em array('d') das últimas `horas` da estação (entrada do taxas_rio)."""
+    with _trava:
+        atual = buffer(codigo)
+        if not len(atual):
+            return array("d"), array("d")
+        return atual.janela(atual.leitura(-1)[0] - horas * 3600, campo)
+
+def janela(codigo, horas, campo="nivel"):
+    """[(datetime, valor)] das últimas `horas` horas da estação, direto da memória (gráfico da capa)."""
+    with _trava:
+        atual = buffer(codigo)
+        if not len(atual):
+            return []
+        epochs, valores = atual.janela(atual.leitura(-1)[0] - horas * 3600, campo)
+    return [(epoch_para_datetime(int(e)), v) for e, v in zip(epochs, valores) if v == v]
+
+# ==============================================================================
+# FOTO NO DISCO
+# ==============================================================================
+def salvar():
+    """Grava o conteúdo de todos os buffers na serie_recente (uma transação)."""
+    global _ultima_foto
+    with _trava:
+        fotos = {}
+        for codigo, atual in _buffers.items():
+            if not len(atual):
+                continue
+            leituras = [atual.leitura(i) for i in range(len(atual))]
+            fotos[codigo] = (leituras[0][0], leituras)
+        _ultima_foto = time.monotonic()
+    if not fotos:
+        return
+    with estado_sistema.transacao() as conn:
+        for codigo, (mais_antiga, leituras) in fotos.items():
+            for posicao, campo in enumerate(CAMPOS, start=1):
+                nome = nome_serie(codigo, campo)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO serie_recente VALUES (?, ?, ?)",
+                    [(nome, int(l[0]), l[posicao]) for l in leituras if l[posicao] == l[posicao]],
+                )
+                conn.execute("DELETE FROM serie_recente WHERE nome = ? AND epoch < ?", (nome, int(mais_antiga)))
+
+def salvar_se_preciso():
+    if time.monotonic() - _ultima_foto >= INTERVALO_FOTO:
+        try:
+            salvar()
+        except Exception as e:
+            print(f"⚠️ Erro ao gravar memória recente: {e}")
+
+def _salvar_na_saida():
+    try:
+        salvar()
+    except Exception as e:
+        print(f"⚠️ Erro ao gravar memória recente na saída: {e}")
+
+atexit.register(_salvar_na_saida)
@@ -1,18 +1,27 @@
-import requests
-import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
 import time
 import os
-import csv
-import json
+import csv_coletado
 from pathlib import Path
 from dotenv import load_dotenv
 import random
 import cerebro_ia
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+import cliente_ana
+import arquivo_grade
+import banco_rio
+import calibracao_montante
+import cheias_parecidas
+import estacoes
+import estado_sistema
+import estrategia_postagem
+import memoria_recente
+import previsao_rio
+import registro
+import taxas_rio
 import monitor_clima
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor, wait
+from serie_estacao import datetime_para_epoch
 
 # --- MÓDULOS LOCAIS ---
 from gerar_imagem import gerar_todas_imagens
@@ -28,433 +37,444 @@ load_dotenv()
 # ==============================================================================
 MODO_TESTE = False
 
-LIMITE_ALERTA = 600
+# Limites da estratégia de postagem: ficam no estrategia_postagem.py (o backtest usa os mesmos)
+LIMITE_ALERTA = estrategia_postagem.LIMITE_ALERTA
 LIMITE_GRAVE = 760
 
-VELOCIDADE_ALERTA = 10
-VELOCIDADE_PANICO = 30
+VELOCIDADE_ALERTA = estrategia_postagem.VELOCIDADE_ALERTA
+VELOCIDADE_PANICO = estrategia_postagem.VELOCIDADE_PANICO
 
 DELTA_BARRAGEM_CRITICO = 40
 DELTA_NOVA_ERA_ALERTA = 50
 
-ARQUIVO_CONTADOR = "stories_ativos.json"
-ARQUIVO_HISTORICO_RECENTE = "historico_velocidade.json"
+# Subindo mais que isso (cm/h), o Telegram mostra as cheias parecidas do histórico
+SUBIDA_CHEIAS_PARECIDAS = 2
 
-ESTACAO_TIMOTEO = "56696000"
-ESTACAO_BARRAGEM = "56688080"
-ESTACAO_NOVA_ERA = "56661000"
+# Códigos vêm do cadastro (estacoes.json)
+ESTACAO_TIMOTEO = estacoes.codigo("timoteo")
+ESTACAO_BARRAGEM = estacoes.codigo("barragem")
+ESTACAO_NOVA_ERA = estacoes.codigo("nova_era")
 
 # Configurações Guilman (Valores obtidos do histórico)
-ESTACAO_GUILMAN = "56675080"
+ESTACAO_GUILMAN = estacoes.codigo("guilman")
 ALERTA_VAZAO_AMARELO = 879   # Início de Atenção
 ALERTA_VAZAO_VERMELHO = 1406  # Risco Real de Enchente
 
-ULTIMA_DATA_ANA = None
-ULTIMA_POSTAGEM = None
-
+# Prazo total (segundos) para a busca das estações em cada ciclo. Quem não
+# responder a tempo segue com o que já está no rio_doce.db.
+PRAZO_BUSCA_ESTACOES = 35
+# A busca ao vivo cabe no prazo: uma tentativa só (sem retentativa da sessão),
+# em no máximo 2 endpoints, 8s de timeout em cada -> ~16s no pior caso
+TIMEOUT_BUSCA_ESTACAO = 8
+ENDPOINTS_BUSCA_ESTACAO = 2
+# "Mesma data em anos anteriores": o que faltar no local vai à ANA em paralelo, dentro deste prazo
+PRAZO_BUSCA_HISTORICO = 20
+TIMEOUT_BUSCA_HISTORICO = 8
+RETENTAR_SEM_DADOS_HORAS = 72  # a ANA respondeu sem dado: o passado não muda, pergunta de novo só depois disso
+RETENTAR_ERRO_HORAS = 1        # a ANA falhou: tenta de novo no próximo ciclo da hora seguinte
+# Quantas estações baixando ao mesmo tempo (o cadastro pode ter dezenas)
+MAX_BUSCAS_SIMULTANEAS = 8
+# Horas de Timóteo no gráfico da capa (saem da memória recente)
+HORAS_GRAFICO = 5
 
-# Função para garantir o caminho correto do banco
-def conectar_banco():
-    diretorio_atual = os.path.dirname(os.path.abspath(__file__))
-    caminho_db = os.path.join(diretorio_atual, "rio_doce.db")
-    return sqlite3.connect(caminho_db)
+ULTIMA_POSTAGEM = None
 
-def salvar_leitura_no_banco(data_hora, nivel):
-    """Guarda a leitura atual no banco local para consultas futuras"""
-    try:
-        conn = conectar_banco()
-        cursor = conn.cursor()
-        # Converte a data para string no formato do SQLite
-        dt_str = data_hora.strftime("%Y-%m-%d %H:%M:%S")
-        cursor.execute("INSERT OR IGNORE INTO historico (data_hora, nivel) VALUES (?, ?)", (dt_str, nivel))
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        # Relança o erro para o try-except do loop capturar
-        raise e
 
 # ==============================================================================
 # FUNÇÕES AUXILIARES
 # ==============================================================================
 def verificar_trava_instagram():
     """Retorna True se o sistema estiver LIBERADO, False se estiver TRAVADO manual."""
-    arquivo = "trava_instagram.json"
-    if os.path.exists(arquivo):
-        try:
-            with open(arquivo, "r") as f:
-                dados = json.load(f)
-                return dados.get("ativo", True)
-        except:
-            return True # Na dúvida, deixa ligado
-    return True
+    try:
+        return estado_sistema.instagram_liberado()
+    except Exception as e:
+        print(f"⚠️ Erro ao ler trava do Instagram: {e}")
+        return True # Na dúvida, deixa ligado
 
 def registrar_log(mensagem, enviar_tg=True):
-    """Escreve no terminal, no arquivo de log e MANDA NO TELEGRAM (Mensagens Curtas)"""
+    """
+    Escreve no terminal, no arquivo de log e MANDA NO TELEGRAM (Mensagens Curtas).
+    Arquivo e Telegram ficam com o módulo registro, em segundo plano: o job não
+    espera o disco nem a internet, e várias linhas seguidas viram uma só mensagem.
+    """
     timestamp = datetime.now().strftime("%H:%M") 
     texto_completo = f"[{timestamp}] {mensagem}"
     print(texto_completo)
-    
-    with open("sistema.log", "a", encoding="utf-8") as f:
-        f.write(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {mensagem}\n")
-    
+
+    texto_tg = None
     if enviar_tg:
-        try:
-            emoji = "ℹ️"
-            if "CRÍTICA" in mensagem or "GRAVE" in mensagem or "FLASH" in mensagem: emoji = "🚨"
-            elif "ALERTA" in mensagem or "SUBINDO" in mensagem: emoji = "⚠️"
-            elif "POSTAGEM" in mensagem: emoji = "🚀"
-            elif "Sucesso" in mensagem: emoji = "✅"
-            elif "Erro" in mensagem: emoji = "❌"
-            elif "VAZANTE" in mensagem: emoji = "📉"
-            # Nota: O Telegram detalhado é enviado separado, aqui são só logs de sistema
-            enviar_telegram(f"{emoji} {mensagem}")
-        except:
-            pass
+        emoji = "ℹ️"
+        if "CRÍTICA" in mensagem or "GRAVE" in mensagem or "FLASH" in mensagem: emoji = "🚨"
+        elif "ALERTA" in mensagem or "SUBINDO" in mensagem: emoji = "⚠️"
+        elif "POSTAGEM" in mensagem: emoji = "🚀"
+        elif "Sucesso" in mensagem: emoji = "✅"
+        elif "Erro" in mensagem: emoji = "❌"
+        elif "VAZANTE" in mensagem: emoji = "📉"
+        # Nota: O Telegram detalhado é enviado separado, aqui são só logs de sistema
+        texto_tg = f"{emoji} {mensagem}"
+    try:
+        registro.registrar(mensagem, texto_tg)
+    except Exception as e:
+        print(f"⚠️ Falha no registro: {e}")
 
 def salvar_csv(data_hora, nivel, tendencia, estacao):
-    arquivo = "historico_rio.csv"
-    existe = os.path.exists(arquivo)
-    with open(arquivo, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        if not existe: writer.writerow(["DataHora", "Estacao", "Nivel", "Tendencia"])
-        writer.writerow([data_hora, estacao, nivel, tendencia])
+    """Anexa a leitura ao historico_rio.csv (só se for mais nova que a última gravada da estação)."""
+    csv_coletado.anexar("historico_rio.csv", data_hora, estacao, nivel, tendencia)
 
 
 
 def gerenciar_contador_stories(eh_rotina=True):
-    arquivo_json = "stories_ativos.json"
-    
     # --- CONFIGURAÇÃO DA JANELA DESLIZANTE ---
     limite_maximo = 6      # O teto do Instagram
     lote_postagem = 2      # Quantos stories postamos por vez (sempre de 2 em 2)
     qtd_a_apagar = 2       # Quantos a macro apaga de uma vez
     # -----------------------------------------
-    
-    # 1. Carrega Estado Atual
-    dados = {"quantidade": 0}
-    if os.path.exists(arquivo_json):
-        try:
-            with open(arquivo_json, "r") as f:
-                dados = json.load(f)
-        except Exception as e:
-            registrar_log(f"Erro JSON (resetando): {e}", enviar_tg=False)
-
-    qtd_atual = dados.get("quantidade", 0)
-    precisa_limpar = False
+    conta = {}
+
+    def proximo_estado(dados):
+        # 1. Estado Atual (lido na mesma transação em que o novo será gravado)
+        qtd_atual = (dados or {}).get("quantidade", 0)
+        conta["antes"] = qtd_atual
+        conta["precisa_limpar"] = False
+
+        # 2. Verifica se vai estourar o limite
+        # Ex: Tenho 6. Se somar 2, vai pra 8. 8 > 6? Sim. Então limpa.
+        if (qtd_atual + lote_postagem) > limite_maximo:
+            conta["precisa_limpar"] = True
+            # Não zeramos. Subtraímos o que a macro vai apagar. Ex: 6 - 2 = 4.
+            # Segurança: Se a conta der negativo (erro de sincronia), assume 0
+            qtd_atual = max(0, qtd_atual - qtd_a_apagar)
+
+        # 3. Soma os novos que vão entrar agora
+        # Ex: Estava com 4 (após apagar), entram 2 => Vai para 6.
+        return {
+            "quantidade": qtd_atual + lote_postagem,
+            "ultima_atualizacao": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
 
-    # 2. Verifica se vai estourar o limite
-    # Ex: Tenho 6. Se somar 2, vai pra 8. 8 > 6? Sim. Então limpa.
-    if (qtd_atual + lote_postagem) > limite_maximo:
-        registrar_log(f"🧹 Manutenção de Stories: {qtd_atual} ativos. Apagando antigos para manter janela de {limite_maximo}...", enviar_tg=False)
-        precisa_limpar = True
-        
-        # AQUI ESTÁ A CORREÇÃO:
-        # Não zeramos. Subtraímos o que a macro vai apagar.
-        # Ex: 6 - 2 = 4.
-        qtd_atual = qtd_atual - qtd_a_apagar
-        
-        # Segurança: Se a conta der negativo (erro de sincronia), assume 0
-        if qtd_atual < 0: qtd_atual = 0
-    
-    # 3. Soma os novos que vão entrar agora
-    # Ex: Estava com 4 (após apagar), entram 2 => Vai para 6.
-    qtd_nova = qtd_atual + lote_postagem
-    
-    # 4. Salva o futuro estado
-    dados_atualizados = {
-        "quantidade": qtd_nova,
-        "ultima_atualizacao": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    }
-    
     try:
-        with open(arquivo_json, "w") as f:
-            json.dump(dados_atualizados, f, indent=4)
-        print(f"💾 JSON Janela Deslizante: {qtd_atual + qtd_a_apagar if precisa_limpar else qtd_atual} - {qtd_a_apagar if precisa_limpar else 0} + {lote_postagem} = {qtd_nova} Stories.")
+        novo = estado_sistema.alterar(estado_sistema.CHAVE_STORIES, proximo_estado, {"quantidade": 0})
     except Exception as e:
-        registrar_log(f"Erro ao salvar JSON stories: {e}")
+        registrar_log(f"Erro ao salvar contador de stories: {e}")
+        return False
 
-    return precisa_limpar
+    if conta["precisa_limpar"]:
+        registrar_log(f"🧹 Manutenção de Stories: {conta['antes']} ativos. Apagando antigos para manter janela de {limite_maximo}...", enviar_tg=False)
+    print(f"💾 Janela Deslizante: {conta['antes']} - {qtd_a_apagar if conta['precisa_limpar'] else 0} + {lote_postagem} = {novo['quantidade']} Stories.")
+    return conta["precisa_limpar"]
 
 # ==============================================================================
 # MEMÓRIA HISTÓRICA
 # ==============================================================================
-def buscar_nivel_historico(ano_alvo):
+def _valor_mais_proximo(leituras, campo, agora):
+    """Entre as leituras de um ano passado, pega o valor do horário mais próximo de agora (ignorando o ano)."""
+    melhor_diferenca = float('inf')
+    valor_encontrado = None
+    for leitura in leituras:
+        if leitura[campo] is None: continue
+        try:
+            # Truque para comparar apenas dia/mês/hora ignorando o ano
+            dt_ajustada = leitura['data'].replace(year=agora.year, month=agora.month, day=agora.day)
+        except ValueError:
+            continue
+        diff = abs((agora - dt_ajustada).total_seconds())
+        if diff < melhor_diferenca:
+            melhor_diferenca = diff
+            valor_encontrado = leitura[campo]
+    return valor_encontrado
+
+def _chave_lacuna(codigo_estacao, data_historica):
+    return f"{codigo_estacao}|{data_historica:%Y-%m-%d}"
+
+def _lacunas_vigentes():
+    """Dias em que a ANA já respondeu sem dado (ou falhou) e ainda não é hora de perguntar de novo."""
     try:
-        agora = datetime.now()
-        data_historica = agora.replace(year=ano_alvo)
-        inicio = data_historica - timedelta(days=1)
-        fim = data_historica + timedelta(days=1)
-        
-        url = "http://telemetriaws1.ana.gov.br/ServiceANA.asmx/DadosHidrometeorologicos"
-        params = {
-            "codEstacao": ESTACAO_TIMOTEO,
-            "dataInicio": inicio.strftime("%d/%m/%Y"),
-            "dataFim": fim.strftime("%d/%m/%Y"),
-        }
-        
-        response = requests.get(url, params=params, timeout=20)
-        
-        if response.status_code == 200:
-            root = ET.fromstring(response.content)
-            melhor_diferenca = float('inf')
-            nivel_encontrado = None
-            
-            for dado in root.iter("DadosHidrometereologicos"):
-                nivel = dado.find("Nivel")
-                data_hora = dado.find("DataHora")
-                
-                if nivel is not None and data_hora is not None:
-                    try:
-                        dt_leitura = datetime.strptime(data_hora.text.strip(), "%Y-%m-%d %H:%M:%S")
-                        dt_ajustada = dt_leitura.replace(year=agora.year, month=agora.month, day=agora.day)
-                        diff = abs((agora - dt_ajustada).total_seconds())
-                        
-                        if diff < melhor_diferenca:
-                            melhor_diferenca = diff
-                            nivel_encontrado = float(nivel.text)
-                    except: continue
-            
-            if nivel_encontrado is not None:
-                return nivel_encontrado
-                
-        return "N/D"
-    except:
-        return "Erro"
-    
-def buscar_vazao_historica(ano_alvo, codigo_estacao):
-    """Busca na ANA a VAZÃO na mesma data/hora, mas no ano solicitado."""
+        lacunas = estado_sistema.ler(estado_sistema.CHAVE_SEM_DADOS_MESMA_DATA, {})
+    except Exception as e:
+        print(f"⚠️ Não deu para ler as lacunas da mesma data ({e}).")
+        return set()
+    agora = time.time()
+    return {chave for chave, tentar_depois in lacunas.items() if tentar_depois > agora}
+
+def _marcar_lacuna(chave, horas):
+    """Anota que `chave` não tem dado na ANA; só pergunta de novo depois de `horas` (vencidas saem)."""
+    agora = time.time()
+    def marcar(lacunas):
+        lacunas = {c: t for c, t in (lacunas or {}).items() if t > agora}
+        lacunas[chave] = agora + horas * 3600
+        return lacunas
     try:
-        agora = datetime.now()
-        # Define a data no passado (mesmo dia/mês, ano diferente)
-        data_historica = agora.replace(year=ano_alvo)
-        inicio = data_historica - timedelta(days=1)
-        fim = data_historica + timedelta(days=1)
-        
-        url = "https://telemetriaws1.ana.gov.br/ServiceANA.asmx/DadosHidrometeorologicos"
-        params = {
-            "codEstacao": codigo_estacao,
-            "dataInicio": inicio.strftime("%d/%m/%Y"),
-            "dataFim": fim.strftime("%d/%m/%Y"),
-        }
-        
-        # Timeout curto para não travar o robô se a ANA estiver lenta
-        response = requests.get(url, params=params, timeout=10)
-        
-        if response.status_code == 200:
-            root = ET.fromstring(response.content)
-            melhor_diferenca = float('inf')
-            vazao_encontrada = None
-            
-            for dado in root.iter("DadosHidrometereologicos"):
-                vazao = dado.find("Vazao") # <--- Foco na Vazão
-                data_hora = dado.find("DataHora")
-                
-                if vazao is not None and data_hora is not None and vazao.text:
-                    try:
-                        dt_leitura = datetime.strptime(data_hora.text.strip(), "%Y-%m-%d %H:%M:%S")
-                        
-                        # Truque para comparar apenas dia/mês/hora ignorando o ano
-                        dt_ajustada = dt_leitura.replace(year=agora.year, month=agora.month, day=agora.day)
-                        diff = abs((agora - dt_ajustada).total_seconds())
-                        
-                        # Pega a leitura mais próxima do horário atual (ex: 18:00)
-                        if diff < melhor_diferenca:
-                            melhor_diferenca = diff
-                            vazao_encontrada = float(vazao.text)
-                    except: continue
-            
-            if vazao_encontrada is not None:
-                return f"{vazao_encontrada:.0f}" # Retorna sem casas decimais (ex: 1200)
-                
-        return "N/D"
+        estado_sistema.alterar(estado_sistema.CHAVE_SEM_DADOS_MESMA_DATA, marcar, {})
+    except Exception as e:
+        print(f"⚠️ Não deu para anotar a lacuna {chave} ({e}).")
+
+def _buscar_mesma_data_na_ana(codigo_estacao, data_historica, campo, agora):
+    """
+    Um dia de cada lado de `data_historica`, direto da ANA (uma tentativa, prazo curto).
+    O que vier vai para a série `leituras` (a mesma do gravar_recentes) e para a
+    grade. Sem dado (ou com erro), o dia fica anotado como lacuna.
+    """
+    chave = _chave_lacuna(codigo_estacao, data_historica)
+    inicio = data_historica - timedelta(days=1)
+    fim = data_historica + timedelta(days=1)
+    try:
+        leituras = cliente_ana.buscar_leituras(codigo_estacao, inicio, fim, timeout=TIMEOUT_BUSCA_HISTORICO,
+                                               valor_ausente=None, retentar=False,
+                                               max_endpoints=ENDPOINTS_BUSCA_ESTACAO)
+    except Exception:
+        _marcar_lacuna(chave, RETENTAR_ERRO_HORAS)
+        raise
+
+    if leituras:
+        with banco_rio.escrita() as conn_escrita:
+            banco_rio.gravar_leituras(conn_escrita, codigo_estacao, banco_rio.linhas_de_leituras(leituras))
+        conn = banco_rio.conectar()
+        try:
+            arquivo_grade.gravar_serie(banco_rio.ler_serie(conn, codigo_estacao, inicio, fim))
+        except Exception as e:
+            print(f"⚠️ Lacuna da ANA não foi para a grade ({e}).")
+        finally:
+            conn.close()
+
+    valor = _valor_mais_proximo(leituras, campo, agora)
+    if valor is None:
+        _marcar_lacuna(chave, RETENTAR_SEM_DADOS_HORAS)
+    return valor
+
+def buscar_mesma_data(pedidos, agora=None, prazo_segundos=PRAZO_BUSCA_HISTORICO):
+    """
+    Valores na mesma data/hora de hoje em anos anteriores, para vários pedidos
+    (codigo, ano, campo) de uma vez. Retorna {pedido: valor ou None}.
+    Primeiro a grade binária (arquivo_grade); o que faltar nela vai à ANA em
+    paralelo, todos dentro de `prazo_segundos`.
+    Quem estourar o prazo fica None neste ciclo (a busca termina sozinha e grava
+    para o próximo); dia que a ANA já disse não ter fica de fora por RETENTAR_SEM_DADOS_HORAS.
+    """
+    agora = agora or datetime.now()
+    resultados = {pedido: None for pedido in pedidos}
+    faltando = []
+    for pedido in pedidos:
+        codigo, ano, campo = pedido
+        try:
+            resultados[pedido] = arquivo_grade.mesma_data(codigo, agora, [ano], campo).get(ano)
+        except Exception as e:
+            print(f"⚠️ Grade binária indisponível ({e}), buscando na ANA.")
+        if resultados[pedido] is None:
+            faltando.append(pedido)
+
+    lacunas = _lacunas_vigentes()
+    na_ana = {}
+    for codigo, ano, campo in faltando:
+        data_historica = arquivo_grade.no_ano(agora, ano)
+        if _chave_lacuna(codigo, data_historica) not in lacunas:
+            na_ana[(codigo, ano, campo)] = data_historica
+    if not na_ana:
+        return resultados
+
+    executor = ThreadPoolExecutor(max_workers=min(MAX_BUSCAS_SIMULTANEAS, len(na_ana)), thread_name_prefix="mesma-data")
+    futuros = {executor.submit(_buscar_mesma_data_na_ana, pedido[0], data_historica, pedido[2], agora): pedido
+               for pedido, data_historica in na_ana.items()}
+    concluidos, pendentes = wait(futuros, timeout=prazo_segundos)
+    for futuro in concluidos:
+        try:
+            resultados[futuros[futuro]] = futuro.result()
+        except Exception as e:
+            print(f"⚠️ ANA sem a mesma data de {futuros[futuro]}: {e}")
+    if pendentes:
+        print(f"⏱️ {len(pendentes)} busca(s) de anos anteriores passaram de {prazo_segundos}s; ficam para o próximo ciclo.")
+    executor.shutdown(wait=False)
+    return resultados
+
+def buscar_historicos(anos_nivel, anos_vazao, codigo_vazao=None):
+    """
+    Textos do painel "mesma data em anos anteriores": ({ano: nível de Timóteo},
+    {ano: vazão da Guilman}), com "N/D" onde não houver dado. Uma busca só para todos.
+    """
+    codigo_vazao = codigo_vazao or ESTACAO_GUILMAN
+    pedidos = [(ESTACAO_TIMOTEO, ano, 'nivel') for ano in anos_nivel] + [(codigo_vazao, ano, 'vazao') for ano in anos_vazao]
+    try:
+        valores = buscar_mesma_data(pedidos)
     except Exception as e:
-        print(f"Erro histórico vazão ({ano_alvo}): {e}")
-        return "Erro"
+        registrar_log(f"Erro na busca de anos anteriores: {e}", enviar_tg=False)
+        valores = {}
+    niveis = {ano: valores.get((ESTACAO_TIMOTEO, ano, 'nivel')) for ano in anos_nivel}
+    vazoes = {ano: valores.get((codigo_vazao, ano, 'vazao')) for ano in anos_vazao}
+    return ({ano: "N/D" if v is None else v for ano, v in niveis.items()},
+            {ano: "N/D" if v is None else f"{v:.0f}" for ano, v in vazoes.items()})  # vazão sem casas decimais (ex: 1200)
+
+def buscar_nivel_historico(ano_alvo):
+    return buscar_historicos([ano_alvo], [])[0][ano_alvo]
+
+def buscar_vazao_historica(ano_alvo, codigo_estacao):
+    """Busca a VAZÃO na mesma data/hora, mas no ano solicitado (local primeiro, ANA só se faltar)."""
+    return buscar_historicos([], [ano_alvo], codigo_estacao)[1][ano_alvo]
 
 # ==============================================================================
 # LÓGICA DO ROBÔ
 # ==============================================================================
 def buscar_dados_xml(codigo_estacao):
-    # url = "http://telemetriaws1.ana.gov.br/ServiceANA.asmx/DadosHidrometeorologicos" # Link antigo HTTP
-    url = "https://telemetriaws1.ana.gov.br/ServiceANA.asmx/DadosHidrometeorologicos" # Link novo HTTPS (Recomendado)
-    
-    hoje = datetime.now()
-    ontem = hoje - timedelta(days=1)
-    
-    params = {
-        "codEstacao": codigo_estacao,
-        "dataInicio": ontem.strftime("%d/%m/%Y"),
-        "dataFim": hoje.strftime("%d/%m/%Y")
-    }
-
+    """
+    Leituras das últimas 24h da estação, da mais recente para a mais antiga.
+    Só baixa da ANA o que chegou depois da última leitura gravada no rio_doce.db
+    (e leva o que chegou para a grade do arquivo_rio/); se a ANA falhar, o ciclo
+    segue com o que já está guardado.
+    """
+    cadastrada = estacoes.por_codigo(codigo_estacao)
+    cadencia = cadastrada["cadencia_min"] if cadastrada else None
     try:
-        # Adicionei timeout=30 para evitar travamentos
-        response = requests.get(url, params=params, timeout=30)
-        
-        if response.status_code == 200:
-            root = ET.fromstring(response.content)
-            leituras = []
-            
-            for dado in root.iter("DadosHidrometereologicos"):
-                nivel = dado.find("Nivel")
-                vazao = dado.find("Vazao")  # <--- O SEGREDO ESTÁ AQUI
-                data_hora = dado.find("DataHora")
-                
-                if data_hora is not None:
-                    try:
-                        dt = datetime.strptime(data_hora.text.strip(), "%Y-%m-%d %H:%M:%S")
-                        
-                        # Garante que, se vier vazio, usa 0.0
-                        val_nivel = float(nivel.text) if (nivel is not None and nivel.text) else 0.0
-                        val_vazao = float(vazao.text) if (vazao is not None and vazao.text) else 0.0
-                        
-                        leituras.append({
-                            "data": dt,
-                            "nivel": val_nivel,
-                            "vazao": val_vazao # Agora o dicionário tem a chave 'vazao'!
-                        })
-                    except ValueError:
-                        continue
-            
-            leituras.sort(key=lambda x: x['data'], reverse=True)
-            return leituras
-            
+        novas = cliente_ana.atualizar_recentes(codigo_estacao, timeout=TIMEOUT_BUSCA_ESTACAO, cadencia_min=cadencia,
+                                               retentar=False, max_endpoints=ENDPOINTS_BUSCA_ESTACAO)
+        if novas is None:
+            print(f"💤 Estação {codigo_estacao}: próxima leitura ainda não saiu, usando o local.")
+        else:
+            print(f"📥 Estação {codigo_estacao}: {novas} leitura(s) nova(s).")
     except Exception as e:
         registrar_log(f"Erro ao buscar estação {codigo_estacao}: {e}")
+        novas = None
+
+    if novas:
+        try:
+            arquivo_grade.atualizar_do_banco(codigo_estacao)
+        except Exception as e:
+            registrar_log(f"Erro ao atualizar a grade da estação {codigo_estacao}: {e}", enviar_tg=False)
+    return ler_leituras_locais(codigo_estacao)
+
+def ler_leituras_locais(codigo_estacao):
+    """Leituras das últimas 24h como já estão no rio_doce.db (sem ir à ANA)."""
+    try:
+        leituras = cliente_ana.ler_recentes(codigo_estacao, valor_ausente=None)
+    except Exception as e:
+        registrar_log(f"Erro ao ler leituras locais da estação {codigo_estacao}: {e}")
         return []
-    
-    return []
+
+    # Memória recente (velocidade, vazante, gráficos) recebe com "sem leitura"; o resto do monitor, com 0.0
+    memoria_recente.registrar_leituras(codigo_estacao, leituras)
+    for leitura in leituras:
+        for campo in ("nivel", "vazao", "chuva"):
+            if leitura[campo] is None: leitura[campo] = 0.0
+    return leituras
+
+def buscar_estacoes_paralelo(codigos, prazo_segundos=PRAZO_BUSCA_ESTACOES):
+    """
+    Busca várias estações ao mesmo tempo (no máximo MAX_BUSCAS_SIMULTANEAS por vez).
+    Retorna {codigo: leituras}. Estação que falhar ou estourar o prazo volta
+    com o que já está no rio_doce.db: o ciclo fica com dados mais velhos, mas
+    não trava esperando por ela.
+    """
+    resultados = {codigo: [] for codigo in codigos}
+    if not codigos: return resultados
+
+    executor = ThreadPoolExecutor(max_workers=min(len(codigos), MAX_BUSCAS_SIMULTANEAS))
+    futuros = {executor.submit(buscar_dados_xml, codigo): codigo for codigo in codigos}
+    concluidos, pendentes = wait(futuros, timeout=prazo_segundos)
+
+    for futuro in concluidos:
+        codigo = futuros[futuro]
+        try:
+            resultados[codigo] = futuro.result() or []
+        except Exception as e:
+            registrar_log(f"Erro ao buscar estação {codigo}: {e}", enviar_tg=False)
+            resultados[codigo] = ler_leituras_locais(codigo)
+
+    for futuro in pendentes:
+        codigo = futuros[futuro]
+        registrar_log(f"⏱️ Estação {codigo} não respondeu em {prazo_segundos:.0f}s. Seguindo com o armazenamento local.", enviar_tg=False)
+        resultados[codigo] = ler_leituras_locais(codigo)
+
+    # Não espera as threads atrasadas: elas terminam sozinhas pelo timeout do request
+    executor.shutdown(wait=False, cancel_futures=True)
+    return resultados
 
 def salvar_historico_guilman(leitura):
-    """Salva o histórico da Guilman em um CSV separado"""
-    arquivo = "historico_guilman_coletado.csv"
-    arquivo_existe = os.path.exists(arquivo)
-    
+    """Salva o histórico da Guilman em um CSV separado (leitura repetida não entra de novo)"""
     if not leitura: return
 
     try:
-        with open(arquivo, mode='a', newline='') as f:
-            writer = csv.writer(f)
-            if not arquivo_existe:
-                writer.writerow(["Data", "Vazao_m3s", "Nivel_cm"])
-            
-            writer.writerow([
-                leitura['data'].strftime("%Y-%m-%d %H:%M:%S"),
-                leitura.get('vazao', 0.0), # <--- Usa .get() para evitar erro se a chave sumir
-                leitura['nivel']
-            ])
+        csv_coletado.anexar(
+            "historico_guilman_coletado.csv",
+            leitura['data'],
+            leitura.get('vazao', 0.0), # <--- Usa .get() para evitar erro se a chave sumir
+            leitura['nivel'],
+        )
     except Exception as e:
         registrar_log(f"Erro ao salvar Guilman: {e}")
 
-def analisar_velocidade(leituras, janela_horas=1):
-    if len(leituras) < 2: return 0
-    agora = leituras[0]
-    for l in leituras:
-        diff = (agora['data'] - l['data']).total_seconds() / 3600
-        if (janela_horas * 0.8) <= diff <= (janela_horas * 1.2):
-            return agora['nivel'] - l['nivel']
-    return 0
+def taxas_estacoes(codigos):
+    """Taxas (cm/h) de 15 min, 1h, 3h e 6h de cada estação, da memória recente, numa passada só."""
+    horas = max(taxas_rio.JANELAS.values()) / 3600
+    return taxas_rio.taxas_atuais({codigo: memoria_recente.serie(codigo, horas) for codigo in codigos})
+
+def dados_do_grafico(leituras):
+    """
+    Leituras de Timóteo para o gráfico da capa, da mais recente para a mais antiga:
+    as últimas HORAS_GRAFICO horas da memória recente (sem os buracos da ANA).
+    Memória vazia: as leituras do ciclo.
+    """
+    janela = [] if MODO_TESTE else memoria_recente.janela(ESTACAO_TIMOTEO, HORAS_GRAFICO)
+    if not janela:
+        return leituras
+    return [{'data': momento, 'nivel': nivel} for momento, nivel in reversed(janela)]
+
+def _taxa_das_leituras(leituras, janela_segundos):
+    """Taxa (cm/h) da janela, a partir de uma lista de leituras do monitor (None se não der)."""
+    serie = ([datetime_para_epoch(l['data']) for l in leituras], [l['nivel'] for l in leituras])
+    return taxas_rio.taxas_atuais({"serie": serie}, {"janela": janela_segundos})["serie"]["janela"]
 
-def analisar_tendencia(leituras):
+def analisar_tendencia(leituras, codigo=None):
+    """
+    Texto da variação dos últimos 15 min. Com `codigo`, as leituras saem do
+    rio_doce.db com as lacunas em NaN (o taxas_rio descarta); as da lista do
+    ciclo vêm com 0.0 no lugar e puxariam a taxa.
+    """
+    if codigo is not None:
+        try:
+            leituras = cliente_ana.ler_recentes(codigo, valor_ausente=float('nan'))
+        except Exception as e:
+            registrar_log(f"Erro ao ler leituras locais da estação {codigo}: {e}", enviar_tg=False)
     if len(leituras) < 2: return "Estável"
-    diff = leituras[0]['nivel'] - leituras[1]['nivel']
+    # Variação dos últimos 15 min; se faltar leitura, a taxa de 1h proporcional a 15 min
+    taxa = _taxa_das_leituras(leituras, 900)
+    if taxa is None: taxa = _taxa_das_leituras(leituras, 3600)
+    if taxa is None: return "ESTÁVEL"
+    diff = round(taxa * 0.25)
     if diff > 0: return f"SUBINDO (+{diff:.0f}cm)"
     elif diff < 0: return f"BAIXANDO ({diff:.0f}cm)"
     return "ESTÁVEL"
 
-def definir_estrategia_postagem(dados_timoteo, dados_barragem, dados_nova_era):
+def calcular_velocidade_rio(nivel, data_hora, retornar_valor_numerico=False):
     """
-    Define se devemos postar no Instagram e qual o intervalo de segurança.
-    Regra de Ouro: Só dispara ALERTAS se o nível atual for MAIOR que o anterior.
-    Caso contrário, trata como ROTINA (só posta a cada 4h).
+    Velocidade de subida/descida (cm/h) de Timóteo: a taxa de 1h do taxas_rio
+    (ou a de 15 min, se ainda não houver 1h de leituras), sobre a memória recente.
+    Chamar de novo com a mesma leitura dá o mesmo número.
     """
-    if not dados_timoteo:
-        return False, 60, "Sem dados"
-
-    atual = dados_timoteo[0]
-    nivel_atual = atual['nivel']
-    dt_atual = atual['data']
-    
-    # 1. Recupera o Nível Anterior para comparação
-    nivel_anterior = nivel_atual 
-    if len(dados_timoteo) > 1:
-        nivel_anterior = dados_timoteo[1]['nivel']
+    try:
+        memoria_recente.registrar(ESTACAO_TIMOTEO, data_hora, nivel=nivel)
+        velocidade = taxas_rio.taxa_principal(taxas_estacoes([ESTACAO_TIMOTEO])[ESTACAO_TIMOTEO])
+    except Exception as e:
+        registrar_log(f"Erro cálculo velocidade: {e}", enviar_tg=False)
+        if retornar_valor_numerico: return 0.0
+        return "(Erro Calc)"
 
-    # Calcula velocidade (agora pedindo o valor numérico corretamente)
-    velocidade = calcular_velocidade_rio(nivel_atual, dt_atual, retornar_valor_numerico=True)
+    # Sem leituras suficientes, não dá para calcular velocidade
+    if velocidade is None:
+        if retornar_valor_numerico: return 0.0
+        return "(Calculando...)"
 
-    # --- [A TRAVA DE SEGURANÇA] ---
-    # Só consideramos "Alerta" se o rio realmente subiu nesta leitura.
-    # Se for igual (estável) ou menor (baixando), ignoramos a velocidade calculada.
-    realmente_subiu = (nivel_atual > nivel_anterior)
-
-    # 2. CENÁRIO DE EMERGÊNCIA (> Cota de Alerta)
-    if nivel_atual >= LIMITE_ALERTA:
-        if realmente_subiu:
-            return True, 20, f"🚨 EMERGÊNCIA (Subindo: {nivel_atual}cm)"
-        # Se estiver na emergência mas parou de subir, cai para a Rotina (aguarda intervalo maior)
-
-    # 3. CENÁRIO DE SUBIDA RÁPIDA (> 10 cm/h)
-    if velocidade >= VELOCIDADE_ALERTA: 
-        if realmente_subiu:
-            intervalo = 30 
-            if velocidade >= VELOCIDADE_PANICO: intervalo = 15
-            return True, intervalo, f"🚀 SUBIDA RÁPIDA (+{velocidade:.1f} cm/h)"
-        # Se a velocidade média é alta, mas agora travou, cai para a Rotina
-
-    # 4. CENÁRIO DE SUBIDA GRADUAL (> 2 cm/h)
-    if velocidade > 2:
-        if realmente_subiu:
-            return True, 60, "📈 Subida Gradual"
-        # Se parou de subir, cai para a Rotina
-
-    # 5. CENÁRIO DE ROTINA (O "Padrão")
-    # Retorna True, mas o 'job' principal só vai postar se tiver passado 4 horas (240 min) da última postagem.
-    return True, 240, "ROTINA (Estável/Baixando)"
-
-def calcular_velocidade_rio(nivel_atual, data_atual):
-    historico = []
-    if os.path.exists(ARQUIVO_HISTORICO_RECENTE):
-        try:
-            with open(ARQUIVO_HISTORICO_RECENTE, "r") as f: historico = json.load(f)
-        except: pass
+    if retornar_valor_numerico:
+        return velocidade
 
-    historico.append({"data": data_atual.strftime("%Y-%m-%d %H:%M:%S"), "nivel": nivel_atual})
-    agora = data_atual
-    historico_limpo = []
-    leitura_referencia = None
+    # Formatação do Texto
+    seta = "⬆️" if velocidade > 0 else "⬇️"
+    if abs(velocidade) < 1: seta = "➡️"
     
-    for item in historico:
-        item_data = datetime.strptime(item["data"], "%Y-%m-%d %H:%M:%S")
-        diferenca_horas = (agora - item_data).total_seconds() / 3600
-        if diferenca_horas <= 3:
-            historico_limpo.append(item)
-        if 0.8 <= diferenca_horas <= 1.5:
-            leitura_referencia = item
-
-    with open(ARQUIVO_HISTORICO_RECENTE, "w") as f:
-        json.dump(historico_limpo, f)
-
-    if leitura_referencia:
-        nivel_antigo = leitura_referencia["nivel"]
-        delta_nivel = nivel_atual - nivel_antigo
-        if delta_nivel > 0: return f"+{delta_nivel:.0f} cm/h"
-        elif delta_nivel < 0: return f"{delta_nivel:.0f} cm/h"
-        else: return "Estável"
-    else:
-        if len(historico_limpo) >= 2:
-            ultimo = historico_limpo[-2] 
-            delta = nivel_atual - ultimo["nivel"]
-            return f"Var. Recente: {delta:+.0f} cm"
-        return "Calculando..."
+    return f"({seta} {abs(velocidade):.1f} cm/h)"
 
 def verificar_modo_vazante(nivel_atual):
+    """Vazante: as 3 últimas leituras de Timóteo em queda (A > B > C)."""
     if nivel_atual < 400: return False
     try:
-        with open(ARQUIVO_HISTORICO_RECENTE, "r") as f: historico = json.load(f)
-        if len(historico) < 3: return False
-        ultimos = historico[-3:] 
-        niveis = [item['nivel'] for item in ultimos]
+        niveis = memoria_recente.ultimos(ESTACAO_TIMOTEO, 3)
+        if len(niveis) < 3: return False
         if niveis[0] > niveis[1] > niveis[2]: return True
         return False
     except: return False
@@ -463,75 +483,11 @@ def verificar_modo_vazante(nivel_atual):
 # FUNÇÕES DE CÁLCULO E ESTRATÉGIA (Cole ACIMA do job)
 # ==============================================================================
 
-def calcular_velocidade_rio(nivel, data_hora, retornar_valor_numerico=False):
-    """
-    Calcula a velocidade de subida/descida baseada na última leitura salva.
-    Usa um arquivo JSON auxiliar para persistir o último dado mesmo se reiniciar.
-    """
-    arquivo_memoria = "historico_velocidade.json"
-    
-    # Tenta carregar a leitura anterior
-    leitura_anterior = None
-    if os.path.exists(arquivo_memoria):
-        try:
-            with open(arquivo_memoria, "r") as f:
-                leitura_anterior = json.load(f)
-        except:
-            pass
-
-    # Salva a leitura ATUAL para a próxima vez
-    # Convertemos data para string para salvar no JSON
-    novo_estado = {
-        "nivel": nivel,
-        "data": data_hora.strftime("%Y-%m-%d %H:%M:%S")
-    }
-    try:
-        with open(arquivo_memoria, "w") as f:
-            json.dump(novo_estado, f)
-    except Exception as e:
-        registrar_log(f"Erro ao salvar memória velocidade: {e}", enviar_tg=False)
-
-    # Se não tem histórico anterior, não dá para calcular velocidade
-    if not leitura_anterior:
-        if retornar_valor_numerico: return 0.0
-        return "(Calculando...)"
-
-    # CÁLCULO DA VELOCIDADE
-    try:
-        nivel_ant = float(leitura_anterior['nivel'])
-        data_ant = datetime.strptime(leitura_anterior['data'], "%Y-%m-%d %H:%M:%S")
-        
-        # Diferença de Tempo em Horas
-        diff_horas = (data_hora - data_ant).total_seconds() / 3600
-        
-        # Evita divisão por zero ou tempo muito curto (< 10 min)
-        if diff_horas < 0.16: 
-            if retornar_valor_numerico: return 0.0
-            return "(Aguarda...)"
-
-        delta_h = nivel - nivel_ant
-        velocidade = delta_h / diff_horas # cm/h
-        
-        # --- [CORREÇÃO] O CÓDIGO QUE FALTAVA ---
-        if retornar_valor_numerico:
-            return velocidade
-        # ---------------------------------------
-
-        # Formatação do Texto (Comportamento antigo)
-        seta = "⬆️" if velocidade > 0 else "⬇️"
-        if abs(velocidade) < 1: seta = "➡️"
-        
-        return f"({seta} {abs(velocidade):.1f} cm/h)"
-
-    except Exception as e:
-        registrar_log(f"Erro cálculo velocidade: {e}", enviar_tg=False)
-        if retornar_valor_numerico: return 0.0
-        return "(Erro Calc)"
-
 def definir_estrategia_postagem(dados_timoteo, dados_barragem, dados_nova_era):
     """
     Define se devemos postar no Instagram e qual o intervalo de segurança.
     Retorna: (deve_postar: bool, intervalo_minutos: int, motivo: str)
+    As regras estão no estrategia_postagem.py (as mesmas que o backtest_postagem.py repassa).
     """
     if not dados_timoteo:
         return False, 60, "Sem dados"
@@ -545,41 +501,15 @@ def definir_estrategia_postagem(dados_timoteo, dados_barragem, dados_nova_era):
     if len(dados_timoteo) > 1:
         nivel_anterior = dados_timoteo[1]['nivel']
 
-    # Chama a função acima pedindo o NÚMERO (agora vai funcionar!)
     velocidade = calcular_velocidade_rio(nivel_atual, dt_atual, retornar_valor_numerico=True)
-
-    # 1. CENÁRIO DE EMERGÊNCIA (> 600cm)
-    if nivel_atual >= LIMITE_ALERTA:
-        if velocidade > 0:
-            return True, 20, f"EMERGÊNCIA (Nível {nivel_atual})"
-        else:
-            return True, 60, "Nível Alto (Estável/Descendo)"
-
-    # 2. CENÁRIO DE SUBIDA RÁPIDA (> 10 cm/h)
-    if velocidade >= VELOCIDADE_ALERTA: 
-        # Trava: Só posta se o nível realmente subiu em relação à última leitura
-        if nivel_atual <= nivel_anterior:
-             return False, 30, f"Subida Rápida ({velocidade:.1f}cm/h), mas nível estagnou agora."
-
-        intervalo = 30 
-        if velocidade >= VELOCIDADE_PANICO: # > 30 cm/h
-            intervalo = 15
-            
-        return True, intervalo, f"SUBIDA RÁPIDA (+{velocidade:.1f} cm/h)"
-
-    # 3. CENÁRIO DE SUBIDA LENTA (> 2 cm/h)
-    if velocidade > 2:
-        return True, 60, "Subida Gradual"
-
-    # 4. CENÁRIO DE ROTINA
-    return True, 240, "ROTINA (Estável/Baixando)"
+    return estrategia_postagem.decidir(nivel_atual, nivel_anterior, velocidade)
 
 # ==============================================================================
 # JOB PRINCIPAL
 # ==============================================================================
 
 def job():
-    global ULTIMA_DATA_ANA, ULTIMA_POSTAGEM
+    global ULTIMA_POSTAGEM
     registrar_log("--- Iniciando Varredura ---", enviar_tg=False)
     
     # 1. INICIALIZAÇÃO SEGURA DE VARIÁVEIS
@@ -597,27 +527,27 @@ def job():
         d_barragem = [{'data': datetime.now(), 'nivel': 200.0}, {'data': datetime.now(), 'nivel': 200.0}]
         d_nova_era = [{'data': datetime.now(), 'nivel': 150.0}, {'data': datetime.now(), 'nivel': 150.0}]
         d_guilman = [{'data': datetime.now(), 'nivel': 0, 'vazao': 1300}] # Mock para teste
-        ULTIMA_DATA_ANA = None 
     else:
-        d_timoteo = buscar_dados_xml(ESTACAO_TIMOTEO)
-        d_barragem = buscar_dados_xml(ESTACAO_BARRAGEM)
-        d_nova_era = buscar_dados_xml(ESTACAO_NOVA_ERA)
-        # --- [MODIFICAÇÃO 2] Busca Guilman ---
-        d_guilman = buscar_dados_xml(ESTACAO_GUILMAN)
+        # Busca todas as estações ativas do cadastro em paralelo, com prazo por ciclo.
+        # As que a lógica ainda não usa ficam guardadas no rio_doce.db.
+        codigos = estacoes.codigos_ativos()
+        for codigo in (ESTACAO_TIMOTEO, ESTACAO_BARRAGEM, ESTACAO_NOVA_ERA, ESTACAO_GUILMAN):
+            if codigo not in codigos: codigos.append(codigo)
+        dados = buscar_estacoes_paralelo(codigos)
+        d_timoteo = dados[ESTACAO_TIMOTEO]
+        d_barragem = dados[ESTACAO_BARRAGEM]
+        d_nova_era = dados[ESTACAO_NOVA_ERA]
+        d_guilman = dados[ESTACAO_GUILMAN]
     
     if not d_timoteo: 
         registrar_log("❌ Varredura cancelada: Sem dados de Timóteo.")
         return
 
     atual_t = d_timoteo[0]
-    tendencia = analisar_tendencia(d_timoteo)
+    tendencia = analisar_tendencia(d_timoteo, None if MODO_TESTE else ESTACAO_TIMOTEO)
 
-    if atual_t:
-        try:
-            salvar_leitura_no_banco(atual_t['data'], atual_t['nivel'])
-            print(f"✅ Leitura de {atual_t['nivel']}cm salva no banco local.")
-        except Exception as e:
-            registrar_log(f"⚠️ Erro ao salvar no banco (o robô continuará): {e}")
+    # Todas as leituras de todas as estações já foram gravadas na busca
+    # (banco_rio.gravar_recentes, uma transação por estação na conexão de escrita).
     
     # --- [MODIFICAÇÃO 3] Processa e Salva Guilman ---
     if d_guilman:
@@ -631,7 +561,9 @@ def job():
         icone_g = "🌊"
         if vazao_g >= ALERTA_VAZAO_VERMELHO:
             icone_g = "🚨 PERIGO"
-            msg_ia_longa += f"⚠️ *URGENTE:* Vazão Guilman CRÍTICA ({vazao_g:.0f} m³/s). Água chega em ~8h!\n"
+            atraso_g = calibracao_montante.parametros(ESTACAO_GUILMAN, vazao_g)["atraso_horas"]
+            chegada = f" Água chega em ~{atraso_g:.0f}h!" if atraso_g is not None else ""
+            msg_ia_longa += f"⚠️ *URGENTE:* Vazão Guilman CRÍTICA ({vazao_g:.0f} m³/s).{chegada}\n"
         elif vazao_g >= ALERTA_VAZAO_AMARELO:
             icone_g = "⚠️ Atenção"
             msg_ia_longa += f"🔸 *Alerta:* Guilman aumentou vazão ({vazao_g:.0f} m³/s).\n"
@@ -641,9 +573,7 @@ def job():
         msg_guilman_tg = "Guilman: Sem dados"
 
 
-    if MODO_TESTE or (ULTIMA_DATA_ANA != atual_t['data']):
-        salvar_csv(atual_t['data'], atual_t['nivel'], tendencia, "Timoteo")
-        ULTIMA_DATA_ANA = atual_t['data']
+    salvar_csv(atual_t['data'], atual_t['nivel'], tendencia, "Timoteo")
 
     # Você pode passar d_guilman aqui no futuro para melhorar a estratégia
     deve_postar, intervalo_min, motivo = definir_estrategia_postagem(d_timoteo, d_barragem, d_nova_era)
@@ -651,36 +581,44 @@ def job():
     # -------------------------------------------------------------
     # 2. BUSCA HISTÓRICA (NÍVEL TIMÓTEO + VAZÃO GUILMAN)
     # -------------------------------------------------------------
-    historico_anos = {}
-    for ano in [2020, 2021, 2022, 2023, 2024, 2025]:
-        val = buscar_nivel_historico(ano)
-        historico_anos[ano] = val
-    
+    # Todos os anos das duas estações numa busca só, com prazo (ver buscar_mesma_data)
+    historico_anos, historico_vazao_guilman = buscar_historicos([2020, 2021, 2022, 2023, 2024, 2025],
+                                                                [2020, 2022, 2024, 2025])
+
     velocidade_texto = calcular_velocidade_rio(atual_t['nivel'], atual_t['data'])
+    taxas = taxas_estacoes([ESTACAO_TIMOTEO, ESTACAO_NOVA_ERA])
     em_recessao = verificar_modo_vazante(atual_t['nivel'])
     risco = calcular_risco_por_rua(atual_t['nivel'])
     
     if em_recessao: registrar_log("MODO VAZANTE DETECTADO! 📉", enviar_tg=False)
 
-    historico_vazao_guilman = {}
-    for ano in [2020, 2022, 2024, 2025]: 
-        val_vazao = buscar_vazao_historica(ano, ESTACAO_GUILMAN)
-        historico_vazao_guilman[ano] = val_vazao
-
     # -------------------------------------------------------------
     # 3. CÉREBRO IA 
     # -------------------------------------------------------------
     # (Seu código de IA continua igual aqui...)
     try:
         if d_timoteo and len(d_timoteo) >= 4:
-            prev_curta, vel_ia = cerebro_ia.prever_proxima_hora(d_timoteo[:6])
+            prev_curta, vel_ia = cerebro_ia.prever_proxima_hora(d_timoteo, codigo=ESTACAO_TIMOTEO)
             if prev_curta:
                 nivel_futuro = prev_curta 
                 previsao_ia_texto = f"Prev. +1h: {prev_curta:.0f} cm"
                 msg_ia_longa += f"🔮 Previsão Imediata (+1h): *{prev_curta:.0f} cm* ({vel_ia})\n"
+            previsoes = cerebro_ia.prever_horizontes(d_timoteo, codigo=ESTACAO_TIMOTEO)
+            if previsoes:
+                msg_ia_longa += f"📈 Previsões (faixa 90%): {previsao_rio.formatar(previsoes)}\n"
     except Exception as e:
         registrar_log(f"Erro IA Curta: {e}", enviar_tg=False)
 
+    # Subindo: "está parecido com qual cheia?" (busca no arquivo_rio/)
+    try:
+        subida = taxas_rio.taxa_principal(taxas[ESTACAO_TIMOTEO])
+        if subida is not None and subida >= SUBIDA_CHEIAS_PARECIDAS:
+            analogos = cheias_parecidas.buscar()
+            if analogos:
+                msg_ia_longa += f"📚 Cheias parecidas (últimas {cheias_parecidas.HORAS_PADRAO}h):\n{cheias_parecidas.formatar(analogos)}\n"
+    except Exception as e:
+        registrar_log(f"Erro Cheias Parecidas: {e}", enviar_tg=False)
+
     # (Seu código de IA Nova Era continua igual aqui...)
     
     # -------------------------------------------------------------
@@ -713,6 +651,8 @@ def job():
             msg_tg += f"\n{texto_clima}\n"    
             
         msg_tg += f"Tendência: {tendencia} {velocidade_texto}\n"
+        msg_tg += f"Taxas Timóteo: {taxas_rio.formatar(taxas[ESTACAO_TIMOTEO])}\n"
+        if d_nova_era: msg_tg += f"Taxas Nova Era: {taxas_rio.formatar(taxas[ESTACAO_NOVA_ERA])}\n"
         # ... (O resto do Telegram continua igual)
         
         # ... (Continuação do código original: Histórico, Ruas, Envio...)
@@ -758,13 +698,13 @@ def job():
         motivo = "DESATIVADO MANUALMENTE"
     
     if deve_postar and not MODO_TESTE:
-         if "ROTINA" in motivo:
-              if ULTIMA_POSTAGEM and (datetime.now() - ULTIMA_POSTAGEM).total_seconds() < 3600: deve_postar = False
-         elif ULTIMA_POSTAGEM:
+         tempo_passado = None
+         if ULTIMA_POSTAGEM:
             tempo_passado = (datetime.now() - ULTIMA_POSTAGEM).total_seconds() / 60
-            if tempo_passado < intervalo_min:
+         if not estrategia_postagem.liberar(intervalo_min, tempo_passado):
+            if "ROTINA" not in motivo:
                 registrar_log(f"Aguardando intervalo IG ({tempo_passado:.0f}/{intervalo_min} min).", enviar_tg=False)
-                deve_postar = False
+            deve_postar = False
     
     if deve_postar:
         # ... (Resto do código de postagem)
@@ -792,7 +732,7 @@ def job():
                 velocidade_texto,
                 em_recessao,
                 texto_previsao=txt_previsao_imagem,
-                dados_grafico=d_timoteo 
+                dados_grafico=dados_do_grafico(d_timoteo)
             )
             caminhos_abs = [str(Path(p).resolve()) for p in caminhos]
         except Exception as e:
@@ -822,48 +762,3 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         registrar_log("Encerrado.")
 
-        import sqlite3
-
-def salvar_leitura_no_banco(data_hora, nivel):
-    """Guarda a leitura atual no banco local para consultas futuras"""
-    try:
-        conn = sqlite3.connect("rio_doce.db")
-        cursor = conn.cursor()
-        # Converte a data para string para o SQLite
-        dt_str = data_hora.strftime("%Y-%m-%d %H:%M:%S")
-        cursor.execute("INSERT OR IGNORE INTO historico (data_hora, nivel) VALUES (?, ?)", (dt_str, nivel))
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Erro ao salvar no banco: {e}")
-
-def buscar_historico_local(dia, mes):
-    """Busca o nível médio do rio para o dia/mês em cada ano no banco SQLite"""
-    resultados = {}
-    try:
-        # Garante que o caminho para o banco está correto
-        caminho_banco = os.path.join(os.path.dirname(__file__), "rio_doce.db")
-        conn = sqlite3.connect(caminho_banco)
-        cursor = conn.cursor()
-        
-        # Query para pegar a média do nível naquele dia específico de cada ano
-        query = """
-            SELECT strftime('%Y', data_hora) as ano, AVG(nivel) 
-            FROM historico 
-            WHERE strftime('%d', data_hora) = ? 
-              AND strftime('%m', data_hora) = ?
-            GROUP BY ano
-            ORDER BY ano ASC
-        """
-        # Passa dia e mês com dois dígitos (ex: 01, 02...)
-        cursor.execute(query, (f"{dia:02d}", f"{mes:02d}"))
-        
-        for ano, nivel in cursor.fetchall():
-            # Retorna apenas os anos que temos dados (2019 a 2025)
-            resultados[int(ano)] = round(nivel, 0)
-            
-        conn.close()
-    except Exception as e:
-        print(f"Erro ao consultar histórico local: {e}")
-        
-    return resultados
\ No newline at end of file
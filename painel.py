@@ -23,12 +23,10 @@ st.markdown("---")
 # Função para carregar dados (com Cache para não travar a ANA)
 @st.cache_data(ttl=300) # Guarda os dados por 5 minutos (300s)
 def carregar_dados():
-    # Busca Timóteo
-    d_timoteo = monitor.buscar_dados_xml(monitor.ESTACAO_TIMOTEO)
-    # Busca Nova Era (para a IA)
-    d_nova_era = monitor.buscar_dados_xml(monitor.ESTACAO_NOVA_ERA)
+    # Busca Timóteo e Nova Era (para a IA) ao mesmo tempo
+    dados = monitor.buscar_estacoes_paralelo([monitor.ESTACAO_TIMOTEO, monitor.ESTACAO_NOVA_ERA])
     
-    return d_timoteo, d_nova_era
+    return dados[monitor.ESTACAO_TIMOTEO], dados[monitor.ESTACAO_NOVA_ERA]
 
 # Botão de Atualizar Manual
 if st.button('🔄 Atualizar Dados Agora'):
@@ -50,14 +48,14 @@ nivel_cm = atual['nivel']
 data_leitura = atual['data']
 
 # Cálculos Auxiliares
-tendencia = monitor.analisar_tendencia(d_timoteo)
+tendencia = monitor.analisar_tendencia(d_timoteo, monitor.ESTACAO_TIMOTEO)
 velocidade = monitor.calcular_velocidade_rio(nivel_cm, data_leitura)
 
 # IA Previsão
 texto_ia = "Calculando..."
 delta_ia = None
 if len(d_timoteo) >= 5:
-    prev, vel_ia = cerebro_ia.prever_proxima_hora(d_timoteo[:6])
+    prev, vel_ia = cerebro_ia.prever_proxima_hora(d_timoteo, codigo=monitor.ESTACAO_TIMOTEO)
     if prev:
         texto_ia = f"{prev:.0f} cm"
         delta_ia = prev - nivel_cm
@@ -30,8 +30,9 @@ def executar_postagem_manual():
         d_timoteo = [{'data': datetime.now(), 'nivel': 800.0}, {'data': datetime.now(), 'nivel': 790.0}, {'data': datetime.now(), 'nivel': 780.0}]
         d_nova_era = [{'data': datetime.now(), 'nivel': 200.0}, {'data': datetime.now(), 'nivel': 200.0}] # Dados Fakes
     else:
-        d_timoteo = monitor.buscar_dados_xml(monitor.ESTACAO_TIMOTEO)
-        d_nova_era = monitor.buscar_dados_xml(monitor.ESTACAO_NOVA_ERA) # <--- LINHA QUE FALTAVA
+        dados = monitor.buscar_estacoes_paralelo([monitor.ESTACAO_TIMOTEO, monitor.ESTACAO_NOVA_ERA])
+        d_timoteo = dados[monitor.ESTACAO_TIMOTEO]
+        d_nova_era = dados[monitor.ESTACAO_NOVA_ERA]
     # ---------------------
     
     if not d_timoteo:
@@ -39,16 +40,14 @@ def executar_postagem_manual():
         return
 
     atual_t = d_timoteo[0]
-    tendencia = monitor.analisar_tendencia(d_timoteo)
+    tendencia = monitor.analisar_tendencia(d_timoteo, None if monitor.MODO_TESTE else monitor.ESTACAO_TIMOTEO)
     
     print(f"✅ Dados obtidos: {atual_t['nivel']}cm | {tendencia}")
 
     # 2. BUSCAR HISTÓRICO (2020-2025)
     print("⏳ Buscando histórico comparativo...")
-    historico_anos = {}
-    for ano in [2020, 2021, 2022, 2023, 2024, 2025]:
-        val = monitor.buscar_nivel_historico(ano)
-        historico_anos[ano] = val
+    historico_anos, _ = monitor.buscar_historicos([2020, 2021, 2022, 2023, 2024, 2025], [])
+    for ano, val in historico_anos.items():
         print(f"   -> {ano}: {val}")
 
     # 3. CALCULAR DADOS COMPLEMENTARES
@@ -61,7 +60,7 @@ def executar_postagem_manual():
     try:
         # Curto Prazo
         if d_timoteo and len(d_timoteo) >= 4:
-            val, _ = cerebro_ia.prever_proxima_hora(d_timoteo[:6])
+            val, _ = cerebro_ia.prever_proxima_hora(d_timoteo, codigo=monitor.ESTACAO_TIMOTEO)
             if val:
                 txt_previsao_imagem = f"Prev. +1h: {val:.0f} cm"
                 print(f"🔮 IA Curta: {txt_previsao_imagem}")
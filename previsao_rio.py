@@ -0,0 +1,145 @@
+"""
+PREVISÃO DE NÍVEL (+1h, +3h, +6h) SEM SCIKIT-LEARN
+Tendência amortecida de Holt: a cada leitura nova o estado da estação (nível
+suavizado, tendência em cm/h e variância do erro de 15 min) é atualizado com
+algumas contas, sem refazer regressão nem guardar a série. Leitura repetida
+é ignorada, então passar a lista das últimas 24h a cada ciclo só custa as novas.
+A faixa de confiança vem do erro das previsões de 15 min já feitas, aberta
+conforme o horizonte. Comparação com o modelo antigo: Testes/benchmark_previsao.py
+"""
+import math
+import threading
+
+from serie_estacao import datetime_para_epoch
+
+PASSO_HORAS = 0.25      # cadência de referência (15 min)
+# Pesos ajustados em Timóteo 2019–2022 e avaliados em 2023–2025 (Testes/benchmark_previsao.py)
+ALFA = 0.7              # peso da leitura nova no nível (por passo de 15 min)
+BETA = 0.7              # peso da variação nova na tendência (por passo)
+AMORTECIMENTO = 0.7     # quanto da tendência sobra depois de 1h de previsão
+PESO_VARIANCIA = 0.05   # média móvel exponencial do erro ao quadrado
+Z_FAIXA = 1.64          # faixa de ~90%
+MAX_LACUNA_HORAS = 6    # sem leitura por mais que isso, o estado recomeça
+HORIZONTES = (1, 3, 6)
+
+_previsores = {}
+_trava = threading.Lock()
+
+# ==============================================================================
+# MODELO
+# ==============================================================================
+def _por_passo(coeficiente, passos):
+    """Coeficiente de 15 min ajustado para um intervalo de `passos` passos."""
+    return 1 - (1 - coeficiente) ** passos
+
+def _soma_amortecida(horas, amortecimento=AMORTECIMENTO):
+    """Quanto da tendência (cm/h) vira variação de nível em `horas`, com amortecimento."""
+    fator = amortecimento ** PASSO_HORAS
+    passos = horas / PASSO_HORAS
+    if fator >= 1:
+        return horas
+    return PASSO_HORAS * fator * (1 - fator ** passos) / (1 - fator)
+
+class PrevisorTendencia:
+    """
+    Estado de Holt de uma estação. `atualizar` e `prever` são O(1).
+    Os pesos só mudam do padrão no ajuste (Testes/benchmark_previsao.py).
+    """
+    __slots__ = ("epoch", "nivel", "tendencia", "variancia", "leituras", "alfa", "beta", "amortecimento")
+
+    def __init__(self, alfa=ALFA, beta=BETA, amortecimento=AMORTECIMENTO):
+        self.alfa, self.beta, self.amortecimento = alfa, beta, amortecimento
+        self.epoch = None
+        self.nivel = None
+        self.tendencia = 0.0
+        self.variancia = None
+        self.leituras = 0
+
+    def atualizar(self, epoch, nivel):
+        """Incorpora uma leitura. Ignora vazia, repetida ou mais antiga que a última. Retorna True se usou."""
+        if nivel is None or nivel != nivel:
+            return False
+        if self.epoch is not None and epoch <= self.epoch:
+            return False
+        if self.epoch is None or (epoch - self.epoch) / 3600 > MAX_LACUNA_HORAS:
+            self.epoch, self.nivel, self.tendencia, self.variancia, self.leituras = epoch, nivel, 0.0, None, 1
+            return True
+
+        horas = (epoch - self.epoch) / 3600
+        passos = horas / PASSO_HORAS
+        if self.leituras == 1:
+            # Segunda leitura: a tendência começa na variação entre as duas
+            self.tendencia = (nivel - self.nivel) / horas
+            self.epoch, self.nivel, self.leituras = epoch, nivel, 2
+            return True
+
+        previsto = self.nivel + self.tendencia * _soma_amortecida(horas, self.amortecimento)
+        erro = nivel - previsto
+        erro_por_passo = erro * erro / passos
+        self.variancia = erro_por_passo if self.variancia is None else \
+            (1 - PESO_VARIANCIA) * self.variancia + PESO_VARIANCIA * erro_por_passo
+
+        alfa, beta = _por_passo(self.alfa, passos), _por_passo(self.beta, passos)
+        novo_nivel = previsto + alfa * erro
+        tendencia_amortecida = self.tendencia * self.amortecimento ** horas
+        self.tendencia = beta * (novo_nivel - self.nivel) / horas + (1 - beta) * tendencia_amortecida
+        self.epoch, self.nivel = epoch, novo_nivel
+        self.leituras += 1
+        return True
+
+    def prever(self, horas):
+        """(valor, inferior, superior) daqui a `horas` da última leitura; faixa None enquanto não há erro medido."""
+        if self.nivel is None:
+            return None, None, None
+        valor = self.nivel + self.tendencia * _soma_amortecida(horas, self.amortecimento)
+        if self.variancia is None:
+            return valor, None, None
+        # Variância do erro de Holt em k passos: s² [1 + soma (α + αβj)², j = 1..k-1]
+        k = max(1.0, horas / PASSO_HORAS)
+        m = k - 1
+        alfa, beta = self.alfa, self.beta
+        soma = alfa ** 2 * (m + beta * m * k + beta ** 2 * m * k * (2 * k - 1) / 6)
+        desvio = math.sqrt(self.variancia * (1 + soma))
+        return valor, valor - Z_FAIXA * desvio, valor + Z_FAIXA * desvio
+
+# ==============================================================================
+# ESTADO POR ESTAÇÃO
+# ==============================================================================
+def previsor(codigo):
+    with _trava:
+        if codigo not in _previsores:
+            _previsores[codigo] = PrevisorTendencia()
+        return _previsores[codigo]
+
+def atualizar_leituras(codigo, leituras):
+    """Leva ao previsor da estação as leituras novas (formato do monitor, qualquer ordem)."""
+    atual = previsor(codigo)
+    with _trava:
+        _incorporar(atual, leituras)
+    return atual
+
+def de_leituras(leituras):
+    """Previsor novo, só com as leituras passadas (sem guardar estado)."""
+    atual = PrevisorTendencia()
+    _incorporar(atual, leituras)
+    return atual
+
+def _incorporar(atual, leituras):
+    for leitura in sorted(leituras, key=lambda l: l["data"]):
+        nivel = leitura["nivel"]
+        if nivel:  # no formato do monitor, 0.0 é "sem leitura"
+            atual.atualizar(datetime_para_epoch(leitura["data"]), nivel)
+
+def prever(atual, horizontes=HORIZONTES):
+    """{horas: (valor, inferior, superior)} para cada horizonte; {} sem leituras suficientes."""
+    if atual.leituras < 3:
+        return {}
+    return {h: atual.prever(h) for h in horizontes}
+
+def formatar(previsoes):
+    """'+1h 512 (505–519) | +3h 530 (510–550) | +6h ...'"""
+    partes = []
+    for horas, (valor, inferior, superior) in previsoes.items():
+        faixa = f" ({inferior:.0f}–{superior:.0f})" if inferior is not None else ""
+        partes.append(f"+{horas}h {valor:.0f}{faixa}")
+    return " | ".join(partes) + " cm"
@@ -0,0 +1,119 @@
+"""
+REGISTRO (LOG) EM SEGUNDO PLANO
+registrar() só coloca a mensagem em filas e volta na hora; duas threads fazem
+o trabalho lento:
+  - arquivo: grava no sistema.log (com rotação por tamanho) via QueueListener
+  - Telegram: junta as mensagens que chegam numa janela curta e manda uma só,
+    respeitando um intervalo mínimo entre envios
+Assim um ciclo cheio de erros da ANA não fica parado esperando o Telegram.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from telegram_bot import enviar_telegram
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+ARQUIVO_LOG = os.path.join(DIRETORIO, "sistema.log")
+
+TAMANHO_MAXIMO_LOG = 5 * 1024 * 1024  # bytes; ao passar, vira sistema.log.1, .2, ...
+COPIAS_LOG = 5
+
+JANELA_TELEGRAM = 10             # segundos juntando linhas antes de mandar
+INTERVALO_MINIMO_TELEGRAM = 30   # segundos entre duas mensagens de log
+LIMITE_CARACTERES_TELEGRAM = 3500  # o Telegram aceita até 4096 por mensagem
+
+_logger = logging.getLogger("alerta_enchente")
+_fila_telegram = queue.Queue()
+_ouvinte = None
+_thread_telegram = None
+_trava = threading.Lock()
+
+# ==============================================================================
+# INÍCIO / FIM
+# ==============================================================================
+def _iniciar():
+    global _ouvinte, _thread_telegram
+    with _trava:
+        if _ouvinte is not None:
+            return
+        arquivo = RotatingFileHandler(ARQUIVO_LOG, maxBytes=TAMANHO_MAXIMO_LOG, backupCount=COPIAS_LOG, encoding="utf-8")
+        arquivo.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S"))
+        fila_arquivo = queue.Queue()
+        _logger.handlers.clear()  # religado depois de um encerrar(): não duplica as linhas
+        _logger.addHandler(QueueHandler(fila_arquivo))
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+        _ouvinte = QueueListener(fila_arquivo, arquivo)
+        _ouvinte.start()
+
+        _thread_telegram = threading.Thread(target=_laco_telegram, name="log-telegram", daemon=True)
+        _thread_telegram.start()
+        atexit.register(encerrar)
+
+def encerrar(espera=15):
+    """Esvazia as filas: grava o que falta no arquivo e manda o último lote do Telegram."""
+    global _ouvinte
+    with _trava:
+        if _ouvinte is None:
+            return
+        _fila_telegram.put(None)
+        _thread_telegram.join(timeout=espera)
+        _ouvinte.stop()
+        _ouvinte = None
+
+# ==============================================================================
+# REGISTRO
+# ==============================================================================
+def registrar(mensagem, texto_telegram=None):
+    """Grava `mensagem` no sistema.log e, se vier `texto_telegram`, agenda para o próximo lote."""
+    if _ouvinte is None:
+        _iniciar()
+    _logger.info(mensagem)
+    if texto_telegram:
+        _fila_telegram.put(texto_telegram)
+
+# ==============================================================================
+# TELEGRAM EM LOTES
+# ==============================================================================
+def _laco_telegram():
+    ultimo_envio = -INTERVALO_MINIMO_TELEGRAM
+    encerrando = False
+    while not encerrando:
+        primeira = _fila_telegram.get()
+        if primeira is None:
+            return
+        linhas = [primeira]
+
+        # Junta o que chegar até o fim da janela (ou até poder mandar de novo)
+        prazo = max(time.monotonic() + JANELA_TELEGRAM, ultimo_envio + INTERVALO_MINIMO_TELEGRAM)
+        while True:
+            resta = prazo - time.monotonic()
+            if resta <= 0:
+                break
+            try:
+                item = _fila_telegram.get(timeout=resta)
+            except queue.Empty:
+                break
+            if item is None:
+                encerrando = True
+                break
+            linhas.append(item)
+
+        enviar_telegram(montar_lote(linhas), formatacao=None)
+        ultimo_envio = time.monotonic()
+
+def montar_lote(linhas):
+    """Uma mensagem com as linhas em ordem; o que passar do limite vira um aviso no fim."""
+    partes, tamanho = [], 0
+    for i, linha in enumerate(linhas):
+        if partes and tamanho + len(linha) + 1 > LIMITE_CARACTERES_TELEGRAM:
+            partes.append(f"(+{len(linhas) - i} mensagens no sistema.log)")
+            break
+        partes.append(linha[:LIMITE_CARACTERES_TELEGRAM])
+        tamanho += len(partes[-1]) + 1
+    return "\n".join(partes)
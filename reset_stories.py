@@ -1,15 +1,13 @@
 # reset_stories.py atualizado
-import json
 from datetime import datetime
 
-arquivo = "stories_ativos.json"
+import estado_sistema
 
 estado_inicial = {
     "quantidade": 2,  # <--- Coloque aqui quantos stories tem HOJE no seu perfil
     "ultima_atualizacao": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 }
 
-with open(arquivo, "w") as f:
-    json.dump(estado_inicial, f, indent=4)
+estado_sistema.gravar(estado_sistema.CHAVE_STORIES, estado_inicial)
 
 print("✅ Sincronizado!")
\ No newline at end of file
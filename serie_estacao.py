@@ -0,0 +1,145 @@
+"""
+SÉRIE COLUNAR DE LEITURAS
+Formato compacto devolvido pela ingestão: um vetor de epoch (segundos, no horário
+local que a ANA informa) e vetores NumPy de nível, vazão e chuva (NaN = sem leitura).
+Anos de dados cabem em poucos vetores, sem um dicionário por leitura.
+Quem ainda trabalha com a lista de dicionários usa `para_leituras()`.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+EPOCH_ZERO = datetime(1970, 1, 1)
+
+# ==============================================================================
+# CONVERSÕES DE DATA
+# ==============================================================================
+def datetime_para_epoch(dt):
+    return int((dt - EPOCH_ZERO).total_seconds())
+
+def epoch_para_datetime(epoch):
+    return EPOCH_ZERO + timedelta(seconds=int(epoch))
+
+def epochs_ana(textos):
+    """
+    Converte as datas da ANA em epoch fatiando posições fixas, tudo de uma vez no NumPy
+    (sem strptime). Aceita 'aaaa-mm-dd HH:MM:SS' e 'dd/mm/aaaa HH:MM:SS'.
+    Retorna (epochs, validas): `validas` marca as datas que existem no calendário
+    (texto torto ou '2024-13-40 99:99:99' fica False, como no strptime de antes).
+    """
+    if not textos:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=bool)
+
+    bruto = "".join(t[:19].ljust(19) for t in textos).encode("ascii", errors="replace")
+    digitos = np.frombuffer(bruto, dtype=np.uint8).reshape(len(textos), 19).astype(np.int64) - 48
+
+    def campo(inicio, fim):
+        valor = np.zeros(len(textos), dtype=np.int64)
+        for i in range(inicio, fim):
+            valor = valor * 10 + digitos[:, i]
+        return valor
+
+    def separadores(posicoes, caractere):
+        return (digitos[:, posicoes] == ord(caractere) - 48).all(axis=1)
+
+    def sao_digitos(posicoes):
+        return ((digitos[:, posicoes] >= 0) & (digitos[:, posicoes] <= 9)).all(axis=1)
+
+    iso = separadores([4, 7], "-")
+    ano = np.where(iso, campo(0, 4), campo(6, 10))
+    mes = np.where(iso, campo(5, 7), campo(3, 5))
+    dia = np.where(iso, campo(8, 10), campo(0, 2))
+    hora, minuto, segundo = campo(11, 13), campo(14, 16), campo(17, 19)
+
+    validas = (
+        (iso | separadores([2, 5], "/")) & separadores([13, 16], ":")
+        & sao_digitos([11, 12, 14, 15, 17, 18])
+        & np.where(iso, sao_digitos([0, 1, 2, 3, 5, 6, 8, 9]), sao_digitos([0, 1, 3, 4, 6, 7, 8, 9]))
+        & (ano >= 1) & (mes >= 1) & (mes <= 12)
+        & (hora <= 23) & (minuto <= 59) & (segundo <= 59)
+    )
+    # Inválidas viram 1970-01-01 só para a conta não estourar; quem chama descarta pela máscara
+    ano, mes = np.where(validas, ano, 1970), np.where(validas, mes, 1)
+    meses = ((ano - 1970) * 12 + (mes - 1)).astype("datetime64[M]")
+    inicio_mes = meses.astype("datetime64[D]").astype(np.int64)
+    dias_no_mes = (meses + 1).astype("datetime64[D]").astype(np.int64) - inicio_mes
+    validas &= (dia >= 1) & (dia <= dias_no_mes)
+    epochs = (inicio_mes + dia - 1) * 86400 + hora * 3600 + minuto * 60 + segundo
+    return np.where(validas, epochs, 0), validas
+
+def _numero(texto):
+    try:
+        return float(texto) if texto else np.nan
+    except ValueError:
+        return np.nan
+
+def numeros(textos):
+    """Lista de textos numéricos -> vetor float64 (vazio ou inválido vira NaN)."""
+    return np.array([_numero(t) for t in textos], dtype=np.float64)
+
+# ==============================================================================
+# SÉRIE
+# ==============================================================================
+class SerieEstacao:
+    __slots__ = ("codigo", "epoch", "nivel", "vazao", "chuva")
+
+    def __init__(self, codigo, epoch, nivel, vazao, chuva):
+        self.codigo = codigo
+        self.epoch = np.asarray(epoch, dtype=np.int64)
+        self.nivel = np.asarray(nivel, dtype=np.float64)
+        self.vazao = np.asarray(vazao, dtype=np.float64)
+        self.chuva = np.asarray(chuva, dtype=np.float64)
+
+    @classmethod
+    def vazia(cls, codigo):
+        return cls(codigo, [], [], [], [])
+
+    @classmethod
+    def de_textos(cls, codigo, datas, niveis, vazoes, chuvas):
+        """
+        Monta a série a partir das colunas de texto do XML, já ordenada e sem datas
+        repetidas. Linhas com data inválida ficam de fora.
+        """
+        epochs, validas = epochs_ana(datas)
+        serie = cls(codigo, epochs, numeros(niveis), numeros(vazoes), numeros(chuvas))
+        if not validas.all():
+            serie = cls(codigo, serie.epoch[validas], serie.nivel[validas], serie.vazao[validas], serie.chuva[validas])
+        return serie.ordenada()
+
+    def __len__(self):
+        return len(self.epoch)
+
+    def __repr__(self):
+        return f"SerieEstacao({self.codigo!r}, {len(self)} leituras)"
+
+    def ordenada(self):
+        """Ordena da mais antiga para a mais nova e remove datas repetidas (fica a última)."""
+        ordem = np.argsort(self.epoch, kind="stable")
+        epoch = self.epoch[ordem]
+        unicos = np.ones(len(epoch), dtype=bool)
+        unicos[:-1] = epoch[1:] != epoch[:-1]
+        ordem = ordem[unicos]
+        return SerieEstacao(self.codigo, self.epoch[ordem], self.nivel[ordem], self.vazao[ordem], self.chuva[ordem])
+
+    def fatia(self, inicio=None, fim=None):
+        """Leituras entre dois epochs (inclusive), sem copiar os vetores. A série precisa estar ordenada."""
+        i = 0 if inicio is None else np.searchsorted(self.epoch, inicio, side="left")
+        j = len(self.epoch) if fim is None else np.searchsorted(self.epoch, fim, side="right")
+        return SerieEstacao(self.codigo, self.epoch[i:j], self.nivel[i:j], self.vazao[i:j], self.chuva[i:j])
+
+    def datas(self):
+        """Vetor datetime64 (serve direto para o matplotlib/pandas)."""
+        return self.epoch.astype("datetime64[s]")
+
+    def para_leituras(self, mais_recentes_primeiro=True, valor_ausente=0.0):
+        """Adaptador para o formato antigo: [{'data', 'nivel', 'vazao', 'chuva'}, ...]."""
+        def valor(v):
+            return valor_ausente if v != v else float(v)  # NaN != NaN
+
+        leituras = [
+            {"data": epoch_para_datetime(e), "nivel": valor(n), "vazao": valor(v), "chuva": valor(c)}
+            for e, n, v, c in zip(self.epoch.tolist(), self.nivel.tolist(), self.vazao.tolist(), self.chuva.tolist())
+        ]
+        if mais_recentes_primeiro:
+            leituras.reverse()
+        return leituras
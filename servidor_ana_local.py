@@ -0,0 +1,239 @@
+"""
+SERVIDOR ANA LOCAL (DUBLÊ DO DadosHidrometeorologicos)
+Responde como o webservice da ANA, mas com dados locais: os CSVs históricos
+(historico_timoteo.csv, historico_guilman.csv) e respostas XML gravadas em
+gravacoes_ana/. Serve para testar e medir o sistema sem depender da ANA.
+
+Para apontar monitor, pesquisador e colheita para ele, coloque no .env:
+    ANA_URL_BASE=http://127.0.0.1:8765/ServiceANA.asmx
+
+Uso:
+    python servidor_ana_local.py                       (porta 8765, sem atraso)
+    python servidor_ana_local.py --latencia 2 --taxa-erro 0.1
+    python servidor_ana_local.py --agora "10/01/2022 06:00"   (revive a cheia de 2022 como se fosse hoje)
+    python servidor_ana_local.py gravar 56696000 01/01/2022 15/01/2022   (grava resposta real da ANA)
+"""
+import argparse
+import glob
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+import cliente_ana
+import estacoes
+from serie_estacao import SerieEstacao, datetime_para_epoch
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+PASTA_GRAVACOES = os.path.join(DIRETORIO, "gravacoes_ana")
+
+PORTA_PADRAO = 8765
+
+# CSV histórico -> código da estação (csv_historico no estacoes.json)
+FONTES_CSV = dict(estacoes.com_historico_csv())
+
+# ==============================================================================
+# CARGA DOS DADOS
+# ==============================================================================
+def ler_csv(caminho, codigo):
+    """CSV exportado da ANA (data;chuva;nivel;vazao, data dd/mm/aaaa HH:MM) -> SerieEstacao."""
+    datas, chuvas, niveis, vazoes = [], [], [], []
+    with open(caminho, encoding="utf-8-sig") as f:
+        next(f, None)  # cabeçalho
+        for linha in f:
+            partes = linha.rstrip("\n").split(";")
+            if len(partes) < 4 or len(partes[0]) < 16:
+                continue
+            datas.append(partes[0][:16] + ":00")
+            chuvas.append(partes[1])
+            niveis.append(partes[2])
+            vazoes.append(partes[3])
+    return SerieEstacao.de_textos(codigo, datas, niveis, vazoes, chuvas)
+
+def juntar(a, b):
+    """Une duas séries da mesma estação (em datas repetidas vale a de `b`)."""
+    return SerieEstacao(
+        a.codigo,
+        np.concatenate([a.epoch, b.epoch]), np.concatenate([a.nivel, b.nivel]),
+        np.concatenate([a.vazao, b.vazao]), np.concatenate([a.chuva, b.chuva]),
+    ).ordenada()
+
+def carregar_series():
+    """Séries por estação: CSVs históricos + XMLs gravados (gravacoes_ana/<codigo>_*.xml)."""
+    series = {}
+    for nome, codigo in FONTES_CSV.items():
+        caminho = os.path.join(DIRETORIO, nome)
+        if os.path.exists(caminho):
+            series[codigo] = ler_csv(caminho, codigo)
+            print(f"📂 {nome}: {len(series[codigo])} leituras ({codigo})")
+
+    for caminho in sorted(glob.glob(os.path.join(PASTA_GRAVACOES, "*.xml"))):
+        codigo = os.path.basename(caminho).split("_")[0]
+        with open(caminho, "rb") as f:
+            serie = cliente_ana.ler_serie_xml(f, codigo)
+        series[codigo] = juntar(series[codigo], serie) if codigo in series else serie
+        print(f"📼 {os.path.basename(caminho)}: {len(serie)} leituras ({codigo})")
+    return series
+
+# ==============================================================================
+# RESPOSTA NO FORMATO DA ANA
+# ==============================================================================
+CABECALHO_XML = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<DataTable xmlns="http://MRCS/">'
+    '<diffgr:diffgram xmlns:msdata="urn:schemas-microsoft-com:xml-msdata" '
+    'xmlns:diffgr="urn:schemas-microsoft-com:xml-diffgram-v1">'
+    '<DocumentElement xmlns="">'
+)
+RODAPE_XML = "</DocumentElement></diffgr:diffgram></DataTable>"
+
+def _campo(nome, valor):
+    if valor != valor:  # NaN
+        return f"<{nome} />"
+    return f"<{nome}>{valor:.2f}</{nome}>"
+
+def montar_xml(codigo, serie, deslocamento):
+    """XML com as leituras da série (da mais nova para a mais antiga, como a ANA manda)."""
+    partes = [CABECALHO_XML]
+    datas = (serie.epoch + deslocamento).astype("datetime64[s]")
+    textos = np.datetime_as_string(datas, unit="s")
+    for i in range(len(serie) - 1, -1, -1):
+        partes.append(
+            f'<DadosHidrometereologicos diffgr:id="DadosHidrometereologicos{i + 1}" msdata:rowOrder="{i}">'
+            f"<CodEstacao>{codigo}</CodEstacao>"
+            f"<DataHora>{textos[i].replace('T', ' ')}   </DataHora>"
+            f"{_campo('Vazao', serie.vazao[i])}{_campo('Nivel', serie.nivel[i])}{_campo('Chuva', serie.chuva[i])}"
+            "</DadosHidrometereologicos>"
+        )
+    partes.append(RODAPE_XML)
+    return "".join(partes).encode("utf-8")
+
+def _data_ana(texto, fim_do_dia=False):
+    """dd/mm/aaaa -> epoch do início (ou do fim) do dia."""
+    dt = datetime.strptime(texto.strip(), "%d/%m/%Y")
+    return datetime_para_epoch(dt) + (86399 if fim_do_dia else 0)
+
+# ==============================================================================
+# SERVIDOR
+# ==============================================================================
+class ServidorAnaLocal(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, endereco, series, latencia=0.0, variacao=0.0, taxa_erro=0.0, taxa_travamento=0.0,
+                 deslocamento=0):
+        super().__init__(endereco, ManipuladorAna)
+        self.series = series
+        self.latencia = latencia            # atraso fixo por resposta (s)
+        self.variacao = variacao            # atraso extra aleatório 0..variacao (s)
+        self.taxa_erro = taxa_erro          # fração de respostas 503
+        self.taxa_travamento = taxa_travamento  # fração de respostas que "travam" (força timeout do cliente)
+        self.deslocamento = deslocamento    # segundos somados às datas gravadas (viagem no tempo)
+        self.trava = threading.Lock()
+        self.atendidas = 0
+
+class ManipuladorAna(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como o serviço real
+
+    def log_message(self, formato, *args):
+        pass  # o resumo sai no terminal pelo próprio do_GET
+
+    def _responder(self, status, corpo, tipo="text/xml; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def do_GET(self):
+        servidor = self.server
+        url = urlparse(self.path)
+
+        atraso = servidor.latencia + random.uniform(0, servidor.variacao)
+        if atraso > 0:
+            time.sleep(atraso)
+
+        sorteio = random.random()
+        if sorteio < servidor.taxa_travamento:
+            time.sleep(600)
+            return
+        if sorteio < servidor.taxa_travamento + servidor.taxa_erro:
+            self._responder(503, b"Service Unavailable (simulado)", "text/plain")
+            return
+
+        if not url.path.endswith("/" + cliente_ana.METODO_DADOS):
+            # Página do serviço (o vigia_ana só quer saber se está de pé)
+            self._responder(200, b"<html><body>ServiceANA (local)</body></html>", "text/html")
+            return
+
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        codigo = params.get("codEstacao", "")
+        try:
+            inicio = _data_ana(params["dataInicio"]) - servidor.deslocamento
+            fim = _data_ana(params["dataFim"], fim_do_dia=True) - servidor.deslocamento
+        except (KeyError, ValueError):
+            self._responder(400, b"Parametros invalidos", "text/plain")
+            return
+
+        # Nada do "futuro": com deslocamento, o relógio gravado anda junto com o real
+        agora = datetime_para_epoch(datetime.now()) - servidor.deslocamento
+        serie = servidor.series.get(codigo, SerieEstacao.vazia(codigo)).fatia(inicio, min(fim, agora))
+        self._responder(200, montar_xml(codigo, serie, servidor.deslocamento))
+
+        with servidor.trava:
+            servidor.atendidas += 1
+        print(f"[{datetime.now():%H:%M:%S}] {codigo} {params['dataInicio']} -> {params['dataFim']}: {len(serie)} leituras")
+
+def gravar_resposta(codigo, inicio, fim):
+    """Baixa a resposta real da ANA e guarda em gravacoes_ana/ para reprodução."""
+    os.makedirs(PASTA_GRAVACOES, exist_ok=True)
+    nome = f"{codigo}_{inicio.replace('/', '-')}_{fim.replace('/', '-')}.xml"
+    caminho = os.path.join(PASTA_GRAVACOES, nome)
+    with cliente_ana.abrir_resposta(codigo, inicio, fim, timeout=120) as resposta, open(caminho, "wb") as f:
+        for pedaco in resposta.iter_content(64 * 1024):
+            f.write(pedaco)
+    print(f"💾 Gravado: {caminho}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita o DadosHidrometeorologicos da ANA.")
+    sub = parser.add_subparsers(dest="comando")
+    gravar = sub.add_parser("gravar", help="grava uma resposta real da ANA em gravacoes_ana/")
+    gravar.add_argument("codigo")
+    gravar.add_argument("inicio", help="dd/mm/aaaa")
+    gravar.add_argument("fim", help="dd/mm/aaaa")
+
+    parser.add_argument("--porta", type=int, default=PORTA_PADRAO)
+    parser.add_argument("--latencia", type=float, default=0.0, help="atraso fixo por resposta (s)")
+    parser.add_argument("--variacao", type=float, default=0.0, help="atraso extra aleatório até N segundos")
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="fração de respostas 503 (0 a 1)")
+    parser.add_argument("--taxa-travamento", type=float, default=0.0, help="fração de respostas que nunca chegam")
+    parser.add_argument("--deslocamento-dias", type=float, default=0.0, help="adianta os dados gravados N dias")
+    parser.add_argument("--agora", help="'dd/mm/aaaa HH:MM' gravado que deve aparecer como o momento atual")
+    args = parser.parse_args()
+
+    if args.comando == "gravar":
+        gravar_resposta(args.codigo, args.inicio, args.fim)
+        return
+
+    deslocamento = int(args.deslocamento_dias * 86400)
+    if args.agora:
+        deslocamento = datetime_para_epoch(datetime.now()) - datetime_para_epoch(datetime.strptime(args.agora, "%d/%m/%Y %H:%M"))
+        deslocamento -= deslocamento % 900  # mantém as leituras na grade de 15 min
+
+    servidor = ServidorAnaLocal(
+        ("127.0.0.1", args.porta), carregar_series(),
+        latencia=args.latencia, variacao=args.variacao, taxa_erro=args.taxa_erro,
+        taxa_travamento=args.taxa_travamento, deslocamento=deslocamento,
+    )
+    print(f"🛰️ ANA local em http://127.0.0.1:{args.porta}/ServiceANA.asmx (deslocamento {deslocamento / 86400:.1f} dias)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nEncerrado. {servidor.atendidas} respostas servidas.")
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,24 @@
-import sqlite3
+import sys
+import banco_rio
 
 def configurar_banco():
-    conn = sqlite3.connect("rio_doce.db")
-    cursor = conn.cursor()
-    
-    # Tabela para armazenar as leituras minuto a minuto (ou 15 em 15)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS historico (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data_hora DATETIME UNIQUE,
-            nivel REAL
-        )
-    """)
-    
-    conn.commit()
+    # Cria as tabelas (série `leituras` de todas as estações, leituras recentes,
+    # índice "mesma data", resumos) e migra a tabela antiga `historico`, se existir.
+    conn = banco_rio.conectar()
+    total = conn.execute("SELECT COUNT(*) FROM leituras").fetchone()[0]
+    conn.close()
+    print(f"✅ Banco de dados 'rio_doce.db' configurado com sucesso! ({total} leituras na série)")
+
+def reconstruir_resumos():
+    # Os resumos se atualizam sozinhos a cada gravação; isto é só para refazer tudo
+    # (ex: banco que já tinha leituras antes das tabelas de resumo existirem).
+    conn = banco_rio.conectar()
+    print("⏳ Reconstruindo resumos por hora e por dia...")
+    for codigo, dias in banco_rio.reconstruir_resumos(conn).items():
+        print(f"✅ {codigo}: {dias} dias resumidos.")
     conn.close()
-    print("✅ Banco de dados 'rio_doce.db' configurado com sucesso!")
 
 if __name__ == "__main__":
-    configurar_banco()
\ No newline at end of file
+    configurar_banco()
+    if "resumos" in sys.argv[1:]:
+        reconstruir_resumos()
@@ -0,0 +1,154 @@
+"""
+TAXAS DE SUBIDA/DESCIDA (cm/h) EM VÁRIAS JANELAS
+Um cálculo só para monitor, painel, imagem, Telegram e backtest. As leituras
+vão para a grade de 15 min e, em cada janela (15 min, 1h, 3h, 6h), a taxa é a
+inclinação da reta de mínimos quadrados dos pontos da janela, depois de tirar
+picos isolados de leitura. Tudo em NumPy sobre uma matriz (estação x slot):
+a mesma conta vale para "agora" em todas as estações de uma vez e para o
+histórico inteiro de uma estação (arquivo_grade).
+"""
+import math
+
+import numpy as np
+
+INTERVALO = 900  # segundos por slot (mesma grade do arquivo_grade)
+JANELAS = {"15min": 900, "1h": 3600, "3h": 3 * 3600, "6h": 6 * 3600}
+FRACAO_MINIMA = 0.5  # fração dos pontos da janela que precisa ter leitura
+
+# ==============================================================================
+# GRADE
+# ==============================================================================
+def grade_alinhada(series, horas, intervalo=INTERVALO):
+    """
+    {codigo: (epochs, valores)} -> (codigos, matriz estação x slot). Cada linha
+    termina (última coluna) na leitura mais nova daquela estação; cada leitura
+    cai no slot mais próximo e slot sem leitura fica NaN.
+    """
+    codigos = list(series)
+    slots = int(round(horas * 3600 / intervalo)) + 1
+    matriz = np.full((len(codigos), slots), np.nan)
+    for linha, codigo in enumerate(codigos):
+        epochs, valores = (np.asarray(x, dtype=np.float64) for x in series[codigo])
+        validos = ~np.isnan(valores)
+        if not validos.any():
+            continue
+        epochs, valores = epochs[validos], valores[validos]
+        ordem = np.argsort(epochs, kind="stable")  # no mesmo slot vale a mais nova
+        epochs, valores = epochs[ordem], valores[ordem]
+        posicoes = slots - 1 - np.rint((epochs[-1] - epochs) / intervalo).astype(np.int64)
+        dentro = posicoes >= 0
+        matriz[linha, posicoes[dentro]] = valores[dentro]
+    return codigos, matriz
+
+def grade_regular(epochs, valores, intervalo=INTERVALO):
+    """Uma série qualquer -> (epochs da grade, valores na grade) do primeiro ao último slot."""
+    epochs = np.asarray(epochs, dtype=np.float64)
+    valores = np.asarray(valores, dtype=np.float64)
+    if not len(epochs):
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    slots = np.rint(epochs / intervalo).astype(np.int64)
+    inicio = slots.min()
+    grade = np.full(slots.max() - inicio + 1, np.nan)
+    ordem = np.argsort(epochs, kind="stable")
+    grade[slots[ordem] - inicio] = valores[ordem]
+    return (inicio + np.arange(len(grade), dtype=np.int64)) * intervalo, grade
+
+# ==============================================================================
+# CÁLCULO
+# ==============================================================================
+def tirar_picos(matriz):
+    """
+    Pico isolado (ponto interno que salta para fora dos dois vizinhos) vira a
+    média deles; subida/descida contínua fica intacta. Só onde os três existem.
+    """
+    saida = np.array(matriz, dtype=np.float64)
+    if saida.shape[-1] < 3:
+        return saida
+    antes, meio, depois = saida[..., :-2], saida[..., 1:-1], saida[..., 2:]
+    media = (antes + depois) / 2
+    # Pico: fora dos dois vizinhos e mais longe da média deles do que eles entre si
+    # (o vizinho de um pico fica fora também, mas perto da média). NaN compara False.
+    pico = ((meio > np.maximum(antes, depois)) | (meio < np.minimum(antes, depois))) \
+        & (np.abs(meio - media) > np.abs(antes - depois))
+    saida[..., 1:-1] = np.where(pico, media, meio)
+    return saida
+
+def _atrasar(matriz, passos, vazio):
+    """matriz deslocada `passos` slots para a direita (cada slot vê o valor de `passos` slots atrás)."""
+    if passos == 0:
+        return matriz
+    saida = np.full_like(matriz, vazio)
+    saida[..., passos:] = matriz[..., :-passos]
+    return saida
+
+def taxas_grade(matriz, janelas=JANELAS, intervalo=INTERVALO):
+    """
+    Taxa (cm/h) de cada janela terminando em cada slot. `matriz` é (slots,) ou
+    (estações, slots) na grade regular; devolve {janela: array do mesmo formato},
+    NaN onde o slot não tem leitura ou a janela tem pontos de menos.
+    """
+    valores = tirar_picos(matriz)
+    validos = ~np.isnan(valores)
+    y = np.where(validos, valores, 0.0)
+    peso = validos.astype(np.float64)
+
+    taxas = {}
+    for nome, segundos in janelas.items():
+        passos = int(round(segundos / intervalo))
+        n = np.zeros_like(y)
+        sx = np.zeros_like(y)
+        sxx = np.zeros_like(y)
+        sy = np.zeros_like(y)
+        sxy = np.zeros_like(y)
+        for atraso in range(passos + 1):
+            x = -atraso * intervalo / 3600  # horas antes do slot final
+            p = _atrasar(peso, atraso, 0.0)
+            v = _atrasar(y, atraso, 0.0)
+            n += p
+            sx += p * x
+            sxx += p * x * x
+            sy += v
+            sxy += v * x
+        denominador = n * sxx - sx * sx
+        minimo = max(2, math.ceil((passos + 1) * FRACAO_MINIMA))
+        ok = validos & (n >= minimo) & (denominador > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            taxas[nome] = np.where(ok, (n * sxy - sx * sy) / denominador, np.nan)
+    return taxas
+
+def taxas_atuais(series, janelas=JANELAS):
+    """
+    {codigo: (epochs, valores)} -> {codigo: {janela: cm/h ou None}} na leitura
+    mais nova de cada estação, todas as estações numa passada só.
+    """
+    if not series:
+        return {}
+    codigos, matriz = grade_alinhada(series, max(janelas.values()) / 3600)
+    taxas = taxas_grade(matriz, janelas)
+    resultado = {}
+    for linha, codigo in enumerate(codigos):
+        resultado[codigo] = {}
+        for nome in janelas:
+            valor = taxas[nome][linha, -1]
+            resultado[codigo][nome] = None if np.isnan(valor) else float(valor)
+    return resultado
+
+def taxas_serie(epochs, valores, janelas=JANELAS):
+    """Histórico inteiro de uma estação: (epochs da grade, {janela: taxa em cada slot}). Para backtests."""
+    grade_epochs, grade = grade_regular(epochs, valores)
+    return grade_epochs, taxas_grade(grade, janelas)
+
+# ==============================================================================
+# LEITURA DO RESULTADO
+# ==============================================================================
+def taxa_principal(taxas):
+    """A taxa que a estratégia usa: a de 1h (mais estável); sem ela, a de 15 min."""
+    for nome in ("1h", "15min"):
+        if taxas.get(nome) is not None:
+            return taxas[nome]
+    return None
+
+def formatar(taxas):
+    """'15min +2.0 | 1h +8.0 | 3h +6.5 | 6h — cm/h'"""
+    partes = [f"{nome} {valor:+.1f}" if valor is not None else f"{nome} —" for nome, valor in taxas.items()]
+    return " | ".join(partes) + " cm/h"
@@ -4,8 +4,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-def enviar_telegram(mensagem):
-    """Envia mensagens de log para o seu Telegram"""
+def enviar_telegram(mensagem, formatacao="Markdown"):
+    """Envia mensagens de log para o seu Telegram (formatacao=None manda texto puro)"""
     token = os.getenv("TELEGRAM_TOKEN")
     chat_id = os.getenv("TELEGRAM_CHAT_ID")
     
@@ -18,8 +18,9 @@ def enviar_telegram(mensagem):
         data = {
             "chat_id": chat_id, 
             "text": mensagem,
-            "parse_mode": "Markdown"
         }
+        if formatacao:
+            data["parse_mode"] = formatacao
         # Timeout curto para não travar o robô se a internet oscilar
         requests.post(url, data=data, timeout=5)
     except Exception as e:
@@ -1,9 +1,10 @@
 import requests
 import time
 from datetime import datetime
+import cliente_ana
 
 # URL principal do serviço (WSDL)
-URL_ANA = "http://telemetriaws1.ana.gov.br/ServiceANA.asmx"
+URL_ANA = cliente_ana.URL_TELEMETRIA_HTTP
 
 def tocar_bip():
     """Faz um barulho no sistema (Windows/Linux/Mac)"""
@@ -24,8 +25,7 @@ while True:
     
     try:
         # Tenta conectar com timeout curto (5s)
-        response = requests.get(URL_ANA, timeout=10)
-        status = response.status_code
+        status = cliente_ana.verificar_servico(timeout=10, url_base=URL_ANA)
         
         if status == 200:
             print(f"[{agora}] ✅ ONLINE! O SERVIDOR VOLTOU! (Status 200)")